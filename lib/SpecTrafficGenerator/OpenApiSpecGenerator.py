@@ -1,8 +1,11 @@
+from itertools import chain
+
 from prance import ResolvingParser
 from prance.util.resolver import default_reclimit_handler
 from openapi_spec_validator.shortcuts import validate
 from openapi_spec_validator.validation.exceptions import OpenAPIValidationError
 from lib.loggers.logger import report_logger
+from lib.SpecTrafficGenerator.ref_resolver import DEFAULT_MAX_REF_DEPTH, HTTP_METHODS, LazyRefResolver
 
 logger = report_logger()
 
@@ -37,14 +40,64 @@ prance.util.resolver.default_reclimit_handler = custom_reclimit_handler
 ResolvingParser._validate_openapi_spec_validator = custom_validate_openapi_spec_validator
 
 
+def merge_parameters(parameters, inherited):
+    """Returns parameters followed by the inherited parameters they do not override.
+
+    Parameters are identified by (name, in); the first one of each wins. The inherited ones are
+    copied, so no two operations share a parameter dict or list.
+
+    :param parameters: list, parameters of the operation
+    :param inherited: list, path level or security parameters
+    :return list, new list
+    """
+    merged = []
+    seen = set()
+    for param, inherit in chain(((param, False) for param in parameters), ((param, True) for param in inherited)):
+        key = (param.get('name'), param.get('in'))
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(dict(param) if inherit else param)
+    return merged
+
+
 class Resolver(object):
-    def __init__(self, spec_path):
+    def __init__(self, spec_path, spec_cache=None, lazy_refs=False, max_ref_depth=DEFAULT_MAX_REF_DEPTH):
         self.spec_path = spec_path
-        self.spec = ResolvingParser(spec_path, backend='openapi-spec-validator').specification
-    
+        self.ref_resolver = None
+        self.parameter_counts = None
+
+        if lazy_refs:
+            self.spec = self._load_lazy(max_ref_depth)
+        elif spec_cache is not None:
+            self.spec = spec_cache.get_or_resolve(spec_path, self._resolve)
+        else:
+            self.spec = self._resolve()
+
+    def _resolve(self):
+        return ResolvingParser(self.spec_path, backend='openapi-spec-validator').specification
+
+    def _load_lazy(self, max_ref_depth):
+        self.ref_resolver = LazyRefResolver(self.spec_path, max_ref_depth=max_ref_depth)
+        root = self.ref_resolver.root
+
+        fix_response_codes(root)
+        try:
+            validate(root)
+        except OpenAPIValidationError as e:
+            logger.warning(f"Validation Error in {self.spec_path}: {e}, continuing with fixed spec.")
+        except Exception as e:
+            logger.warning(f"Could not validate {self.spec_path} ({e}), continuing with unvalidated spec.")
+
+        self.ref_resolver.inline_operations(root)
+
+        # Shallow copy, so input_scan dropping components/definitions keeps them reachable for the resolver.
+        return dict(root)
+
     def input_scan(self):
         version = "3"
 
+        parameters_before = self._count_parameters(path_level=True)
         self._process_parameters_under_path()
 
         if "swagger" in self.spec.keys() or "basePath" in self.spec.keys() or "host" in self.spec.keys():
@@ -59,6 +112,10 @@ class Resolver(object):
                 self._process_security_definitions(self.spec['components']['securitySchemes'])
             self.spec.pop('components', None)
 
+        self.parameter_counts = {"before": parameters_before, "after": self._count_parameters()}
+        logger.debug(f"Operation parameters of {self.spec_path}: {self.parameter_counts['before']} declared, "
+                     f"{self.parameter_counts['after']} after merging path and security parameters")
+
         return self.spec, version
 
         # for api, apiInfo in self.spec['paths'].items():
@@ -69,6 +126,24 @@ class Resolver(object):
         #             self.spec['paths'][api][method]['parameters'] = newParameters
         # return self.spec, version
 
+    def _operations(self):
+        """Yields (path_info, method_info) of every operation; summary, servers, ... are not operations."""
+        for _, path_info in self.spec['paths'].items():
+            for method, method_info in path_info.items():
+                if method in HTTP_METHODS:
+                    yield path_info, method_info
+
+    def _count_parameters(self, path_level=False):
+        """Method to count the parameters declared on the operations.
+
+        :param path_level: bool, also count the path level parameters
+        :return int
+        """
+        count = sum(len(method_info.get('parameters', [])) for _, method_info in self._operations())
+        if path_level:
+            count += sum(len(path_info.get('parameters', [])) for path_info in self.spec['paths'].values())
+        return count
+
     def _process_security_definitions(self, security_definitions):
         extra_params = []
         for api_head_name, values in security_definitions.items():
@@ -77,35 +152,20 @@ class Resolver(object):
             elif values['type'] == 'http' and values['scheme'] == 'bearer':
                 extra_params.append({'in' : 'header', 'type' : 'string', 'name' : 'Authorization' })
 
-        for _, method_in in self.spec['paths'].items():
-            for method, method_info in method_in.items():
-                if method == 'parameters':
-                    continue
-
-                if 'parameters' in method_info.keys():
-                    for param in extra_params:
-                        method_info['parameters'].append(param)
-                else:
-                    method_info['parameters'] = extra_params
+        for _, method_info in self._operations():
+            # Auth params the operation already declares keep the operation's definition.
+            method_info['parameters'] = merge_parameters(method_info.get('parameters', []), extra_params)
 
     def _process_parameters_under_path(self):
-        extra_under_path_params = []
-        for path, path_info in self.spec['paths'].items():
-            if 'parameters' in path_info.keys():
-                for param in path_info['parameters']:
-                    extra_under_path_params.append(param)
-
-        if extra_under_path_params:
-            for _, path_info in self.spec['paths'].items():
-                for method, method_info in path_info.items():
-                    if method == 'parameters':
-                        continue
-
-                    if 'parameters' in method_info.keys():
-                        for param in extra_under_path_params:
-                            method_info['parameters'].append(param)
-                    else:
-                        method_info['parameters'] = extra_under_path_params
+        """Method to add the path level parameters of each path to its operations.
+
+        Parameters are merged per path and identified by (name, in): an operation parameter
+        overrides the path parameter of the same name and location, as OpenAPI defines.
+        """
+        for path_info, method_info in self._operations():
+            path_params = path_info.get('parameters', [])
+            if path_params:
+                method_info['parameters'] = merge_parameters(method_info.get('parameters', []), path_params)
 
     def _process_request_body(self, request_body):
         params = []
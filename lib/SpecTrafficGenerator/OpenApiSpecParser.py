@@ -1,14 +1,22 @@
+import argparse
 import json
 import yaml
 import json
 import os
 import re
 import xlsxwriter
-import random
-from faker import Faker
+from itertools import chain
 
+from lib.generation_context import GenerationContext
 from lib.im_environment import ImEnvironment
 from lib.SpecTrafficGenerator.OpenApiSpecGenerator import Resolver
+from lib.SpecTrafficGenerator.coverage import parameter_assignments, parse_strength, primary_response_code
+from lib.SpecTrafficGenerator.incremental import IncrementalGenerator, saved_seed
+from lib.SpecTrafficGenerator.label_index import LabelIndex, load_label_patterns
+from lib.SpecTrafficGenerator.ref_resolver import DEFAULT_MAX_REF_DEPTH, HTTP_METHODS
+from lib.SpecTrafficGenerator.schema_compiler import SchemaCompiler
+from lib.SpecTrafficGenerator.spec_cache import SpecCache
+from lib.parsers.testcase_io import RESPONSE_STATUS_HEADER, RSP_VARIANTS_KEY, write_testcases
 from lib.parsers.xlsx_parser import XlSXParser
 from lib.trafficgenerator.traffic_generator import TrafficGenerator
 from lib.loggers.logger import report_logger
@@ -16,33 +24,108 @@ from lib.loggers.logger import report_logger
 logger = report_logger()
 
 CONFIG_FILE = "../../config/config.yaml"
+SHEET_NAME = "discovery_engine"
 HEADER_LIST = ["test_id", "Input_URL", "Input_Host", "Input_Method", "Input_Rsp_Code", "Input_Req_Header", "Input_Req_Body", "Input_Rsp_Body"]
+BLANK_ROW = [None] * len(HEADER_LIST)
+RSP_VARIANTS_COLUMN = f"Input_{RSP_VARIANTS_KEY}"
+COMPACT_HEADER_LIST = HEADER_LIST + [RSP_VARIANTS_COLUMN]
 CONTENT_TYPE_LIST = ["application/json", "application/soap+xml", "application/x-www-form-urlencoded", "application/xml", "*/*", "text/json", "text/plain", "application/*+json"]
 
 
+def _status_free_header(header):
+    header_json = json.loads(header)
+    header_json.pop(RESPONSE_STATUS_HEADER, None)
+    return header_json
+
+
+def compact_rows(rows):
+    """Folds consecutive rows that only differ in their response code into one row.
+
+    The rows come laid out like HEADER_LIST; they are yielded laid out like COMPACT_HEADER_LIST,
+    the folded row keeping the first code and listing all of them ("200,404") in the
+    Input_Rsp_Variants column, None for rows that were not folded. expand_inputs turns a folded
+    input element back into one element per code.
+    """
+    group = []
+    group_header = None
+
+    def flush():
+        row = group[0] + [None]
+        if len(group) > 1:
+            row[-1] = ",".join(str(member[4]) for member in group)
+        group.clear()
+        return row
+
+    for row in rows:
+        if row is None:
+            if group:
+                yield flush()
+            yield None
+            continue
+
+        if group:
+            first = group[0]
+            if row[0] is None and row[1:4] == first[1:4] and row[6:] == first[6:] \
+                    and _status_free_header(row[5]) == group_header:
+                group.append(row)
+                continue
+            yield flush()
+        group.append(row)
+        group_header = _status_free_header(row[5])
+
+    if group:
+        yield flush()
+
+
 class OpenApiSpecParser(object):
-    def __init__(self, swagger_file):
+    def __init__(self, swagger_file, spec_cache=None, lazy_refs=False, max_ref_depth=DEFAULT_MAX_REF_DEPTH, seed=None,
+                 context=None, coverage=None, compact=False):
+        """Initialize class object.
+
+        :param coverage: int, t of the t-wise coverage mode (2 for pairwise), None for one random
+            test case per response code, see parameter_assignments
+        :param compact: bool, write the rows of an operation that only differ in their response
+            code once, with the codes in an extra Input_Rsp_Variants column, see compact_rows
+        """
+        if coverage is not None and coverage < 1:
+            raise ValueError(f"Coverage strength must be at least 1, got {coverage}")
+        self.context = context if context is not None else GenerationContext(seed)
+        self.coverage = coverage
+        self.compact = compact
         self.specs = None
+        self.spec_cache = spec_cache
+        self.lazy_refs = lazy_refs
+        self.max_ref_depth = max_ref_depth
+        self.ref_resolver = None
+        self.schema_compiler = None
+        self.version = None
+        self.base_path = None
+        self.test_case_count = 0
         self.ImObj = ImEnvironment(os.path.join(os.path.dirname(__file__), CONFIG_FILE))
-        self.workbook = xlsxwriter.Workbook(f"./OutputFiles/{swagger_file.split('/')[-1]}.xlsx")
-        self.worksheet = self.workbook.add_worksheet("discovery_engine")
+        self.xlsx_file = f"./OutputFiles/{swagger_file.split('/')[-1]}.xlsx"
 
-        with open(os.path.join(os.path.dirname(__file__), "key_patterns.json")) as f:
-            self.label_regex = json.load(f)
+        self.label_regex = load_label_patterns(os.path.join(os.path.dirname(__file__), "key_patterns.json"))
+        self.label_index = LabelIndex(self.label_regex)
 
         self.swagger_file = swagger_file
 
+    def deref(self, schema):
+        """Returns the target of a $ref schema in lazy_refs mode, the schema itself otherwise."""
+        if self.ref_resolver is None:
+            return schema
+        return self.ref_resolver.deref(schema)
+
     def resolve_composite_schema(self, schema) :
         if type(schema) is not dict:
             return schema
         if "oneOf" in schema :
-            return self.resolve_composite_schema(random.choice(schema["oneOf"]))
+            return self.resolve_composite_schema(self.deref(self.context.random.choice(schema["oneOf"])))
         elif "anyOf" in schema :
-            return self.resolve_composite_schema(random.choice(schema["anyOf"]))
+            return self.resolve_composite_schema(self.deref(self.context.random.choice(schema["anyOf"])))
         elif "allOf" in schema :
             merged_schema = { }
             for sub_schema in schema["allOf"] :
-                resolved_sub_schema = self.resolve_composite_schema(sub_schema)
+                resolved_sub_schema = self.resolve_composite_schema(self.deref(sub_schema))
                 for key, value in resolved_sub_schema.items() :
                     if key == "properties" and key in merged_schema :
                         merged_schema[key].update(value)
@@ -53,35 +136,17 @@ class OpenApiSpecParser(object):
             return { key : self.resolve_composite_schema(value) for key, value in schema.items() }
         return schema
 
-    def generate_body_from_schema(self, schema, name="<random-string>") :
-        if not schema:
-            return dict()
-
-        schema = self.resolve_composite_schema(schema)
-
-        if "enum" in schema :
-            return random.choice(schema["enum"])
-
-        elif schema.get("type") == "array" :
-            item_schema = schema.get("items", dict())
-            return [self.generate_body_from_schema(item_schema, name)]
-
-        elif schema.get("type") == "object" :
-            properties = schema.get("properties", dict())
-            return dict({ key : self.generate_body_from_schema(val, (
-                (self.get_label_name(key)) if self.get_label_name(key) else f"{key}"
-            )) for key, val in properties.items() })
-
-        elif schema.get("type") == "integer":
-            return random.randint(0, 9999999999)
-
-        elif schema.get("type") == "number":
-            return random.uniform(-9999, 999999)
+    def compile_schema(self, schema):
+        """Returns the compiled body generator of a schema, see SchemaCompiler."""
+        if self.schema_compiler is None:
+            self.schema_compiler = SchemaCompiler(ref_resolver=self.ref_resolver, max_ref_depth=self.max_ref_depth)
+        return self.schema_compiler.compile(schema)
 
-        elif "maxLength" in schema.keys():
-            return Faker('en_US').pystr(schema.get("maxLength"), schema.get("maxLength"))
+    def generate_body_from_schema(self, schema, name="<random-string>") :
+        return self.compile_schema(schema).generate(self.context)
 
-        return f"<random-{schema.get('type', 'string')}>"
+    def generate_bodies_from_schema(self, schema, count):
+        return self.compile_schema(schema).generate_batch(count, self.context)
 
     def extract_request_body(self, request_body, content_type):
         if not request_body:
@@ -96,28 +161,38 @@ class OpenApiSpecParser(object):
 
         return dict()
 
-    def extract_path_params(self, api, api_body):
+    def extract_path_params(self, api, api_body, fixed=None):
+        """Fills in the path parameters of api.
+
+        :param fixed: dict, (name, in) -> value of the parameters set by the coverage mode
+        """
         if "{" in api and "}" in api:
             path_param = api.split("{", 1)[1].split("}", 1)[0]
 
             have_enum = False
 
-            if self.get_label_name(path_param):
-                api = api.replace("{" + path_param + "}", self.get_label_name(path_param))
+            if fixed and (path_param, "path") in fixed:
+                path_label = str(fixed[(path_param, "path")])
+            else:
+                path_label = self.get_label_name(path_param)
+
+            if path_label:
+                api = api.replace("{" + path_param + "}", path_label)
 
             else:
                 for method, method_info in api_body.items():
-                    if method == "parameters":
+                    if method not in HTTP_METHODS:
                         continue
 
                     for param in method_info["parameters"]:
                         if param["name"] == path_param:
                             if "schema" in param.keys():
-                                data_type = param["schema"]["type"]
+                                param_schema = self.deref(param["schema"])
+                                data_type = param_schema["type"]
 
-                                if "enum" in param["schema"].keys():
+                                if "enum" in param_schema.keys():
                                     have_enum = True
-                                    value = random.choice(param["schema"]["enum"])
+                                    value = self.context.random.choice(param_schema["enum"])
                                 break
 
                             else:
@@ -125,7 +200,7 @@ class OpenApiSpecParser(object):
 
                                 if "enum" in param.keys():
                                     have_enum = True
-                                    value = random.choice(param["enum"])
+                                    value = self.context.random.choice(param["enum"])
                     break
 
                 if not have_enum:
@@ -134,11 +209,16 @@ class OpenApiSpecParser(object):
                     api = api.replace("{" + str(path_param) + "}", str(value))
 
         if "{" in api and "}" in api:
-            return self.extract_path_params(api, api_body)
+            return self.extract_path_params(api, api_body, fixed)
 
         return api
 
-    def extract_params(self, methods):
+    def extract_params(self, methods, fixed=None):
+        """Returns the query string, headers and body parameters of an operation.
+
+        :param fixed: dict, (name, in) -> value of the parameters set by the coverage mode; the
+            other parameters get labels or random values as usual
+        """
         query_params = []
         headers = dict()
         req_body = dict()
@@ -147,8 +227,10 @@ class OpenApiSpecParser(object):
         if "parameters" in methods:
             for param in methods["parameters"]:
                 param_name = param.get("name", "param")
-                param_schema = self.resolve_composite_schema(param.get("schema", dict()))
+                param_label = self.get_label_name(param_name)
+                param_schema = self.resolve_composite_schema(self.deref(param.get("schema", dict())))
                 param_type = (param["type"] if "type" in param.keys() else param_schema.get("type", "string"))
+                fixed_value = fixed.get((param_name, param.get("in"))) if fixed else None
 
                 have_enum = False
 
@@ -161,70 +243,75 @@ class OpenApiSpecParser(object):
                     min_str_len = (param_schema["minLength"] if "minLength" in param_schema.keys() else str_len-1)
 
                 if param.get("in") == "query":
-                    if param_type == "array":
-                        item_type = param_schema.get("items", dict()).get("type", "string")
+                    if fixed_value is not None:
+                        query_params.append(f"{param_name}={fixed_value}")
+
+                    elif param_type == "array":
+                        item_type = self.deref(param_schema.get("items", dict())).get("type", "string")
                         if not have_enum:
                             if item_type == "string" and "maxLength" in param_schema.keys() :
-                                query_params.append(f"[{param_name}={Faker('en_US').pystr(min_str_len, str_len)}]")
+                                query_params.append(f"[{param_name}={self.context.faker.pystr(min_str_len, str_len)}]")
                             else:
                                 query_params.append(
-                                    f"{param_name}=[{self.get_label_name(param_name)}]" if self.get_label_name(
-                                        param_name) else f"{param_name}=[<random-{item_type}>]")
+                                    f"{param_name}=[{param_label}]" if param_label else f"{param_name}=[<random-{item_type}>]")
                         else:
                             query_params.append(
-                                f"{param_name}={random.choice(enum_array)}"
+                                f"{param_name}={self.context.random.choice(enum_array)}"
                             )
 
                     else:
                         if not have_enum:
                             if param_type == "string" and "maxLength" in param_schema.keys() :
-                                query_params.append(f"{param_name}={Faker('en_US').pystr(min_str_len, str_len)}")
+                                query_params.append(f"{param_name}={self.context.faker.pystr(min_str_len, str_len)}")
                             else:
-                                query_params.append(f"{param_name}={self.get_label_name(param_name)}" if self.get_label_name(
-                                    param_name) else f"{param_name}=<random-{param_type}>")
+                                query_params.append(f"{param_name}={param_label}" if param_label else f"{param_name}=<random-{param_type}>")
 
                         else:
-                            query_params.append(f"{param_name}={random.choice(enum_array)}")
+                            query_params.append(f"{param_name}={self.context.random.choice(enum_array)}")
 
                 elif param.get("in") == "header":
-                    if param_type == "array":
-                        item_type = param_schema.get("items", dict()).get("type", "string")
+                    if fixed_value is not None:
+                        headers[param_name] = fixed_value
+
+                    elif param_type == "array":
+                        item_type = self.deref(param_schema.get("items", dict())).get("type", "string")
                         if not have_enum:
-                            headers[param_name] = f"[{param_name}]" if self.get_label_name(
-                                param_name) else f"<[random-{item_type}]>"
+                            headers[param_name] = f"[{param_name}]" if param_label else f"<[random-{item_type}]>"
                         else:
-                            headers[param_name] = random.choice(enum_array)
+                            headers[param_name] = self.context.random.choice(enum_array)
 
                     elif param_type == "object":
                         properties = param_schema.get("properties", dict())
                         headers[param_name] = {
-                            key: (f"{self.get_label_name(key)}" if self.get_label_name(
-                                key) else f"<random-{val.get('type', 'string')}>")
+                            key: (self.get_label_name(key) or f"<random-{self.deref(val).get('type', 'string')}>")
                             for key, val in properties.items()
                         }
 
                     elif param_type == "integer":
-                        headers[param_name] = random.randint(0, 9999999)
+                        headers[param_name] = self.context.random.randint(0, 9999999)
 
                     elif param_type == "number":
-                        headers[param_name] = random.uniform(0, 9999999)
+                        headers[param_name] = self.context.random.uniform(0, 9999999)
 
                     else:
                         if not have_enum:
-                            headers[param_name] = f"{self.get_label_name(param_name)}" if self.get_label_name(
-                                param_name) else f"<random-{param_type}>"
+                            headers[param_name] = param_label or f"<random-{param_type}>"
                         else:
-                            headers[param_name] = random.choice(enum_array)
+                            headers[param_name] = self.context.random.choice(enum_array)
 
                 elif param.get("in") == "body" :
-                    if have_enum:
-                        req_body[param_name] = random.choice(param_schema["enum"])
+                    if fixed_value is not None:
+                        req_body[param_name] = fixed_value
+                    elif have_enum:
+                        req_body[param_name] = self.context.random.choice(param_schema["enum"])
                     else:
-                        req_body[param_name] = self.generate_body_from_schema(param_schema)
+                        req_body[param_name] = self.generate_body_from_schema(param.get("schema", dict()))
 
                 elif param.get("in") == "formData" :
-                    if have_enum:
-                        form_data[param_name] = random.choice(param_schema["enum"])
+                    if fixed_value is not None:
+                        form_data[param_name] = fixed_value
+                    elif have_enum:
+                        form_data[param_name] = self.context.random.choice(param_schema["enum"])
                     else:
                         form_data[param_name] = "<random-string>"
 
@@ -237,6 +324,26 @@ class OpenApiSpecParser(object):
 
         return f"?{'&'.join(query_params)}" if query_params else "", headers, req_body
 
+    def parameter_assignments(self, method_info):
+        """Returns the (fixed parameters, is last) pairs of the test cases of an operation.
+
+        Outside coverage mode there is a single assignment, None, and parameters get random values.
+        In coverage mode the enum, boolean and label parameters take the values of each row of a
+        t-wise covering array, so every combination of any t of their values is sent once.
+        """
+        if self.coverage is None:
+            return [(None, True)]
+        assignments = parameter_assignments(self, method_info, self.coverage)
+        return [(fixed, i == len(assignments) - 1) for i, fixed in enumerate(assignments)]
+
+    def response_codes(self, method_info):
+        """Returns the response codes to generate rows for: all of them, or in coverage mode the
+        primary success code only.
+        """
+        if self.coverage is None:
+            return method_info["responses"].keys()
+        return [primary_response_code(method_info["responses"])]
+
     def extract_response(self, response, version, content_type="application/json"):
         response_body = {}
 
@@ -260,13 +367,14 @@ class OpenApiSpecParser(object):
         return response_body if response_body else dict()
 
     def get_label_name(self, label_name):
-        for label, regex in self.label_regex.items():
-            for reg in regex:
-                if re.search(reg, label_name):
-                    return label
-        return ""
+        return self.label_index.lookup(label_name)
+
+    def label_cache_stats(self):
+        return self.label_index.stats()
+
+    def _server_info_ver_3(self):
+        inp_host, base_path = "", "/"
 
-    def oas_ver_3(self):
         for url in self.specs.get("servers", []) :
             inp_url = re.sub(r"https?://", "", url["url"])
             inp_host, base_path = (
@@ -275,223 +383,321 @@ class OpenApiSpecParser(object):
 
         inp_host = ("Default" if not inp_host else inp_host)
 
-        api_count = 1
-        row, column = 0, 0
-        head_format = self.workbook.add_format({ "bold" : True, "bottom" : 2, "bg_color" : "#0B6623" })
+        return inp_host, base_path
 
-        for head in HEADER_LIST :
-            self.worksheet.write(row, column, head, head_format)
-            column += 1
-        row += 1
+    def _server_info_ver_2(self):
+        return self.specs.get("host", "Default"), self.specs.get("basePath", "/")
 
+    def _rows_ver_3(self, inp_host, base_path, paths=None):
+        api_count = 1
         content_type_not_found = False
 
-        for api, api_info in self.specs["paths"].items() :
+        for api, api_info in self._select_paths(paths) :
             new_api = True
             updated_api = self.extract_path_params(api, api_info)
 
             for method, method_info in api_info.items() :
-                if method == "parameters":
+                if method not in HTTP_METHODS:
                     continue
 
-                query_param, headers, request_body = self.extract_params(method_info)
-                inp_url = (base_path if base_path!='/' else "") + updated_api + query_param
+                for fixed, last in self.parameter_assignments(method_info) :
+                    query_param, headers, request_body = self.extract_params(method_info, fixed)
+                    api_path = updated_api if fixed is None else self.extract_path_params(api, api_info, fixed)
+                    inp_url = (base_path if base_path!='/' else "") + api_path + query_param
 
-                request_body = method_info.get("requestBody", dict())
+                    request_body = method_info.get("requestBody", dict())
 
-                if request_body == { } or request_body["content"] == { } :
-                    request_body = { "content" : { "application/json" : { "schema" : { } } } }
+                    if request_body == { } or request_body["content"] == { } :
+                        request_body = { "content" : { "application/json" : { "schema" : { } } } }
 
-                for content_type, _ in request_body["content"].items() :
-                    if content_type not in CONTENT_TYPE_LIST :
-                        content_type_not_found = True
-                        continue
+                    for content_type, _ in request_body["content"].items() :
+                        if content_type not in CONTENT_TYPE_LIST :
+                            content_type_not_found = True
+                            continue
 
-                    if "json" in content_type or content_type == "*/*" or content_type == "text/plain" :
-                        content_type = "application/json"
+                        if "json" in content_type or content_type == "*/*" or content_type == "text/plain" :
+                            content_type = "application/json"
 
-                    content_type_not_found = False
+                        content_type_not_found = False
 
-                    req_body = self.extract_request_body(request_body, content_type)
-                    if content_type == "application/xml" :
-                        req_body = { "Body" : req_body }
+                        req_body = self.extract_request_body(request_body, content_type)
+                        if content_type == "application/xml" :
+                            req_body = { "Body" : req_body }
 
-                    req_body = json.dumps(req_body)
+                        req_body = json.dumps(req_body)
 
-                    for rspcode in method_info["responses"].keys() :
-                        # resp_body = self.extract_response(method_info["responses"].get(rspcode, dict()), "3", content_type)           // Don't Need it for Traffic Generation.
+                        for rspcode in self.response_codes(method_info) :
+                            # resp_body = self.extract_response(method_info["responses"].get(rspcode, dict()), "3", content_type)           // Don't Need it for Traffic Generation.
 
-                        headers["Content-Type"] = content_type
-                        headers["apisec-resp-payload"] = { }
-                        headers["apisec-resp-status-code"] = ("200" if rspcode == "default" else rspcode)
-                        resp_body = { "no-resp-body" : True }
+                            headers["Content-Type"] = content_type
+                            headers["apisec-resp-payload"] = { }
+                            headers["apisec-resp-status-code"] = ("200" if rspcode == "default" else rspcode)
+                            resp_body = { "no-resp-body" : True }
 
-                        org_header = json.dumps(headers)
-                        resp_body = json.dumps(resp_body)
+                            org_header = json.dumps(headers)
+                            resp_body = json.dumps(resp_body)
 
-                        row_vals = [inp_url, inp_host, method.upper(), ("200" if rspcode == "default" else rspcode),
-                                    org_header, req_body, resp_body]
-                        column = 1
+                            yield [(api_count if new_api else None), inp_url, inp_host, method.upper(),
+                                   ("200" if rspcode == "default" else rspcode), org_header, req_body, resp_body]
+                            new_api = False
 
-                        for value in row_vals :
-                            self.worksheet.write(row, column, value)
-                            if new_api :
-                                self.worksheet.write(row, 0, api_count)
-                                new_api = False
-                            column += 1
-                        row += 1
+                        if not last :
+                            continue
 
-                    if '?' in inp_url :
-                        inp_url = inp_url.split('?')[0] + '/UnknownPath?' + inp_url.split('?')[1]
-                    else :
-                        inp_url = inp_url + '/UnknownPath'
+                        if '?' in inp_url :
+                            inp_url = inp_url.split('?')[0] + '/UnknownPath?' + inp_url.split('?')[1]
+                        else :
+                            inp_url = inp_url + '/UnknownPath'
 
-                    invalid_vals = [inp_url, inp_host, method.upper(), "403", str(org_header), str(request_body), str(resp_body)]
-                    column = 1
-                    for value in invalid_vals :
-                        self.worksheet.write(row, column, value)
-                        column += 1
-                    row += 1
+                        yield [None, inp_url, inp_host, method.upper(), "403", str(org_header), str(request_body), str(resp_body)]
 
             if content_type_not_found :
                 content_type_not_found = False
                 continue
 
             api_count += 1
-            row += 1
-
-        self.workbook.close()
-        return base_path
-
-    def oas_ver_2(self):
-        base_path = self.specs.get("basePath", "/")
-        inp_host = self.specs.get("host", "Default")
+            yield None
 
+    def _rows_ver_2(self, inp_host, base_path, paths=None):
         api_count = 1
-        row, column = 0, 0
-        head_format = self.workbook.add_format({ "bold" : True, "bottom" : 2, "bg_color" : "#0B6623" })
-
-        for head in HEADER_LIST :
-            self.worksheet.write(row, column, head, head_format)
-            column += 1
-        row += 1
-
         content_type_not_found = False
 
-        for api, api_info in self.specs["paths"].items() :
+        for api, api_info in self._select_paths(paths) :
             new_api = True
             updated_api = self.extract_path_params(api, api_info)
 
             for method, method_info in api_info.items() :
-                if method == "parameters":
+                if method not in HTTP_METHODS:
                     continue
 
-                query_param, headers, request_body = self.extract_params(method_info)
-                inp_url = (base_path if base_path!='/' else "") + updated_api + query_param
+                for fixed, last in self.parameter_assignments(method_info) :
+                    query_param, headers, request_body = self.extract_params(method_info, fixed)
+                    api_path = updated_api if fixed is None else self.extract_path_params(api, api_info, fixed)
+                    inp_url = (base_path if base_path!='/' else "") + api_path + query_param
 
-                required_body = request_body.copy()
+                    required_body = request_body.copy()
 
-                for name, value in request_body.items() :
-                    required_body = value
-                    break
+                    for name, value in request_body.items() :
+                        required_body = value
+                        break
 
-                request_body = json.dumps(required_body)
+                    request_body = json.dumps(required_body)
 
-                content_types = []
+                    content_types = []
 
-                if "consumes" in method_info.keys() :
-                    for content in method_info["consumes"]:
-                        content_types.append(content)
+                    if "consumes" in method_info.keys() :
+                        for content in method_info["consumes"]:
+                            content_types.append(content)
 
-                elif "consumes" in self.specs.keys() :
-                    for content in self.specs["consumes"]:
-                        content_types.append(content)
+                    elif "consumes" in self.specs.keys() :
+                        for content in self.specs["consumes"]:
+                            content_types.append(content)
 
-                elif "produces" in method_info.keys() :
-                    for content in method_info["produces"]:
-                        content_types.append(content)
+                    elif "produces" in method_info.keys() :
+                        for content in method_info["produces"]:
+                            content_types.append(content)
 
-                elif "produces" in self.specs.keys() :
-                    for content in self.specs["produces"]:
-                        content_types.append(content)
+                    elif "produces" in self.specs.keys() :
+                        for content in self.specs["produces"]:
+                            content_types.append(content)
 
-                else:
-                    content_types.append("application/json")
+                    else:
+                        content_types.append("application/json")
 
-                if len(content_types) == 0:
-                    content_types.append('application/json')
+                    if len(content_types) == 0:
+                        content_types.append('application/json')
 
 
-                for content_type in content_types :
+                    for content_type in content_types :
 
-                    if content_type not in CONTENT_TYPE_LIST :
-                        content_type_not_found = True
-                        continue
+                        if content_type not in CONTENT_TYPE_LIST :
+                            content_type_not_found = True
+                            continue
 
-                    if "json" in content_type or content_type == "*/*" or content_type == "text/plain" :
-                        content_type = "application/json"
+                        if "json" in content_type or content_type == "*/*" or content_type == "text/plain" :
+                            content_type = "application/json"
 
-                    content_type_not_found = False
+                        content_type_not_found = False
 
-                    for rspcode in method_info["responses"].keys() :
+                        for rspcode in self.response_codes(method_info) :
 
-                        # resp_body = self.extract_response(method_info["responses"].get(rspcode, dict()), "2")
+                            # resp_body = self.extract_response(method_info["responses"].get(rspcode, dict()), "2")
 
-                        headers["Content-Type"] = content_type
-                        headers["apisec-resp-payload"] = { }
-                        headers["apisec-resp-status-code"] = ("200" if rspcode == "default" else rspcode)
-                        resp_body = { "no-resp-body" : True }
+                            headers["Content-Type"] = content_type
+                            headers["apisec-resp-payload"] = { }
+                            headers["apisec-resp-status-code"] = ("200" if rspcode == "default" else rspcode)
+                            resp_body = { "no-resp-body" : True }
 
-                        org_header = json.dumps(headers)
-                        resp_body = json.dumps(resp_body)
+                            org_header = json.dumps(headers)
+                            resp_body = json.dumps(resp_body)
 
-                        row_vals = [inp_url, inp_host , method.upper(), ("200" if rspcode == "default" else rspcode),
-                                    org_header, request_body, resp_body]
-                        column = 1
+                            yield [(api_count if new_api else None), inp_url, inp_host , method.upper(),
+                                   ("200" if rspcode == "default" else rspcode), org_header, request_body, resp_body]
+                            new_api = False
 
-                        for value in row_vals :
-                            self.worksheet.write(row, column, value)
-                            if new_api :
-                                self.worksheet.write(row, 0, api_count)
-                                new_api = False
-                            column += 1
-                        row += 1
+                        if not last :
+                            continue
 
-                    if '?' in inp_url :
-                        inp_url = inp_url.split('?')[0] + '/UnknownPath?' + inp_url.split('?')[1]
-                    else:
-                        inp_url = inp_url + '/UnknownPath'
+                        if '?' in inp_url :
+                            inp_url = inp_url.split('?')[0] + '/UnknownPath?' + inp_url.split('?')[1]
+                        else:
+                            inp_url = inp_url + '/UnknownPath'
 
-                    invalid_vals = [inp_url, inp_host, method.upper(), "403", org_header, request_body, resp_body]
-                    column = 1
-                    for value in invalid_vals :
-                        self.worksheet.write(row, column, value)
-                        column += 1
-                    row += 1
+                        yield [None, inp_url, inp_host, method.upper(), "403", org_header, request_body, resp_body]
 
             if content_type_not_found :
                 content_type_not_found = False
                 continue
 
             api_count += 1
-            row += 1
+            yield None
+
+    def _select_paths(self, paths=None):
+        if paths is None:
+            return self.specs["paths"].items()
+        return ((api, self.specs["paths"][api]) for api in paths)
+
+    def server_info(self):
+        """Returns the (host, base path) of the loaded spec and records the base path."""
+        inp_host, base_path = getattr(self, f"_server_info_ver_{self.version}")()
+        self.base_path = base_path
+        return inp_host, base_path
 
-        self.workbook.close()
-        return base_path
+    def generate_rows(self, paths=None):
+        """Yields the sheet rows for the loaded spec, header excluded.
+
+        Each row is a list laid out like HEADER_LIST, with None in the test_id column for every row
+        but the first one of a test case. A None row stands for the blank separator row between test cases.
+
+        :param paths: iterable, keys of the spec paths to generate, in that order, all if None
+        """
+        inp_host, base_path = self.server_info()
+        rows = getattr(self, f"_rows_ver_{self.version}")(inp_host, base_path, paths)
+        return compact_rows(rows) if self.compact else rows
+
+    def header_list(self):
+        return COMPACT_HEADER_LIST if self.compact else HEADER_LIST
+
+    def write_workbook(self, rows):
+        workbook = xlsxwriter.Workbook(self.xlsx_file)
+        worksheet = workbook.add_worksheet(SHEET_NAME)
+        head_format = workbook.add_format({ "bold" : True, "bottom" : 2, "bg_color" : "#0B6623" })
+
+        for column, head in enumerate(self.header_list()) :
+            worksheet.write(0, column, head, head_format)
+
+        for row, row_vals in enumerate(rows, start=1) :
+            if row_vals is None :
+                continue
+            for column, value in enumerate(row_vals) :
+                if value is not None :
+                    worksheet.write(row, column, value)
+
+        workbook.close()
+
+    def oas_ver_3(self):
+        self.version = "3"
+        self.write_workbook(self.generate_rows())
+        return self.base_path
+
+    def oas_ver_2(self):
+        self.version = "2"
+        self.write_workbook(self.generate_rows())
+        return self.base_path
+
+    def load_spec(self):
+        resolver = Resolver(self.swagger_file, spec_cache=self.spec_cache, lazy_refs=self.lazy_refs,
+                            max_ref_depth=self.max_ref_depth)
+        self.ref_resolver = resolver.ref_resolver
+        self.schema_compiler = None
+        self.specs, self.version = resolver.input_scan()
+        logger.debug(f"Generating data for {self.swagger_file} with {self.context}")
+        return self.specs, self.version
 
     def run_main(self):
-        self.specs, version = Resolver(self.swagger_file).input_scan()
+        self.load_spec()
 
-        fun_call = f"oas_ver_{version}"
+        fun_call = f"oas_ver_{self.version}"
 
         base_pth = getattr(self, fun_call)()
+        logger.debug(f"label lookup cache: {self.label_cache_stats()}")
 
         return base_pth
 
+    def iter_testcases(self, export_xlsx=False, records=False, paths=None):
+        """Yields (test_id, test_case) pairs straight from the parsed spec, without the XLSX round-trip.
+
+        The test cases have the same shape as the ones written by XlSXParser.get_json_file.
+
+        :param export_xlsx: bool, also write the rows to the workbook as run_main does
+        :param records: bool, yield TestCaseRecord objects instead of dicts
+        :param paths: iterable, keys of the spec paths to generate, all if None
+        """
+        if self.specs is None:
+            self.load_spec()
+
+        rows = self.generate_rows(paths)
+        if export_xlsx:
+            rows = list(rows)
+            self.write_workbook(rows)
+
+        xlparser = XlSXParser(None, SHEET_NAME)
+        header_list = self.header_list()
+        blank_row = [None] * len(header_list)
+        rows = chain([header_list], ((row if row is not None else blank_row) for row in rows))
+        if records:
+            yield from xlparser.iter_test_case_records(rows)
+        else:
+            yield from xlparser.iter_test_cases_from_rows(rows)
+
+    def get_json_file(self, json_file, export_xlsx=False):
+        self.test_case_count = write_testcases(json_file, self.iter_testcases(export_xlsx=export_xlsx, records=True))
+        logger.debug(f"label lookup cache: {self.label_cache_stats()}")
+        return self.base_path
+
+    def update_json_file(self, json_file):
+        """Incremental get_json_file: regenerates only the paths whose operations changed since the
+        last update of json_file, see IncrementalGenerator.
+        """
+        summary = IncrementalGenerator(self, json_file).run()
+        self.test_case_count = summary["test_cases"]
+        logger.debug(f"label lookup cache: {self.label_cache_stats()}")
+        return self.base_path
 
-if __name__ == "__main__":
-    swagger_file = "/Users/peddireddymsailalith.aditya/api-security-automation/lib/SpecTrafficGenerator/spec_testing/account-1361974-api-files/55558081-api.bankmandiri.co.id-api-1213-_rad_AutoSwaggerOpenAPI_accountInfoExternalRestDesc.yaml"
-    base_path = OpenApiSpecParser(swagger_file).run_main()
 
-    xlparser = XlSXParser(f"./OutputFiles/{swagger_file.split('/')[-1]}.xlsx", "discovery_engine")
-    xlparser.get_json_file(f"./OutputFiles/{swagger_file.split('/')[-1]}.json")
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Generate test cases from an OpenAPI/Swagger spec.")
+    arg_parser.add_argument("swagger_file")
+    arg_parser.add_argument("--output", help="test case file, .json or .ndjson, defaults to ./OutputFiles/<spec name>.json")
+    arg_parser.add_argument("--ndjson", action="store_true", help="default the output to ./OutputFiles/<spec name>.ndjson")
+    arg_parser.add_argument("--xlsx", action="store_true", help="also export the rows to ./OutputFiles/<spec name>.xlsx")
+    arg_parser.add_argument("--legacy", action="store_true", help="write the workbook first and parse it back with XlSXParser")
+    arg_parser.add_argument("--incremental", action="store_true", help="only regenerate the paths that changed since the last run on the same output")
+    arg_parser.add_argument("--spec-cache", metavar="DIR", help="reuse resolved specs cached in this directory")
+    arg_parser.add_argument("--lazy-refs", action="store_true", help="resolve $refs on demand instead of expanding the spec up front")
+    arg_parser.add_argument("--seed", type=int, help="seed of the generated data, random if omitted")
+    arg_parser.add_argument("--max-ref-depth", type=int, default=DEFAULT_MAX_REF_DEPTH, help="times a recursive $ref is expanded in lazy mode")
+    arg_parser.add_argument("--coverage", type=parse_strength, metavar="T", help="emit a T-wise covering set of each operation's enum, boolean and label parameters (2 = pairwise)")
+    arg_parser.add_argument("--compact", action="store_true", help="store each request once with its response codes as variants, expanded when sending")
+    args = arg_parser.parse_args()
+
+    spec_cache = SpecCache(args.spec_cache) if args.spec_cache else None
+
+    swagger_file = args.swagger_file
+    output_file = args.output or f"./OutputFiles/{swagger_file.split('/')[-1]}.{'ndjson' if args.ndjson else 'json'}"
+
+    if args.legacy:
+        base_path = OpenApiSpecParser(swagger_file, spec_cache=spec_cache, lazy_refs=args.lazy_refs,
+                                      max_ref_depth=args.max_ref_depth, seed=args.seed, coverage=args.coverage, compact=args.compact).run_main()
+
+        xlparser = XlSXParser(f"./OutputFiles/{swagger_file.split('/')[-1]}.xlsx", SHEET_NAME)
+        xlparser.get_json_file(output_file)
+    elif args.incremental:
+        seed = args.seed if args.seed is not None else saved_seed(output_file)
+        base_path = OpenApiSpecParser(swagger_file, spec_cache=spec_cache, lazy_refs=args.lazy_refs,
+                                      max_ref_depth=args.max_ref_depth, seed=seed, coverage=args.coverage, compact=args.compact).update_json_file(output_file)
+    else:
+        base_path = OpenApiSpecParser(swagger_file, spec_cache=spec_cache, lazy_refs=args.lazy_refs,
+                                      max_ref_depth=args.max_ref_depth, seed=args.seed, coverage=args.coverage, compact=args.compact).get_json_file(output_file, export_xlsx=args.xlsx)
+
+    logger.info(f"base_path: {base_path}")
@@ -0,0 +1,266 @@
+"""Corpus mode: generate test cases for a whole directory of specs across a process pool."""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from lib.generation_context import GenerationContext, derive_seed
+from lib.loggers.logger import report_logger
+from lib.SpecTrafficGenerator.OpenApiSpecParser import OpenApiSpecParser
+from lib.SpecTrafficGenerator.coverage import parse_strength
+from lib.SpecTrafficGenerator.spec_cache import SpecCache
+
+logger = report_logger()
+
+DEFAULT_OUTPUT_DIR = "./OutputFiles"
+MANIFEST_FILE = "manifest.json"
+
+# Set in each worker process: one flag per job of the pool, set when the worker starts the job.
+_started_jobs = None
+
+
+def get_files(folder):
+    file_lst = []
+
+    for item in os.listdir(folder):
+        if item.endswith(".json") or item.endswith(".yaml") or item.endswith(".yml"):
+            if ':' in item:
+                item_renamed = item.replace(':', '_')
+                os.rename(os.path.join(folder, item), os.path.join(folder, item_renamed))
+                item = item_renamed
+            file_lst.append(item)
+
+    return file_lst
+
+
+def generate_spec(spec_path, output_dir, seed, export_xlsx=False, lazy_refs=False, spec_cache_dir=None,
+                  output_format="json", incremental=False, coverage=None, compact=False):
+    """Resolves one spec, generates its traffic and writes its test case JSON. Runs in a worker process.
+
+    Never raises: failures are reported in the returned dict so they can cross the process boundary.
+
+    :param spec_path: str, path to the spec
+    :param output_dir: str, directory of the test case JSON files
+    :param seed: int, seed of this spec's generation context
+    :param output_format: str, "json" or "ndjson"
+    :param incremental: bool, only regenerate the paths that changed since the last run, see
+        OpenApiSpecParser.update_json_file
+    :param coverage: int, t of the t-wise coverage mode, None to pick parameter values at random
+    :param compact: bool, store each request once with its response codes as variants, see
+        OpenApiSpecParser.compact_rows
+    :return dict, spec, status, output, base_path, test_cases, seconds and error details on failure
+    """
+    started = time.perf_counter()
+    result = {
+        "spec": spec_path,
+        "status": "ok",
+        "seed": seed,
+        "output": None,
+        "base_path": None,
+        "test_cases": 0,
+    }
+
+    try:
+        spec_cache = SpecCache(spec_cache_dir) if spec_cache_dir else None
+        parser = OpenApiSpecParser(spec_path, spec_cache=spec_cache, lazy_refs=lazy_refs, seed=seed, coverage=coverage,
+                                   compact=compact)
+
+        output_file = os.path.join(output_dir, f"{os.path.basename(spec_path)}.{output_format}")
+        if incremental:
+            result["base_path"] = parser.update_json_file(output_file)
+        else:
+            result["base_path"] = parser.get_json_file(output_file, export_xlsx=export_xlsx)
+        result["output"] = output_file
+        result["test_cases"] = parser.test_case_count
+
+    except Exception as e:
+        tb = sys.exc_info()
+        result.update({
+            "status": "error",
+            "Exception Class": tb[0].__name__,
+            "Exception Value": str(e),
+            "Traceback": "".join(traceback.format_tb(tb[2])),
+        })
+
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def _init_worker(started_jobs):
+    global _started_jobs
+    _started_jobs = started_jobs
+
+
+def _generate_reported_spec(job, spec_path, *args):
+    """generate_spec, flagging job as started first, see _run_pool."""
+    _started_jobs[job] = 1
+    return generate_spec(spec_path, *args)
+
+
+def _failed_result(spec_path, seed, e):
+    return {
+        "spec": spec_path,
+        "status": "error",
+        "seed": seed,
+        "Exception Class": type(e).__name__,
+        "Exception Value": str(e),
+    }
+
+
+def _run_pool(jobs, workers):
+    """Runs generate_spec jobs on a new process pool, yielding the results as they come.
+
+    A worker that dies (e.g. killed for memory) breaks the whole pool and every unfinished job
+    fails with BrokenProcessPool. Workers flag each job in shared memory when they start it (a
+    write that never blocks, whatever the number of jobs), so the jobs that were running when the
+    pool broke can be told from the ones that were only waiting.
+
+    :param jobs: dict, spec path -> arguments of generate_spec after the spec path
+    :return list, spec paths that did not finish because the pool broke, the ones that were
+        running first: (running, waiting)
+    """
+    started_jobs = multiprocessing.RawArray("b", len(jobs))
+    job_of = {}
+    broken = []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(started_jobs,)) as executor:
+        futures = {}
+        for job, (spec_path, args) in enumerate(jobs.items()):
+            job_of[spec_path] = job
+            futures[executor.submit(_generate_reported_spec, job, spec_path, *args)] = spec_path
+        for future in as_completed(futures):
+            spec_path = futures[future]
+            try:
+                yield future.result()
+            except BrokenProcessPool:
+                broken.append(spec_path)
+            except Exception as e:
+                yield _failed_result(spec_path, jobs[spec_path][1], e)
+
+    return [spec_path for spec_path in broken if started_jobs[job_of[spec_path]]], \
+        [spec_path for spec_path in broken if not started_jobs[job_of[spec_path]]]
+
+
+def generate_corpus(directory, output_dir=DEFAULT_OUTPUT_DIR, workers=None, seed=None, export_xlsx=False,
+                    lazy_refs=False, spec_cache_dir=None, output_format="json", incremental=False, coverage=None,
+                    compact=False):
+    """Generates test cases for every spec of a directory on a process pool.
+
+    Results are yielded as soon as each spec finishes, in completion order. Each spec gets a seed
+    derived from the corpus seed and its file name, so output does not depend on scheduling.
+
+    A worker process that dies (e.g. killed for memory) breaks the pool: the specs that were
+    waiting are resubmitted to a new pool and each spec that was running is retried once in a
+    pool of its own, so only a spec that kills its worker again is reported as failed.
+
+    :param directory: str, folder holding the specs
+    :param workers: int, worker processes, os.cpu_count() if None
+    :param seed: int, corpus seed, random if None
+    :param output_format: str, "json" or "ndjson"
+    :param incremental: bool, see generate_spec; pass the seed of the previous run
+    :param coverage: int, see generate_spec
+    :param compact: bool, see generate_spec
+    :return generator of dict, see generate_spec
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    corpus_seed = GenerationContext(seed).seed
+    spec_files = sorted(get_files(directory))
+
+    logger.info(f"Generating {len(spec_files)} specs from {directory} with seed {corpus_seed}")
+
+    jobs = {
+        os.path.join(directory, file): (output_dir, derive_seed(corpus_seed, file), export_xlsx, lazy_refs,
+                                        spec_cache_dir, output_format, incremental, coverage, compact)
+        for file in spec_files
+    }
+
+    pending = list(jobs)
+    unexplained = False
+    while pending:
+        running, waiting = yield from _run_pool({spec_path: jobs[spec_path] for spec_path in pending}, workers)
+        if not running and not waiting:
+            break
+        logger.warning(f"A worker process died, retrying {len(running)} running specs on their own and "
+                       f"{len(waiting)} waiting specs on a new pool")
+
+        for spec_path in running:
+            if any((yield from _run_pool({spec_path: jobs[spec_path]}, 1))):
+                yield _failed_result(spec_path, jobs[spec_path][1], BrokenProcessPool(
+                    "The worker process generating this spec died, also when retried on its own"))
+
+        if not running:
+            # A pool broke with no spec running (e.g. a worker died starting up): the waiting specs
+            # get one more pool, and fail if that one breaks the same way too.
+            if unexplained:
+                for spec_path in waiting:
+                    yield _failed_result(spec_path, jobs[spec_path][1], BrokenProcessPool(
+                        "The process pool broke twice without running this spec"))
+                break
+            unexplained = True
+        pending = waiting
+
+
+def write_manifest(results, manifest_file, seed=None):
+    generated = [result for result in results if result["status"] == "ok"]
+    failed = [result for result in results if result["status"] != "ok"]
+
+    json_obj = {
+        "seed": seed,
+        "generated": len(generated),
+        "failed": len(failed),
+        "test_cases": sum(result["test_cases"] for result in generated),
+        "specs": sorted(results, key=lambda result: result["spec"]),
+    }
+
+    with open(manifest_file, "w") as j_file:
+        json.dump(json_obj, j_file, indent=4)
+
+
+def read_manifest_seed(manifest_file):
+    """Returns the corpus seed recorded in a manifest, None if there is no manifest."""
+    try:
+        with open(manifest_file) as j_file:
+            return json.load(j_file).get("seed")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Generate test cases for a directory of specs.")
+    arg_parser.add_argument("directory")
+    arg_parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    arg_parser.add_argument("--workers", type=int, help="worker processes, defaults to the CPU count")
+    arg_parser.add_argument("--seed", type=int)
+    arg_parser.add_argument("--xlsx", action="store_true", help="also export each spec's rows to ./OutputFiles/<spec name>.xlsx")
+    arg_parser.add_argument("--lazy-refs", action="store_true")
+    arg_parser.add_argument("--spec-cache", metavar="DIR")
+    arg_parser.add_argument("--format", default="json", choices=["json", "ndjson"], help="test case file format")
+    arg_parser.add_argument("--incremental", action="store_true", help="only regenerate the paths that changed since the last run")
+    arg_parser.add_argument("--coverage", type=parse_strength, metavar="T", help="emit a T-wise covering set of each operation's enum, boolean and label parameters (2 = pairwise)")
+    arg_parser.add_argument("--compact", action="store_true", help="store each request once with its response codes as variants")
+    args = arg_parser.parse_args()
+
+    manifest_file = os.path.join(args.output_dir, MANIFEST_FILE)
+    seed = args.seed
+    if args.incremental and seed is None:
+        seed = read_manifest_seed(manifest_file)
+    corpus_seed = GenerationContext(seed).seed
+    results = []
+
+    for result in generate_corpus(args.directory, args.output_dir, workers=args.workers, seed=corpus_seed,
+                                  export_xlsx=args.xlsx, lazy_refs=args.lazy_refs, spec_cache_dir=args.spec_cache,
+                                  output_format=args.format, incremental=args.incremental, coverage=args.coverage,
+                                  compact=args.compact):
+        results.append(result)
+        if result["status"] == "ok":
+            logger.info(f"[{len(results)}] {result['spec']}: {result['test_cases']} test cases in {result['seconds']}s")
+        else:
+            logger.error(f"[{len(results)}] {result['spec']}: {result['Exception Class']}: {result['Exception Value']}")
+
+    write_manifest(results, manifest_file, seed=corpus_seed)
+    logger.info(f"Wrote {manifest_file}")
@@ -0,0 +1,143 @@
+"""Coverage mode: t-wise covering sets over the enum, boolean and label parameters of an operation."""
+import argparse
+import itertools
+
+DEFAULT_STRENGTH = 2
+# Query, header and path values are rendered as text, body values as JSON.
+TEXT_BOOLEAN_LEVELS = ("true", "false")
+JSON_BOOLEAN_LEVELS = (True, False)
+TEXT_LOCATIONS = ("query", "header", "path")
+PARAMETER_LOCATIONS = ("query", "header", "path", "body", "formData")
+
+
+def covering_array(level_counts, strength=DEFAULT_STRENGTH):
+    """Builds a covering array with the IPOG strategy.
+
+    Every combination of levels of any strength factors appears in at least one row. The first
+    strength factors start as their full product; each further factor is added by extending the
+    existing rows with the level covering the most new combinations (horizontal growth), then
+    covering the combinations still missing in free positions of the rows, or in new rows
+    (vertical growth). Positions still free at the end are filled in round robin.
+
+    :param level_counts: list, number of levels of each factor
+    :param strength: int, t, 2 for pairwise
+    :return list of tuples, level index of each factor per row
+    """
+    if strength < 1:
+        raise ValueError(f"Coverage strength must be at least 1, got {strength}")
+    factors = len(level_counts)
+    if factors == 0:
+        return [()]
+    t = min(strength, factors)
+    rows = [list(row) for row in itertools.product(*(range(count) for count in level_counts[:t]))]
+
+    for i in range(t, factors):
+        combos = list(itertools.combinations(range(i), t - 1))
+        uncovered = {
+            (combo, values, level)
+            for combo in combos
+            for values in itertools.product(*(range(level_counts[f]) for f in combo))
+            for level in range(level_counts[i])
+        }
+
+        for r, row in enumerate(rows):
+            best_level, best_gain = 0, -1
+            for offset in range(level_counts[i]):
+                level = (r + offset) % level_counts[i]
+                gain = sum(1 for combo in combos if (combo, tuple(row[f] for f in combo), level) in uncovered)
+                if gain > best_gain:
+                    best_level, best_gain = level, gain
+            row.append(best_level)
+            for combo in combos:
+                uncovered.discard((combo, tuple(row[f] for f in combo), best_level))
+
+        for combo, values, level in sorted(uncovered):
+            for row in rows:
+                if row[i] == level and all(row[f] is None or row[f] == value for f, value in zip(combo, values)):
+                    break
+            else:
+                row = [None] * i + [level]
+                rows.append(row)
+            for f, value in zip(combo, values):
+                row[f] = value
+
+    return [tuple(r % level_counts[f] if level is None else level for f, level in enumerate(row))
+            for r, row in enumerate(rows)]
+
+
+def parse_strength(value):
+    """Parses a --coverage argument, a strength of at least 1."""
+    try:
+        strength = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid coverage strength {value!r}")
+    if strength < 1:
+        raise argparse.ArgumentTypeError(f"coverage strength must be at least 1, got {strength}")
+    return strength
+
+
+def parameter_levels(parser, param):
+    """Returns the values a parameter is covered with, None if it is not a coverage factor.
+
+    Enums cover their values, booleans true and false, and parameters with a key_patterns label
+    the label and a random value of their type.
+
+    :param parser: OpenApiSpecParser, resolves schemas and labels
+    :param param: dict, resolved parameter
+    :return list
+    """
+    location = param.get("in")
+    if location not in PARAMETER_LOCATIONS:
+        return None
+
+    param_name = param.get("name", "param")
+    param_schema = parser.resolve_composite_schema(parser.deref(param.get("schema", dict())))
+    param_type = param["type"] if "type" in param.keys() else param_schema.get("type", "string")
+
+    if "enum" in param.keys() or "enum" in param_schema.keys():
+        return list(param["enum"] if "enum" in param.keys() else param_schema["enum"])
+    if param_type == "boolean":
+        return list(TEXT_BOOLEAN_LEVELS if location in TEXT_LOCATIONS else JSON_BOOLEAN_LEVELS)
+    if location in TEXT_LOCATIONS and param_type not in ("array", "object"):
+        label = parser.get_label_name(param_name)
+        if label:
+            return [label, f"<random-{param_type}>"]
+    return None
+
+
+def parameter_factors(parser, method_info):
+    """Returns the coverage factors of an operation.
+
+    :return list of ((name, in), levels), in parameter order
+    """
+    factors = []
+    seen = set()
+    for param in method_info.get("parameters", []):
+        key = (param.get("name", "param"), param.get("in"))
+        if key in seen:
+            continue
+        seen.add(key)
+        levels = parameter_levels(parser, param)
+        if levels:
+            factors.append((key, levels))
+    return factors
+
+
+def parameter_assignments(parser, method_info, strength=DEFAULT_STRENGTH):
+    """Returns the parameter values of each test case of an operation in coverage mode.
+
+    :param strength: int, t of the t-wise coverage, 2 for pairwise
+    :return list of dict, (name, in) -> value, one dict per row of the covering array
+    """
+    factors = parameter_factors(parser, method_info)
+    rows = covering_array([len(levels) for _, levels in factors], strength)
+    return [{key: levels[level] for (key, levels), level in zip(factors, row)} for row in rows]
+
+
+def primary_response_code(responses):
+    """Returns the first 2xx response code, else "default", else the first one."""
+    codes = list(responses.keys())
+    for code in codes:
+        if str(code).startswith("2"):
+            return code
+    return "default" if "default" in codes else codes[0]
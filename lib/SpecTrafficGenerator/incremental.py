@@ -0,0 +1,305 @@
+"""Incremental regeneration: only the paths whose operations changed since the last run are regenerated."""
+import hashlib
+import json
+import os
+import tempfile
+
+from lib.loggers.logger import report_logger
+from lib.parsers.testcase_io import iter_testcases, write_testcases
+from lib.SpecTrafficGenerator.ref_resolver import HTTP_METHODS, LazyRefResolver
+
+logger = report_logger()
+
+FINGERPRINT_VERSION = 1
+FINGERPRINT_SUFFIX = ".fingerprints.json"
+# Top level keys that shape every generated row, so a change to any of them regenerates everything.
+SPEC_LEVEL_KEYS = ("servers", "host", "basePath", "schemes", "consumes", "produces")
+OPERATION_KEYS = ("parameters", "requestBody", "responses", "consumes", "produces")
+
+
+def fingerprint_path(output_file):
+    return output_file + FINGERPRINT_SUFFIX
+
+
+def saved_seed(output_file, fingerprint_file=None):
+    """Returns the seed the output was generated with, so a run without --seed can continue it.
+
+    :return int, None if the output has no fingerprints
+    """
+    try:
+        with open(fingerprint_file or fingerprint_path(output_file)) as f:
+            return json.load(f).get("seed")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _sha256(value):
+    text = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class OperationFingerprinter(object):
+    """Hashes resolved spec nodes into stable digests.
+
+    Digests do not depend on key order. In lazy_refs mode every $ref is replaced by the digest of
+    its target, computed once per ref, so editing a shared component changes the fingerprint of
+    every operation using it. A ref met again while its own target is being hashed (a recursive
+    schema) is hashed by name; such partial digests are never memoized.
+    """
+
+    def __init__(self, ref_resolver=None):
+        """Initialize class object.
+
+        :param ref_resolver: LazyRefResolver, None when the spec is fully resolved
+        """
+        self.ref_resolver = ref_resolver
+        self._ref_digests = {}
+        self._active = set()
+        self._cycles = 0
+
+    def _canonical(self, node):
+        if isinstance(node, dict):
+            ref = LazyRefResolver.ref_of(node) if self.ref_resolver is not None else None
+            if ref is not None:
+                return {"$ref": self._ref_digest(ref)}
+            return {str(key): self._canonical(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [self._canonical(value) for value in node]
+        return node
+
+    def _ref_digest(self, ref):
+        digest = self._ref_digests.get(ref)
+        if digest is not None:
+            return digest
+        if ref in self._active:
+            self._cycles += 1
+            return f"cycle:{ref}"
+
+        cycles = self._cycles
+        self._active.add(ref)
+        try:
+            digest = _sha256(self._canonical(self.ref_resolver.resolve_ref(ref)))
+        finally:
+            self._active.discard(ref)
+        if self._cycles == cycles:
+            self._ref_digests[ref] = digest
+        return digest
+
+    def digest(self, node):
+        """Returns the hex digest of a spec node."""
+        return _sha256(self._canonical(node))
+
+    def operation(self, path, method, method_info):
+        """Returns the fingerprint of one operation: path, method, parameters, requestBody and responses."""
+        return self.digest({
+            "path": path,
+            "method": method,
+            **{key: method_info[key] for key in OPERATION_KEYS if key in method_info},
+        })
+
+
+class IncrementalGenerator(object):
+    """Regenerates the test cases of the paths whose operations changed and splices them into the corpus.
+
+    Every operation of the resolved spec is fingerprinted (see OperationFingerprinter) and the
+    fingerprints are saved next to the output in <output>.fingerprints.json. Test cases are made
+    per path, so a path is regenerated when any of its operations was added, removed or changed.
+    Unchanged test cases are copied from the existing corpus as they are and keep their test ids;
+    changed paths keep their id too and new paths get ids after the highest one ever issued.
+
+    Each path is generated on its own, with a context spawned from the parser's seed and the path,
+    so its test case does not depend on which other paths changed. A change to the spec level
+    settings (servers, host, basePath, consumes, ...), the label patterns, the seed, the coverage
+    or the compact mode regenerates everything.
+    """
+
+    def __init__(self, parser, output_file, fingerprint_file=None):
+        """Initialize class object.
+
+        :param parser: OpenApiSpecParser, spec to generate from, loaded on demand
+        :param output_file: str, test case file (.json or .ndjson) to update
+        :param fingerprint_file: str, fingerprint file, next to output_file if None
+        """
+        self.parser = parser
+        self.output_file = output_file
+        self.fingerprint_file = fingerprint_file or fingerprint_path(output_file)
+
+    def fingerprint_spec(self):
+        """Returns the fingerprints of the loaded spec.
+
+        :return dict, {"spec": digest, "paths": {path: {"digest": digest, "operations": {method: digest}}}}
+        """
+        parser = self.parser
+        fingerprinter = OperationFingerprinter(parser.ref_resolver)
+
+        spec_level = {key: parser.specs[key] for key in SPEC_LEVEL_KEYS if key in parser.specs}
+        spec_digest = fingerprinter.digest({
+            "format": FINGERPRINT_VERSION,
+            "version": parser.version,
+            "seed": parser.context.seed,
+            "coverage": parser.coverage,
+            "compact": parser.compact,
+            "labels": parser.label_regex,
+            "spec": spec_level,
+        })
+
+        paths = {}
+        for api, api_info in parser.specs["paths"].items():
+            operations = {
+                method: fingerprinter.operation(api, method, method_info)
+                for method, method_info in api_info.items()
+                if method in HTTP_METHODS
+            }
+            # Method order decides the row order within the test case.
+            paths[api] = {"digest": _sha256(list(operations.items())), "operations": operations}
+
+        return {"spec": spec_digest, "paths": paths}
+
+    def load_state(self):
+        """Returns the fingerprints saved by the previous run, None if there are none."""
+        try:
+            with open(self.fingerprint_file) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable fingerprint file {self.fingerprint_file}: {e}")
+            return None
+        return state if state.get("format") == FINGERPRINT_VERSION else None
+
+    def save_state(self, state):
+        directory = os.path.dirname(os.path.abspath(self.fingerprint_file))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f, indent=4)
+            os.replace(tmp_path, self.fingerprint_file)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def plan(state, fingerprints):
+        """Sorts the paths of the spec by what happened to them since the previous run.
+
+        :param state: dict, saved fingerprints of the same spec level settings, None for a first run
+        :param fingerprints: dict, as returned by fingerprint_spec
+        :return dict, added/changed/unchanged/removed path lists and the changed operations
+        """
+        old_paths = state["paths"] if state is not None else {}
+        plan = {"added": [], "changed": [], "unchanged": [], "removed": [], "operations": []}
+
+        for api, path_state in fingerprints["paths"].items():
+            old = old_paths.get(api)
+            if old is None:
+                plan["added"].append(api)
+            elif old["digest"] != path_state["digest"]:
+                plan["changed"].append(api)
+                old_operations = old["operations"]
+                for method, digest in path_state["operations"].items():
+                    if old_operations.get(method) != digest:
+                        plan["operations"].append(f"{method.upper()} {api}")
+                for method in old_operations.keys() - path_state["operations"].keys():
+                    plan["operations"].append(f"{method.upper()} {api} (removed)")
+            else:
+                plan["unchanged"].append(api)
+
+        plan["removed"] = [api for api in old_paths if api not in fingerprints["paths"]]
+        return plan
+
+    def _generate_path(self, api, test_id):
+        parser = self.parser
+        context = parser.context
+        parser.context = context.spawn(api)
+        try:
+            for _, record in parser.iter_testcases(records=True, paths=[api]):
+                yield test_id, record
+        finally:
+            parser.context = context
+
+    def _spliced_testcases(self, state, fingerprints, plan, new_state):
+        """Yields the test cases of the updated corpus and fills in new_state["paths"]."""
+        regenerate = set(plan["changed"])
+        added = set(plan["added"])
+        paths = new_state["paths"]
+
+        def generate(api, test_id):
+            paths[api] = dict(fingerprints["paths"][api], test_id=None)
+            for testcase in self._generate_path(api, test_id):
+                paths[api]["test_id"] = test_id
+                yield testcase
+
+        if plan["unchanged"] or plan["changed"]:
+            path_of_id = {path_state["test_id"]: api for api, path_state in state["paths"].items()
+                          if path_state["test_id"] is not None}
+            unchanged = set(plan["unchanged"])
+
+            for test_id, testcase in iter_testcases(self.output_file):
+                api = path_of_id.get(int(test_id))
+                if api in unchanged:
+                    paths[api] = state["paths"][api]
+                    yield test_id, testcase
+                elif api in regenerate:
+                    regenerate.discard(api)
+                    yield from generate(api, int(test_id))
+
+            # Unchanged paths that had no test case keep having none.
+            for api in unchanged:
+                paths.setdefault(api, state["paths"][api])
+
+        for api in fingerprints["paths"]:
+            if api in regenerate or api in added:
+                test_id = new_state["next_test_id"]
+                new_state["next_test_id"] += 1
+                yield from generate(api, test_id)
+
+    def run(self):
+        """Brings the output up to date with the spec.
+
+        :return dict, counts of added, changed, unchanged and removed paths, the changed
+            operations and the number of test cases written
+        """
+        parser = self.parser
+        if parser.specs is None:
+            parser.load_spec()
+        parser.server_info()
+
+        fingerprints = self.fingerprint_spec()
+        state = self.load_state() if os.path.isfile(self.output_file) else None
+        if state is not None and state["spec"] != fingerprints["spec"]:
+            logger.info(f"Spec level settings of {parser.swagger_file} changed, regenerating every path")
+            state = None
+        plan = self.plan(state, fingerprints)
+
+        new_state = {
+            "format": FINGERPRINT_VERSION,
+            "spec": fingerprints["spec"],
+            "seed": parser.context.seed,
+            "next_test_id": state["next_test_id"] if state is not None else 1,
+            "paths": {},
+        }
+
+        if plan["added"] or plan["changed"] or plan["removed"] or state is None:
+            directory = os.path.dirname(os.path.abspath(self.output_file))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=os.path.splitext(self.output_file)[1])
+            os.close(fd)
+            try:
+                count = write_testcases(tmp_path, self._spliced_testcases(state, fingerprints, plan, new_state))
+                os.replace(tmp_path, self.output_file)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        else:
+            new_state["paths"] = state["paths"]
+            count = sum(1 for path_state in state["paths"].values() if path_state["test_id"] is not None)
+
+        # Saved after the corpus, so an interrupted run regenerates the same paths with the same ids.
+        new_state["paths"] = {api: new_state["paths"][api] for api in fingerprints["paths"]}
+        self.save_state(new_state)
+
+        summary = {key: len(plan[key]) for key in ("added", "changed", "unchanged", "removed")}
+        summary["operations"] = plan["operations"]
+        summary["test_cases"] = count
+        logger.info(f"{self.output_file}: {summary['added']} paths added, {summary['changed']} changed, "
+                    f"{summary['removed']} removed, {summary['unchanged']} unchanged")
+        return summary
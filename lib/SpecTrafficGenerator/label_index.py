@@ -0,0 +1,90 @@
+"""Compiled, memoized lookup of key_patterns.json labels by field name."""
+import json
+import re
+from functools import lru_cache
+
+from lib.loggers.logger import report_logger
+
+logger = report_logger()
+
+DEFAULT_CACHE_SIZE = 8192
+BACKREFERENCE_REGEX = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def load_label_patterns(pattern_file):
+    """Reads key_patterns.json, skipping the // note lines it carries.
+
+    :param pattern_file: str, path to the key patterns file
+    :return dict, label -> list of regexes
+    """
+    with open(pattern_file) as f:
+        lines = [line for line in f if not line.lstrip().startswith("//")]
+    return json.loads("".join(lines))
+
+
+class LabelIndex(object):
+    """Maps a field name to the first label whose regex matches it.
+
+    All regexes are folded into a single compiled pattern with one named group per regex. Every
+    alternative is anchored at the start and consumes a lazy prefix, so the regex engine tries the
+    alternatives in file order and the first one that matches anywhere in the name wins, exactly
+    like looping over re.search. Results are memoized per field name in a bounded LRU cache.
+    """
+
+    def __init__(self, label_regex, cache_size=DEFAULT_CACHE_SIZE):
+        """Initialize class object.
+
+        :param label_regex: dict, label -> list of regexes, in priority order
+        :param cache_size: int, max number of field names kept in the memo cache
+        """
+        self.labels = []
+        self._patterns = []
+        self._combined = None
+
+        alternatives = []
+        for label, regex in label_regex.items():
+            for reg in regex:
+                alternatives.append(f"(?s:.*?)(?P<_label_{len(self.labels)}>{reg})")
+                self._patterns.append(reg)
+                self.labels.append(label)
+
+        if alternatives and not any(BACKREFERENCE_REGEX.search(reg) for reg in self._patterns):
+            try:
+                self._combined = re.compile("|".join(alternatives))
+            except re.error as e:
+                logger.warning(f"Could not combine key patterns ({e}), matching them one by one.")
+
+        if self._combined is None:
+            self._patterns = [re.compile(reg) for reg in self._patterns]
+
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, field_name):
+        if self._combined is not None:
+            match = self._combined.match(field_name)
+            if match:
+                return self.labels[int(match.lastgroup.rsplit("_", 1)[1])]
+            return ""
+
+        for label, pattern in zip(self.labels, self._patterns):
+            if pattern.search(field_name):
+                return label
+        return ""
+
+    def stats(self):
+        """Returns memo cache counters.
+
+        :return dict, hits, misses, hit_rate, size and maxsize of the cache
+        """
+        info = self.lookup.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+        }
+
+    def clear(self):
+        self.lookup.cache_clear()
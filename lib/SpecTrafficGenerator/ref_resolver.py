@@ -0,0 +1,144 @@
+"""On-demand $ref resolution that keeps components/definitions as shared nodes."""
+import json
+import os
+from urllib.parse import unquote
+
+import yaml
+
+from lib.loggers.logger import report_logger
+
+logger = report_logger()
+
+DEFAULT_MAX_REF_DEPTH = 1
+HTTP_METHODS = ["get", "put", "post", "delete", "options", "head", "patch", "trace"]
+
+
+class LazyRefResolver(object):
+    """Loads a spec without expanding its $refs and resolves them when they are walked.
+
+    Each ref is looked up once and the target node is memoized and shared by every place that
+    points to it, so a component used a thousand times is held in memory once. Refs to other files
+    are loaded on first use; their refs are rewritten to absolute form at load time so that a
+    ref is always resolved against the document it came from.
+
+    max_ref_depth is carried for the body generators, which expand a recursive ref at most that
+    many nested times (see SchemaCompiler).
+    """
+
+    def __init__(self, spec_path, max_ref_depth=DEFAULT_MAX_REF_DEPTH):
+        """Initialize class object.
+
+        :param spec_path: str, path to the root spec file
+        :param max_ref_depth: int, how many times a ref may be nested in itself while expanding
+        """
+        self.spec_path = os.path.abspath(spec_path)
+        self.max_ref_depth = max_ref_depth
+        self._documents = {}
+        self._resolved = {}
+        self.root = self._load_document(self.spec_path)
+
+    def _load_document(self, path):
+        if path not in self._documents:
+            with open(path) as f:
+                document = json.load(f) if path.endswith(".json") else yaml.safe_load(f)
+            self._qualify_refs(document, path)
+            self._documents[path] = document
+        return self._documents[path]
+
+    def _qualify_refs(self, document, path):
+        """Rewrites file refs to absolute paths, and local refs of non-root documents to path#pointer."""
+        base_dir = os.path.dirname(path)
+        is_root = path == self.spec_path
+        pending = [document]
+
+        while pending:
+            node = pending.pop()
+            if isinstance(node, dict):
+                ref = node.get("$ref")
+                if isinstance(ref, str) and not ref.startswith(("http://", "https://")):
+                    ref_file, _, pointer = ref.partition("#")
+                    if ref_file:
+                        ref_file = os.path.abspath(os.path.join(base_dir, ref_file))
+                    elif not is_root:
+                        ref_file = path
+                    node["$ref"] = f"{ref_file}#{pointer}" if ref_file != self.spec_path else f"#{pointer}"
+                pending.extend(node.values())
+            elif isinstance(node, list):
+                pending.extend(node)
+
+    @staticmethod
+    def ref_of(node):
+        """Returns the $ref of a node, or None if it is not a reference."""
+        if isinstance(node, dict) and isinstance(node.get("$ref"), str):
+            return node["$ref"]
+        return None
+
+    def resolve_ref(self, ref):
+        """Returns the node a ref points to, memoized per ref.
+
+        :param ref: str, "#/json/pointer" or "/abs/file.yaml#/json/pointer"
+        :return node, possibly another reference
+        """
+        if ref not in self._resolved:
+            if ref.startswith(("http://", "https://")):
+                raise ValueError(f"Remote $ref {ref} is not supported in lazy mode")
+
+            ref_file, _, pointer = ref.partition("#")
+            node = self._load_document(ref_file) if ref_file else self.root
+
+            for token in pointer.split("/")[1:]:
+                token = unquote(token).replace("~1", "/").replace("~0", "~")
+                node = node[int(token)] if isinstance(node, list) else node[token]
+
+            self._resolved[ref] = node
+        return self._resolved[ref]
+
+    def deref(self, node):
+        """Follows refs until a non-reference node is reached.
+
+        :return node, {} for a ref chain that loops on itself
+        """
+        seen = set()
+        ref = self.ref_of(node)
+
+        while ref is not None:
+            if ref in seen:
+                logger.warning(f"$ref chain loops on {ref}, using an empty schema")
+                return {}
+            seen.add(ref)
+            node = self.resolve_ref(ref)
+            ref = self.ref_of(node)
+
+        return node
+
+    def inline_operations(self, spec):
+        """Dereferences the operation level of a spec in place.
+
+        Path items, parameters, request bodies, responses and security schemes are replaced by
+        their (shared) targets so the Resolver post-processing can treat them as plain dicts.
+        Schemas are left as references.
+        """
+        paths = spec.get("paths", {})
+        for path in list(paths.keys()):
+            path_info = paths[path] = self.deref(paths[path])
+
+            if "parameters" in path_info:
+                path_info["parameters"] = [self.deref(param) for param in path_info["parameters"]]
+
+            for method in HTTP_METHODS:
+                if method not in path_info:
+                    continue
+                method_info = path_info[method] = self.deref(path_info[method])
+
+                if "parameters" in method_info:
+                    method_info["parameters"] = [self.deref(param) for param in method_info["parameters"]]
+                if "requestBody" in method_info:
+                    method_info["requestBody"] = self.deref(method_info["requestBody"])
+                if "responses" in method_info:
+                    responses = method_info["responses"]
+                    for code in list(responses.keys()):
+                        responses[code] = self.deref(responses[code])
+
+        security_schemes = spec.get("components", {}).get("securitySchemes", {})
+        for name in list(security_schemes.keys()):
+            security_schemes[name] = self.deref(security_schemes[name])
@@ -0,0 +1,544 @@
+"""Compiles request/response schemas into reusable body generators."""
+import math
+import string
+from collections import Counter, OrderedDict
+from itertools import product
+
+from lib.generation_context import default_context
+from lib.loggers.logger import report_logger
+from lib.SpecTrafficGenerator.ref_resolver import DEFAULT_MAX_REF_DEPTH
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = report_logger()
+
+INTEGER_RANGE = (0, 9999999999)
+NUMBER_RANGE = (-9999, 999999)
+INT64_RANGE = (-2 ** 63, 2 ** 63 - 1)
+# Faker's pystr draws from the ASCII letters.
+STRING_LETTERS = string.ascii_letters
+# allOf schemas resolving to more variants than this are sampled per body instead of compiled upfront.
+DEFAULT_MAX_VARIANTS = 64
+DEFAULT_COMPILE_CACHE_SIZE = 4096
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _bounds(schema, default, integer=False):
+    """Returns the (minimum, maximum) of a numeric schema, the default range where it sets none.
+
+    A one-sided bound keeps the default bound on the other side, or the width of the default
+    range when that would leave the range empty. Exclusive bounds are honoured for integers,
+    given as OpenAPI 3.0 flags or 3.1 numbers.
+    """
+    minimum, maximum = schema.get("minimum"), schema.get("maximum")
+    exclusive_minimum, exclusive_maximum = schema.get("exclusiveMinimum"), schema.get("exclusiveMaximum")
+    if _is_number(exclusive_minimum):
+        minimum, exclusive_minimum = exclusive_minimum, True
+    if _is_number(exclusive_maximum):
+        maximum, exclusive_maximum = exclusive_maximum, True
+
+    if not _is_number(minimum) and not _is_number(maximum):
+        return default
+    width = default[1] - default[0]
+    if not _is_number(minimum):
+        minimum = default[0] if default[0] <= maximum else maximum - width
+        exclusive_minimum = False
+    if not _is_number(maximum):
+        maximum = default[1] if default[1] >= minimum else minimum + width
+        exclusive_maximum = False
+
+    if integer:
+        minimum = math.floor(minimum) + 1 if exclusive_minimum is True else math.ceil(minimum)
+        maximum = math.ceil(maximum) - 1 if exclusive_maximum is True else math.floor(maximum)
+    if minimum > maximum:
+        logger.warning(f"Empty range [{minimum}, {maximum}] in schema, using the default range")
+        return default
+    return minimum, maximum
+
+
+class GenerationState(object):
+    """Per-call state threaded through the generator tree.
+
+    Batch generation also carries a NumPy Generator seeded from the context's random, None when
+    NumPy is not installed or for single bodies.
+    """
+    __slots__ = ("random", "faker", "expanding", "np_random")
+
+    def __init__(self, context=None, batch=False):
+        context = context or default_context()
+        self.random = context.random
+        self.faker = context.faker
+        self.expanding = Counter()
+        self.np_random = numpy.random.default_rng(self.random.getrandbits(64)) if batch and numpy else None
+
+
+class SchemaGenerator(object):
+    """Base class of the compiled generator nodes."""
+    __slots__ = ()
+
+    def generate(self, context=None):
+        """Returns one body.
+
+        :param context: GenerationContext, source of random values, default_context() if None
+        """
+        return self._generate(GenerationState(context))
+
+    def generate_many(self, count, context=None):
+        """Returns a list of count bodies."""
+        state = GenerationState(context)
+        return [self._generate(state) for _ in range(count)]
+
+    def generate_batch(self, count, context=None):
+        """Returns a list of count bodies, generated column by column.
+
+        Each scalar field is drawn for all count bodies at once, as a NumPy array when NumPy is
+        installed, and the bodies are assembled from the columns. The values follow the same
+        distributions as generate() but come from a different random stream.
+
+        :param count: int, number of bodies
+        :param context: GenerationContext, source of random values, default_context() if None
+        """
+        return self._generate_batch(GenerationState(context, batch=True), count)
+
+    def _generate(self, state):
+        raise NotImplementedError
+
+    def _generate_batch(self, state, count):
+        """Returns count values; nodes without a vectorized version generate them one at a time."""
+        return [self._generate(state) for _ in range(count)]
+
+
+class ConstGenerator(SchemaGenerator):
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def _generate(self, state):
+        return self.value
+
+    def _generate_batch(self, state, count):
+        return [self.value] * count
+
+
+class EmptyObjectGenerator(SchemaGenerator):
+    __slots__ = ()
+
+    def _generate(self, state):
+        return dict()
+
+    def _generate_batch(self, state, count):
+        return [dict() for _ in range(count)]
+
+
+EMPTY_OBJECT_GENERATOR = EmptyObjectGenerator()
+
+
+class EnumGenerator(SchemaGenerator):
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = list(values)
+
+    def _generate(self, state):
+        return state.random.choice(self.values)
+
+    def _generate_batch(self, state, count):
+        if state.np_random is None:
+            return super()._generate_batch(state, count)
+        values = self.values
+        return [values[i] for i in state.np_random.integers(0, len(values), count).tolist()]
+
+
+class IntegerGenerator(SchemaGenerator):
+    __slots__ = ("minimum", "maximum")
+
+    def __init__(self, minimum=INTEGER_RANGE[0], maximum=INTEGER_RANGE[1]):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def _generate(self, state):
+        return state.random.randint(self.minimum, self.maximum)
+
+    def _generate_batch(self, state, count):
+        if state.np_random is None or self.minimum < INT64_RANGE[0] or self.maximum > INT64_RANGE[1]:
+            return super()._generate_batch(state, count)
+        return state.np_random.integers(self.minimum, self.maximum, count, endpoint=True).tolist()
+
+
+class NumberGenerator(SchemaGenerator):
+    __slots__ = ("minimum", "maximum")
+
+    def __init__(self, minimum=NUMBER_RANGE[0], maximum=NUMBER_RANGE[1]):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def _generate(self, state):
+        return state.random.uniform(self.minimum, self.maximum)
+
+    def _generate_batch(self, state, count):
+        if state.np_random is None:
+            return super()._generate_batch(state, count)
+        return state.np_random.uniform(self.minimum, self.maximum, count).tolist()
+
+
+class StringGenerator(SchemaGenerator):
+    __slots__ = ("max_length",)
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+
+    def _generate(self, state):
+        return state.faker.pystr(self.max_length, self.max_length)
+
+    def _generate_batch(self, state, count):
+        if state.np_random is None or self.max_length <= 0:
+            return super()._generate_batch(state, count)
+        letters = numpy.array(list(STRING_LETTERS))
+        chars = letters[state.np_random.integers(0, len(STRING_LETTERS), (count, self.max_length))]
+        # Each row of max_length one-character strings is reinterpreted as one string.
+        return chars.view(f"<U{self.max_length}").ravel().tolist()
+
+
+class ArrayGenerator(SchemaGenerator):
+    __slots__ = ("item",)
+
+    def __init__(self, item):
+        self.item = item
+
+    def _generate(self, state):
+        return [self.item._generate(state)]
+
+    def _generate_batch(self, state, count):
+        return [[value] for value in self.item._generate_batch(state, count)]
+
+
+class ObjectGenerator(SchemaGenerator):
+    __slots__ = ("properties",)
+
+    def __init__(self, properties):
+        self.properties = properties
+
+    def _generate(self, state):
+        return { key : generator._generate(state) for key, generator in self.properties }
+
+    def _generate_batch(self, state, count):
+        if not self.properties:
+            return [dict() for _ in range(count)]
+        keys = [key for key, _ in self.properties]
+        columns = [generator._generate_batch(state, count) for _, generator in self.properties]
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+class ChoiceGenerator(SchemaGenerator):
+    __slots__ = ("alternatives",)
+
+    def __init__(self, alternatives):
+        self.alternatives = alternatives
+
+    def _generate(self, state):
+        return state.random.choice(self.alternatives)._generate(state)
+
+    def _generate_batch(self, state, count):
+        if state.np_random is None:
+            picks = [state.random.randrange(len(self.alternatives)) for _ in range(count)]
+        else:
+            picks = state.np_random.integers(0, len(self.alternatives), count).tolist()
+
+        rows = [[] for _ in self.alternatives]
+        for row, pick in enumerate(picks):
+            rows[pick].append(row)
+
+        values = [None] * count
+        for alternative, alternative_rows in zip(self.alternatives, rows):
+            if alternative_rows:
+                for row, value in zip(alternative_rows, alternative._generate_batch(state, len(alternative_rows))):
+                    values[row] = value
+        return values
+
+
+class MergeGenerator(SchemaGenerator):
+    """Generates each allOf member on its own and merges the objects, later members winning.
+
+    Used for an allOf that refers back to itself, which cannot be merged at compile time; the
+    recursive member is a RefGenerator, so it is expanded up to max_ref_depth times.
+    """
+    __slots__ = ("members",)
+
+    def __init__(self, members):
+        self.members = members
+
+    def _generate(self, state):
+        # An object member wins over a non-object one (e.g. the string alternative of a oneOf).
+        merged = None
+        for member in self.members:
+            value = member._generate(state)
+            if isinstance(value, dict) and isinstance(merged, dict):
+                merged = dict(merged, **value)
+            elif merged is None or isinstance(value, dict):
+                merged = value
+        return merged
+
+
+class _RefCycle(Exception):
+    """Raised while counting the variants of a schema that refers back to itself."""
+
+
+class SampledVariantGenerator(SchemaGenerator):
+    """Picks one variant of a composite schema per body, the way resolve_composite_schema does.
+
+    Used for allOf schemas whose variants are too many to compile upfront; the variants actually
+    drawn are compiled on first use, at most max_variants of them are kept.
+    """
+    __slots__ = ("schema", "compiler", "compiled")
+
+    def __init__(self, schema, compiler):
+        self.schema = schema
+        self.compiler = compiler
+        self.compiled = {}
+
+    def _generate(self, state):
+        choices = []
+        variant = self.compiler._sample(self.schema, state.random, choices)
+        key = tuple(choices)
+        generator = self.compiled.get(key)
+        if generator is None:
+            generator = self.compiler._compile_resolved(variant)
+            if len(self.compiled) < self.compiler.max_variants:
+                self.compiled[key] = generator
+        return generator._generate(state)
+
+
+class RefGenerator(SchemaGenerator):
+    """Expands a shared, possibly recursive, component up to max_depth nested times."""
+    __slots__ = ("ref", "target", "max_depth", "compiler")
+
+    def __init__(self, ref, max_depth, compiler):
+        self.ref = ref
+        self.target = None
+        self.max_depth = max_depth
+        self.compiler = compiler
+
+    def _generate(self, state):
+        if state.expanding[self.ref] >= self.max_depth:
+            if self.ref not in self.compiler.truncated:
+                logger.debug(f"Recursive $ref {self.ref} truncated at depth {self.max_depth}")
+            self.compiler.truncated[self.ref] += 1
+            return dict()
+
+        state.expanding[self.ref] += 1
+        try:
+            return self.target._generate(state)
+        finally:
+            state.expanding[self.ref] -= 1
+
+    def _generate_batch(self, state, count):
+        # Every body of a batch is at the same depth, so the whole batch is expanded or truncated.
+        if state.expanding[self.ref] >= self.max_depth:
+            if self.ref not in self.compiler.truncated:
+                logger.debug(f"Recursive $ref {self.ref} truncated at depth {self.max_depth}")
+            self.compiler.truncated[self.ref] += count
+            return [dict() for _ in range(count)]
+
+        state.expanding[self.ref] += 1
+        try:
+            return self.target._generate_batch(state, count)
+        finally:
+            state.expanding[self.ref] -= 1
+
+
+class SchemaCompiler(object):
+    """Turns schemas into SchemaGenerator trees, once per schema.
+
+    oneOf/anyOf become a choice between compiled alternatives, allOf is merged at compile time
+    (one merged variant per combination of its composite members, or one combination sampled per
+    body past max_variants), and in lazy_refs mode every referenced component is compiled once
+    and shared by all its users.
+    """
+
+    def __init__(self, ref_resolver=None, max_ref_depth=DEFAULT_MAX_REF_DEPTH, max_variants=DEFAULT_MAX_VARIANTS,
+                 cache_size=DEFAULT_COMPILE_CACHE_SIZE):
+        """Initialize class object.
+
+        :param ref_resolver: LazyRefResolver, None when the spec is fully expanded
+        :param max_ref_depth: int, times a recursive ref is expanded inside itself
+        :param max_variants: int, allOf variants compiled upfront at most
+        :param cache_size: int, compiled schemas kept, least recently used dropped first
+        """
+        self.ref_resolver = ref_resolver
+        self.max_ref_depth = max_ref_depth
+        self.max_variants = max_variants
+        self.cache_size = cache_size
+        self.truncated = Counter()
+        self._compiled = OrderedDict()
+        self._by_ref = {}
+
+    def compile(self, schema):
+        """Returns the generator of a schema, compiling it on first use.
+
+        :param schema: dict, request or response schema
+        :return SchemaGenerator
+        """
+        if not schema:
+            return EMPTY_OBJECT_GENERATOR
+
+        key = id(schema)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            self._compiled.move_to_end(key)
+            return compiled[1]
+
+        # The schema is kept alongside its generator so its id cannot be reused while cached.
+        generator = self._compile(schema)
+        self._compiled[key] = (schema, generator)
+        if len(self._compiled) > self.cache_size:
+            self._compiled.popitem(last=False)
+        return generator
+
+    def _deref(self, schema):
+        if self.ref_resolver is None:
+            return schema
+        return self.ref_resolver.deref(schema)
+
+    def _ref_of(self, schema):
+        if self.ref_resolver is None:
+            return None
+        return self.ref_resolver.ref_of(schema)
+
+    def _compile(self, schema):
+        if not schema:
+            return EMPTY_OBJECT_GENERATOR
+
+        ref = self._ref_of(schema)
+        if ref is not None:
+            return self._compile_ref(ref)
+
+        if type(schema) is not dict:
+            return ConstGenerator(schema)
+
+        if "oneOf" in schema or "anyOf" in schema:
+            alternatives = schema["oneOf"] if "oneOf" in schema else schema["anyOf"]
+            return ChoiceGenerator([self._compile(sub_schema) for sub_schema in alternatives])
+
+        try:
+            variant_count = self._variant_count(schema)
+        except _RefCycle as e:
+            # Only allOf merges members at compile time, so only an allOf can get here.
+            logger.debug(f"allOf member {e} refers back to the schema, merging it per body")
+            return MergeGenerator([self._compile(sub_schema) for sub_schema in schema["allOf"]])
+        if variant_count > self.max_variants:
+            return SampledVariantGenerator(schema, self)
+
+        variants = self._variants(schema)
+        if len(variants) > 1:
+            return ChoiceGenerator([self._compile_resolved(variant) for variant in variants])
+        return self._compile_resolved(variants[0])
+
+    def _compile_ref(self, ref):
+        if ref not in self._by_ref:
+            generator = RefGenerator(ref, self.max_ref_depth, self)
+            self._by_ref[ref] = generator
+            generator.target = self._compile(self.ref_resolver.resolve_ref(ref))
+        return self._by_ref[ref]
+
+    def _variants(self, schema):
+        """Returns the composite-free schemas a schema can resolve to, the way resolve_composite_schema picks them."""
+        if type(schema) is not dict:
+            return [schema]
+
+        if "oneOf" in schema or "anyOf" in schema:
+            variants = []
+            for sub_schema in schema["oneOf"] if "oneOf" in schema else schema["anyOf"]:
+                variants.extend(self._variants(self._deref(sub_schema)))
+            return variants
+
+        if "allOf" in schema:
+            sub_variants = [self._variants(self._deref(sub_schema)) for sub_schema in schema["allOf"]]
+            return [self._merge(combination) for combination in product(*sub_variants)]
+
+        return [schema]
+
+    def _variant_count(self, schema, expanding=()):
+        """Returns len(self._variants(schema)) without building the variants.
+
+        :param expanding: tuple, refs followed to get to schema
+        :raise _RefCycle: when a ref is met again inside itself, _variants would not end
+        """
+        if type(schema) is not dict:
+            return 1
+        ref = self._ref_of(schema)
+        if ref is not None:
+            if ref in expanding:
+                raise _RefCycle(ref)
+            return self._variant_count(self._deref(schema), expanding + (ref,))
+        if "oneOf" in schema or "anyOf" in schema:
+            return sum(self._variant_count(sub_schema, expanding)
+                       for sub_schema in (schema["oneOf"] if "oneOf" in schema else schema["anyOf"]))
+        if "allOf" in schema:
+            return math.prod(self._variant_count(sub_schema, expanding) for sub_schema in schema["allOf"])
+        return 1
+
+    def _sample(self, schema, random, choices):
+        """Returns one of the variants of a schema, picked like resolve_composite_schema does.
+
+        :param choices: list, the index picked at each oneOf/anyOf is appended to it
+        """
+        if type(schema) is not dict:
+            return schema
+
+        if "oneOf" in schema or "anyOf" in schema:
+            alternatives = schema["oneOf"] if "oneOf" in schema else schema["anyOf"]
+            index = random.randrange(len(alternatives))
+            choices.append(index)
+            return self._sample(self._deref(alternatives[index]), random, choices)
+
+        if "allOf" in schema:
+            return self._merge([self._sample(self._deref(sub_schema), random, choices) for sub_schema in schema["allOf"]])
+
+        return schema
+
+    @staticmethod
+    def _merge(sub_schemas):
+        merged_schema = { }
+        for sub_schema in sub_schemas :
+            if type(sub_schema) is not dict:
+                continue
+            for key, value in sub_schema.items() :
+                if key == "properties" and key in merged_schema :
+                    merged_schema[key].update(value)
+                elif key == "properties" :
+                    merged_schema[key] = dict(value)
+                else :
+                    merged_schema[key] = value
+        return merged_schema
+
+    def _compile_resolved(self, schema):
+        if type(schema) is not dict:
+            return ConstGenerator(schema)
+
+        if "enum" in schema :
+            return EnumGenerator(schema["enum"])
+
+        elif schema.get("type") == "array" :
+            return ArrayGenerator(self._compile(schema.get("items", dict())))
+
+        elif schema.get("type") == "object" :
+            properties = schema.get("properties", dict())
+            return ObjectGenerator([(key, self._compile(val)) for key, val in properties.items()])
+
+        elif schema.get("type") == "integer":
+            return IntegerGenerator(*_bounds(schema, INTEGER_RANGE, integer=True))
+
+        elif schema.get("type") == "number":
+            return NumberGenerator(*_bounds(schema, NUMBER_RANGE))
+
+        elif "maxLength" in schema.keys():
+            return StringGenerator(schema.get("maxLength"))
+
+        return ConstGenerator(f"<random-{schema.get('type', 'string')}>")
@@ -0,0 +1,218 @@
+"""On-disk cache of resolved specs, keyed by the content of the spec and of every file its $refs point to."""
+import argparse
+import hashlib
+import os
+import pickle
+import re
+
+from lib.loggers.logger import report_logger
+
+logger = report_logger()
+
+CACHE_FORMAT_VERSION = "1"
+DEFAULT_CACHE_DIR = "./OutputFiles/.spec_cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+CACHE_SUFFIX = ".pickle"
+REF_REGEX = re.compile(r"""["']?\$ref["']?\s*:\s*["']?([^"'#\s,}]*)""")
+
+
+class SpecCache(object):
+    """Stores pickled resolved specs with size-bounded LRU eviction.
+
+    An entry is keyed by a sha256 over the spec file and, transitively, every local file its $refs
+    point to, so editing any of them yields a new key. Remote (http) refs only contribute their URL
+    to the key. Recency is tracked through the entry file mtime, which is refreshed on every hit.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """Initialize class object.
+
+        :param cache_dir: str, directory holding the cache entries
+        :param max_bytes: int, total size above which least recently used entries are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def referenced_files(self, spec_path):
+        """Returns the spec file and every file reachable through its $refs, in a stable order.
+
+        :param spec_path: str, path to the root spec file
+        :return list, absolute paths and remote URLs
+        """
+        pending = [os.path.abspath(spec_path)]
+        seen = set()
+
+        while pending:
+            path = pending.pop()
+            if path in seen:
+                continue
+            seen.add(path)
+
+            if path.startswith(("http://", "https://")) or not os.path.isfile(path):
+                continue
+
+            with open(path, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+
+            for ref in REF_REGEX.findall(text):
+                if not ref:
+                    continue
+                if ref.startswith(("http://", "https://")):
+                    pending.append(ref)
+                else:
+                    pending.append(os.path.abspath(os.path.join(os.path.dirname(path), ref)))
+
+        return sorted(seen)
+
+    def key(self, spec_path):
+        """Returns the cache key of a spec.
+
+        :param spec_path: str, path to the root spec file
+        :return str, hex digest
+        """
+        root_dir = os.path.dirname(os.path.abspath(spec_path))
+        digest = hashlib.sha256(CACHE_FORMAT_VERSION.encode())
+
+        for path in self.referenced_files(spec_path):
+            if path.startswith(("http://", "https://")):
+                digest.update(f"\0url:{path}".encode())
+                continue
+
+            digest.update(f"\0file:{os.path.relpath(path, root_dir)}\0".encode())
+            if not os.path.isfile(path):
+                digest.update(b"missing")
+                continue
+
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """Returns the cached spec for a key, or None.
+
+        :param key: str, key as returned by key()
+        """
+        entry = self._entry_path(key)
+        try:
+            with open(entry, "rb") as f:
+                spec = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable spec cache entry {entry}: {e}")
+            self._remove(entry)
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(entry)
+        except OSError:
+            # Evicted or invalidated by another process since it was read; the spec is still good.
+            pass
+        self.hits += 1
+        return spec
+
+    def put(self, key, spec):
+        """Stores a resolved spec and evicts least recently used entries above max_bytes.
+
+        :param key: str, key as returned by key()
+        :param spec: dict, resolved spec
+        """
+        entry = self._entry_path(key)
+        tmp_entry = f"{entry}.{os.getpid()}.tmp"
+
+        with open(tmp_entry, "wb") as f:
+            pickle.dump(spec, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_entry, entry)
+
+        self._evict()
+
+    def get_or_resolve(self, spec_path, resolve):
+        """Returns the cached spec for spec_path, calling resolve() and caching its result on a miss.
+
+        :param spec_path: str, path to the root spec file
+        :param resolve: callable, returns the resolved spec
+        """
+        key = self.key(spec_path)
+        spec = self.get(key)
+
+        if spec is None:
+            spec = resolve()
+            self.put(key, spec)
+        else:
+            logger.debug(f"Using cached resolved spec for {spec_path}")
+
+        return spec
+
+    def invalidate(self, spec_path):
+        """Removes the entry of the current content of a spec.
+
+        Entries of older revisions are left to age out through LRU eviction.
+
+        :param spec_path: str, path to the root spec file
+        :return bool, True if an entry was removed
+        """
+        return self._remove(self._entry_path(self.key(spec_path)))
+
+    def clear(self):
+        for entry in self._entries():
+            self._remove(entry[2])
+
+    def size(self):
+        return sum(entry[1] for entry in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(entry[1] for entry in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+                logger.debug(f"Evicted spec cache entry {path}")
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Manage the resolved spec cache.")
+    arg_parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    arg_parser.add_argument("--clear", action="store_true", help="remove every entry")
+    arg_parser.add_argument("--invalidate", nargs="*", default=[], metavar="SPEC", help="remove the entries of these specs")
+    args = arg_parser.parse_args()
+
+    cache = SpecCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+    for spec_file in args.invalidate:
+        cache.invalidate(spec_file)
+
+    logger.info(f"spec cache {args.cache_dir}: {cache.size()} bytes")
@@ -1,16 +1,18 @@
 import os
-import sys
-import time
-import traceback
 
 import yaml
 import json
 
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 from lib.SpecTrafficGenerator.OpenApiSpecParser import OpenApiSpecParser
+from lib.SpecTrafficGenerator.corpus import get_files
+from lib.SpecTrafficGenerator.spec_cache import SpecCache
+from lib.parsers.testcase_io import expand_inputs, iter_testcases
+from lib.SpecTrafficGenerator.spec_testing.scheduler import BlockedUnknownPathCheck, PipelineScheduler
 from lib.api.client_stubs.apisecurity.current.rest import ApiException
-from lib.parsers.xlsx_parser import XlSXParser
+from lib.trafficgenerator.async_traffic_sender import AsyncTrafficSender
 from lib.trafficgenerator.traffic_generator import TrafficGenerator
 from lib.api.apiobjects.inventory.myapi.api_inventory import ApiInventory
 from lib.api.imperva_api import ImpervaAPI
@@ -18,7 +20,10 @@ from lib.loggers.logger import report_logger
 
 logger = report_logger()
 
-RESPONSE_DELAY = 30
+READY_TIMEOUT = 600
+GENERATE_WORKERS = 2
+USE_ASYNC_SENDER = True
+SEND_CONCURRENCY = 256
 TEST_ENV = "<confidential>"
 USE_RECEIVER = "False"
 HOST = "<your Host>"
@@ -29,16 +34,21 @@ ON_BOARDED_SITES = {
 ACC_ID = ********
 API_KEY = "<API_KEY>"
 API_ID = <API_KEY>
+SPEC_CACHE_DIR = "./OutputFiles/.spec_cache"
 
 def send_valid_traffic(outputfile, host):
     logger.info("Send Traffic")
     traffic_gen_obj = TrafficGenerator(TEST_ENV, USE_RECEIVER, host = host)
 
-    with open(outputfile, "r") as out_file :
-        data = json.load(out_file)
+    for test_id, testcase in iter_testcases(outputfile) :
+        traffic_gen_obj.send_traffic(list(expand_inputs(testcase["input"])), str(test_id), num_threads=0)
 
-    for test_id, testcase in data.items() :
-        traffic_gen_obj.send_traffic(testcase["input"], str(test_id), num_threads=0)
+def send_valid_traffic_async(outputfile, host):
+    logger.info("Send Traffic")
+    sender = AsyncTrafficSender(host=host, scheme="https", concurrency=SEND_CONCURRENCY)
+    stats = sender.run(outputfile)
+    logger.info(f"Traffic stats for {outputfile}: {stats}")
+    return stats
 
 
 class OpenApiSpecTest(object):
@@ -78,83 +88,35 @@ class OpenApiSpecTest(object):
         return self.inventory_api.delete_oas_file(api_file_id=api_file_id, site_id=site_id)
 
 
-def get_files(folder):
-    file_lst = []
-
-    for item in os.listdir(folder):
-        if item.endswith(".json") or item.endswith(".yaml") or item.endswith(".yml"):
-            if ':' in item:
-                item_renamed = item.replace(':', '_')
-                os.rename(os.path.join(folder, item), os.path.join(folder, item_renamed))
-                item = item_renamed
-            file_lst.append(item)
-
-    return file_lst
-
-def process_file(file, index, directory_name, oas_test, files_tested, files_yet_to_be_tested_manually, unsuccessful_deletes):
-
-    file_id = None
-    site_id = SITE_IDS[index%len(SITE_IDS)]
-    host = ON_BOARDED_SITES[site_id]
-
-    try:
-        swagger_file = os.path.join(directory_name, file)
-        base_path = OpenApiSpecParser(swagger_file).run_main()
-
-        logger.info(f"base_path: {base_path}")
-
-        file_id = oas_test.set_block_upload(base_path=base_path, swagger_file=file,
-                                            api_specification=swagger_file, site_id=site_id)
-
-        logger.info(f"file_id: {file_id} uploaded successfully.")
-
-        xlparser = XlSXParser(f"./OutputFiles/{swagger_file.split('/')[-1]}.xlsx", "discovery_engine")
-        xlparser.get_json_file(f"./OutputFiles/{file}.json")
-
-        logger.info("Created the Output.json file.")
+def generate_traffic(file, directory_name):
+    swagger_file = os.path.join(directory_name, file)
+    output_file = f"./OutputFiles/{file}.ndjson"
 
-        logger.info(f"waiting for {RESPONSE_DELAY} seconds to publish the policies")
-        time.sleep(RESPONSE_DELAY)
+    base_path = OpenApiSpecParser(swagger_file, spec_cache=SpecCache(SPEC_CACHE_DIR)).get_json_file(output_file)
 
-        send_valid_traffic(f"./OutputFiles/{file}.json", host=host)
+    logger.info(f"Created the {output_file} file.")
 
-        files_tested.append({
-            "file_id": file_id,
-            "file": file,
-            "host": host
-        })
-
-        deleted_oas = oas_test.delete_swagger_file(api_file_id=file_id, site_id=site_id)
-
-        if not deleted_oas :
-            unsuccessful_deletes.append({
-                "file_id" : file_id,
-                "file" : file,
-                "host" : host
-            })
-
-        logger.info(f"Tested {file} file Correctly.")
+    return {
+        "base_path": base_path,
+        "swagger_file": swagger_file,
+        "output": output_file
+    }
 
-    except Exception as e:
-        tb = sys.exc_info()
-        logger.error(f"\n\n\nEXCEPTION AT LINE : {tb[2].tb_lineno}: {e}")
+def pipeline_stages(oas_test):
+    def upload(job):
+        return oas_test.set_block_upload(base_path=job.base_path, swagger_file=job.file,
+                                         api_specification=job.generated["swagger_file"], site_id=job.site_id)
 
-        files_yet_to_be_tested_manually.append({
-                "file_id" : file_id,
-                "file": file,
-                "host" : host,
-                "Exception Line": tb[2].tb_lineno,
-                "Exception Class": tb[0].__name__,
-                "Exception Value": str(tb[1]),
-                "Traceback": "".join(traceback.format_tb(tb[2]))
-            })
+    def send(job):
+        if USE_ASYNC_SENDER:
+            send_valid_traffic_async(job.generated["output"], host=job.host)
+        else:
+            send_valid_traffic(job.generated["output"], host=job.host)
 
-        logger.info(f"\n\n\n {file} is yet to be published\n\n\n")
+    def cleanup(job):
+        return oas_test.delete_swagger_file(api_file_id=job.file_id, site_id=job.site_id)
 
-    finally:
-        if index != len(file_list)-1 :
-            logger.info(f"Waiting for 10 minutes for testing a new file.")
-            time.sleep(600)
+    return upload, send, cleanup
 
 if __name__ == "__main__" :
 
@@ -162,28 +124,21 @@ if __name__ == "__main__" :
 
     file_list = get_files(directory_name)
 
-    files_yet_to_be_tested_manually = []
-    files_tested = []
-    unsuccessful_deletes = []
-
     oas_test = OpenApiSpecTest(host=HOST, account_id=ACC_ID, api_key=API_KEY, api_id=API_ID)
-
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = []
-
-        for index, file in enumerate(file_list):
-            futures.append(executor.submit(process_file, file, index, directory_name, oas_test, files_tested, files_yet_to_be_tested_manually, unsuccessful_deletes))
-
-        for future in futures:
-            future.result()
-
-    logger.info(f"Tested {len(files_tested)}/{len(file_list)} files correctly in total")
-
-    json_obj = {
-        "Executed" : files_tested,
-        "Not Executed" : files_yet_to_be_tested_manually,
-        "Not Deleted" : unsuccessful_deletes
-    }
+    upload, send, cleanup = pipeline_stages(oas_test)
+    policy_live = BlockedUnknownPathCheck()
+
+    with ProcessPoolExecutor(max_workers=GENERATE_WORKERS) as generate_executor:
+        scheduler = PipelineScheduler(generate=partial(generate_traffic, directory_name=directory_name),
+                                      upload=upload, send=send, cleanup=cleanup,
+                                      readiness_check=policy_live,
+                                      cleanup_check=lambda job: not policy_live(job),
+                                      sites={site_id : ON_BOARDED_SITES[site_id] for site_id in SITE_IDS},
+                                      generate_executor=generate_executor,
+                                      ready_timeout=READY_TIMEOUT)
+        json_obj = scheduler.run(file_list)
+
+    logger.info(f"Tested {len(json_obj['Executed'])}/{len(file_list)} files correctly in total")
 
     with open(f"Execution_Data_{directory_name.split('/')[-1]}.json", "w") as j_file:
         json.dump(json_obj, j_file, indent=4)
@@ -0,0 +1,231 @@
+"""Staged scheduler for the spec upload/traffic runs, polling for policy readiness instead of sleeping."""
+import queue
+import sys
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.loggers.logger import report_logger
+
+logger = report_logger()
+
+DEFAULT_READY_TIMEOUT = 600
+DEFAULT_INITIAL_DELAY = 1
+DEFAULT_MAX_DELAY = 30
+DEFAULT_BACKOFF_FACTOR = 2
+
+
+def poll_until_ready(check, timeout=DEFAULT_READY_TIMEOUT, initial_delay=DEFAULT_INITIAL_DELAY,
+                     max_delay=DEFAULT_MAX_DELAY, factor=DEFAULT_BACKOFF_FACTOR, sleep=time.sleep, clock=time.monotonic):
+    """Calls check() with exponential backoff until it returns a truthy value or timeout elapses.
+
+    An exception raised by check() counts as "not ready yet".
+
+    :param check: callable, no arguments
+    :param timeout: float, seconds before giving up
+    :return bool, True if check() succeeded in time
+    """
+    deadline = clock() + timeout
+    delay = initial_delay
+
+    while True:
+        try:
+            if check():
+                return True
+        except Exception as e:
+            logger.debug(f"Readiness check failed: {e}")
+
+        remaining = deadline - clock()
+        if remaining <= 0:
+            return False
+
+        sleep(min(delay, remaining))
+        delay = min(delay * factor, max_delay)
+
+
+class FixedDelayCheck(object):
+    """Ready once delay seconds have passed since the first check, i.e. the old fixed sleep."""
+
+    def __init__(self, delay, clock=time.monotonic):
+        self.delay = delay
+        self.clock = clock
+        self._started = {}
+
+    def __call__(self, job):
+        started = self._started.setdefault(job.file, self.clock())
+        return self.clock() - started >= self.delay
+
+
+class BlockedUnknownPathCheck(object):
+    """Ready once the site blocks a request to an unknown path under the uploaded spec's base path.
+
+    The specs are uploaded with BLOCK_REQUEST, so the policy is live when <base_path>/UnknownPath
+    starts returning expected_status. Point scheme/host at a local stand-in to test it.
+    """
+
+    def __init__(self, scheme="https", expected_status=403, request_timeout=10):
+        self.scheme = scheme
+        self.expected_status = expected_status
+        self.request_timeout = request_timeout
+
+    def url(self, job):
+        return f"{self.scheme}://{job.host}{(job.base_path or '').rstrip('/')}/UnknownPath"
+
+    def __call__(self, job):
+        try:
+            with urllib.request.urlopen(self.url(job), timeout=self.request_timeout) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        return status == self.expected_status
+
+
+class Job(object):
+    """One spec file going through the pipeline."""
+
+    def __init__(self, file, index):
+        self.file = file
+        self.index = index
+        self.site_id = None
+        self.host = None
+        self.file_id = None
+        self.base_path = None
+        self.generated = None
+
+
+class PipelineScheduler(object):
+    """Runs generate -> upload -> wait until ready -> send -> delete for many spec files.
+
+    Generation runs ahead on its own executor, so the next spec's traffic is generated while the
+    previous policy is publishing. Each site runs one spec at a time (its policy slot), and the
+    sites run concurrently, so traffic for ready sites is sent in parallel. Waiting is done by
+    polling readiness_check with exponential backoff; when cleanup_check is given, the site is
+    polled with it after a delete before it takes the next spec.
+
+    Stage callables:
+        generate(file) -> dict with at least "base_path"; must be picklable for a process pool
+        upload(job) -> file_id
+        send(job)
+        cleanup(job) -> bool, False if the spec could not be deleted
+        readiness_check(job) -> bool
+        cleanup_check(job) -> bool, optional, True once the deleted policy is gone
+    """
+
+    def __init__(self, generate, upload, send, cleanup, readiness_check, sites, generate_executor=None,
+                 ready_timeout=DEFAULT_READY_TIMEOUT, initial_delay=DEFAULT_INITIAL_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, cleanup_check=None):
+        """Initialize class object.
+
+        :param sites: dict, site_id -> host
+        :param generate_executor: Executor, defaults to a 2 worker ThreadPoolExecutor
+        """
+        self.generate = generate
+        self.upload = upload
+        self.send = send
+        self.cleanup = cleanup
+        self.readiness_check = readiness_check
+        self.sites = sites
+        self.generate_executor = generate_executor
+        self.ready_timeout = ready_timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.cleanup_check = cleanup_check
+
+        self.files_tested = []
+        self.files_yet_to_be_tested_manually = []
+        self.unsuccessful_deletes = []
+        self._lock = threading.Lock()
+
+    def _poll(self, check):
+        return poll_until_ready(check, timeout=self.ready_timeout, initial_delay=self.initial_delay,
+                                max_delay=self.max_delay)
+
+    def _record(self, records, job, **extra):
+        with self._lock:
+            records.append(dict({"file_id": job.file_id, "file": job.file, "host": job.host}, **extra))
+
+    def _run_job(self, job, generated_future):
+        try:
+            job.generated = generated_future.result()
+            job.base_path = job.generated.get("base_path")
+            logger.info(f"base_path: {job.base_path}")
+
+            job.file_id = self.upload(job)
+            logger.info(f"file_id: {job.file_id} uploaded successfully.")
+
+            if not self._poll(lambda: self.readiness_check(job)):
+                raise TimeoutError(f"policy for {job.file} not ready on {job.host} after {self.ready_timeout}s")
+
+            self.send(job)
+            self._record(self.files_tested, job)
+            logger.info(f"Tested {job.file} file Correctly.")
+
+        except Exception as e:
+            tb = sys.exc_info()
+            logger.error(f"\n\n\nEXCEPTION AT LINE : {tb[2].tb_lineno}: {e}")
+            self._record(self.files_yet_to_be_tested_manually, job, **{
+                "Exception Line": tb[2].tb_lineno,
+                "Exception Class": tb[0].__name__,
+                "Exception Value": str(tb[1]),
+                "Traceback": "".join(traceback.format_tb(tb[2]))
+            })
+            logger.info(f"\n\n\n {job.file} is yet to be published\n\n\n")
+
+        finally:
+            if job.file_id is not None:
+                self._cleanup(job)
+
+    def _cleanup(self, job):
+        try:
+            deleted = self.cleanup(job)
+        except Exception as e:
+            logger.error(f"Deleting {job.file_id} failed: {e}")
+            deleted = False
+
+        if not deleted:
+            self._record(self.unsuccessful_deletes, job)
+        elif self.cleanup_check is not None and not self._poll(lambda: self.cleanup_check(job)):
+            logger.warning(f"Site {job.site_id} still enforces {job.file} after delete")
+
+    def _site_worker(self, site_id, jobs):
+        while True:
+            try:
+                job, generated_future = jobs.get_nowait()
+            except queue.Empty:
+                return
+            job.site_id = site_id
+            job.host = self.sites[site_id]
+            self._run_job(job, generated_future)
+
+    def run(self, files):
+        """Runs every file through the pipeline.
+
+        :param files: list, spec file names
+        :return dict, "Executed", "Not Executed" and "Not Deleted" records
+        """
+        own_executor = self.generate_executor is None
+        generate_executor = ThreadPoolExecutor(max_workers=2) if own_executor else self.generate_executor
+
+        try:
+            jobs = queue.Queue()
+            for index, file in enumerate(files):
+                jobs.put((Job(file, index), generate_executor.submit(self.generate, file)))
+
+            site_threads = [threading.Thread(target=self._site_worker, args=(site_id, jobs), name=f"site-{site_id}")
+                            for site_id in self.sites]
+            for thread in site_threads:
+                thread.start()
+            for thread in site_threads:
+                thread.join()
+        finally:
+            if own_executor:
+                generate_executor.shutdown()
+
+        return {
+            "Executed" : self.files_tested,
+            "Not Executed" : self.files_yet_to_be_tested_manually,
+            "Not Deleted" : self.unsuccessful_deletes
+        }
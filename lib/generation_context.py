@@ -0,0 +1,61 @@
+"""Seeded random/Faker source shared by the spec parser, body generators and label parser."""
+import hashlib
+import random
+
+from faker import Faker
+
+DEFAULT_LOCALE = "en_US"
+
+_default_context = None
+
+
+def derive_seed(seed, worker_id):
+    """Returns the seed of an independent substream of seed.
+
+    :param seed: int, parent seed
+    :param worker_id: int/str, worker, process or shard identifier
+    :return int, 64 bit seed
+    """
+    digest = hashlib.sha256(f"{seed}:{worker_id}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+class GenerationContext(object):
+    """Owns one seeded random.Random and one Faker instance.
+
+    Everything that draws random data during a run takes its values from a context, so a run is
+    reproducible from its seed. spawn() gives workers their own independent, reproducible streams.
+    """
+
+    def __init__(self, seed=None, locale=DEFAULT_LOCALE):
+        """Initialize class object.
+
+        :param seed: int, None picks a random seed (still recorded in self.seed)
+        :param locale: str, Faker locale
+        """
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(63)
+        self.locale = locale
+        self.random = random.Random(self.seed)
+        self._faker = None
+
+    @property
+    def faker(self):
+        if self._faker is None:
+            self._faker = Faker(self.locale)
+            self._faker.seed_instance(self.seed)
+        return self._faker
+
+    def spawn(self, worker_id):
+        """Returns the context of a worker, seeded from this context's seed and worker_id."""
+        return GenerationContext(derive_seed(self.seed, worker_id), self.locale)
+
+    def __repr__(self):
+        return f"GenerationContext(seed={self.seed}, locale={self.locale!r})"
+
+
+def default_context():
+    """Returns the process wide context used when no context is passed explicitly."""
+    global _default_context
+    if _default_context is None:
+        _default_context = GenerationContext()
+    return _default_context
@@ -0,0 +1,256 @@
+"""Offset-indexed NDJSON corpus, read through mmap for random access and sharded replay."""
+import argparse
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+from array import array
+
+from lib.loggers.logger import report_logger
+from lib.parsers.testcase_io import iter_testcases, write_ndjson_testcases
+
+logger = report_logger()
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"TCIDX\x00\x00\x01"
+# magic, byte order (0 little, 1 big), corpus size in bytes, corpus mtime in ns, record count
+INDEX_HEADER = struct.Struct("<8sBQQQ")
+INDEX_HEADER_SIZE = 64
+BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+
+
+def index_path(corpus_file):
+    return corpus_file + INDEX_SUFFIX
+
+
+def build_index(corpus_file):
+    """Scans an NDJSON corpus once and writes its sidecar offset index.
+
+    The index is a fixed header followed by count + 1 unsigned 64 bit offsets: the start of every
+    non-blank line and the end of the last one, so record i spans offsets[i]:offsets[i + 1]. It is
+    written to a temporary file and renamed, so concurrent workers never see a partial index.
+    As with iter_ndjson_testcases, a last line without its newline (a corpus still being written
+    or cut short) is not a record and is left out with a warning.
+
+    :param corpus_file: str, path to the NDJSON corpus
+    :return int, number of records
+    """
+    stat = os.stat(corpus_file)
+    offsets = array("Q")
+
+    with open(corpus_file, "rb") as f:
+        if stat.st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                start = 0
+                while start < stat.st_size:
+                    end = mm.find(b"\n", start)
+                    if end == -1:
+                        if mm[start:].strip():
+                            logger.warning(f"Last line of {corpus_file} is incomplete, leaving it out of the index")
+                        break
+                    if mm[start:end].strip():
+                        offsets.append(start)
+                        last_end = end + 1
+                    start = end + 1
+        if offsets:
+            offsets.append(last_end)
+
+    count = max(len(offsets) - 1, 0)
+    header = INDEX_HEADER.pack(INDEX_MAGIC, BYTE_ORDER, stat.st_size, stat.st_mtime_ns, count)
+
+    directory = os.path.dirname(os.path.abspath(corpus_file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=INDEX_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header.ljust(INDEX_HEADER_SIZE, b"\0"))
+            offsets.tofile(f)
+        os.replace(tmp_path, index_path(corpus_file))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return count
+
+
+def convert_to_ndjson(testcase_file, corpus_file):
+    """Converts a test case file (.json or .ndjson) into an indexed NDJSON corpus.
+
+    :return int, number of records
+    """
+    count = write_ndjson_testcases(corpus_file, iter_testcases(testcase_file))
+    build_index(corpus_file)
+    return count
+
+
+class CorpusIndex(object):
+    """Random access to the records of an NDJSON corpus through its sidecar offset index.
+
+    Both the corpus and the index are memory-mapped, so opening a multi-GB corpus costs no
+    parsing and only the pages of the records actually read are loaded. The index is (re)built
+    when it is missing or older than the corpus.
+
+    Records are the parsed JSON lines; for test case corpora, testcase(i) returns the
+    (test_id, test_case) pair the other readers yield.
+    """
+
+    def __init__(self, corpus_file, rebuild=True):
+        """Initialize class object.
+
+        :param corpus_file: str, path to the NDJSON corpus
+        :param rebuild: bool, build a missing or stale index instead of raising
+        """
+        self.corpus_file = corpus_file
+        self._corpus = None
+        self._index = None
+        self._mm = None
+        self._index_mm = None
+
+        if not self._index_is_current():
+            if not rebuild:
+                raise ValueError(f"No up to date index for {corpus_file}, run build_index first")
+            logger.info(f"Indexing {corpus_file}")
+            build_index(corpus_file)
+
+        self._open()
+
+    def _read_header(self):
+        try:
+            with open(index_path(self.corpus_file), "rb") as f:
+                header = f.read(INDEX_HEADER_SIZE)
+        except FileNotFoundError:
+            return None
+        if len(header) < INDEX_HEADER.size:
+            return None
+        magic, byte_order, size, mtime_ns, count = INDEX_HEADER.unpack_from(header)
+        if magic != INDEX_MAGIC or byte_order != BYTE_ORDER:
+            return None
+        return size, mtime_ns, count
+
+    def _index_is_current(self):
+        header = self._read_header()
+        if header is None:
+            return False
+        stat = os.stat(self.corpus_file)
+        return header[:2] == (stat.st_size, stat.st_mtime_ns)
+
+    def _open(self):
+        self.count = self._read_header()[2]
+
+        self._index = open(index_path(self.corpus_file), "rb")
+        self._corpus = open(self.corpus_file, "rb")
+        if self.count:
+            self._index_mm = mmap.mmap(self._index.fileno(), 0, access=mmap.ACCESS_READ)
+            self.offsets = memoryview(self._index_mm)[INDEX_HEADER_SIZE:].cast("Q")
+            self._mm = mmap.mmap(self._corpus.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.offsets = ()
+
+    def close(self):
+        if self._index_mm is not None:
+            self.offsets.release()
+            self._index_mm.close()
+            self._mm.close()
+        self.offsets = ()
+        self._index_mm = self._mm = None
+        for f in (self._index, self._corpus):
+            if f is not None:
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def raw(self, i):
+        """Returns the bytes of record i, without its newline."""
+        if not -self.count <= i < self.count:
+            raise IndexError(f"record {i} out of range for {self.count} records")
+        i %= self.count
+        return self._mm[self.offsets[i]:self.offsets[i + 1]].rstrip(b"\r\n")
+
+    def __getitem__(self, i):
+        return json.loads(self.raw(i))
+
+    def testcase(self, i):
+        """Returns (test_id, test_case) of record i of a test case corpus."""
+        record = self[i]
+        return record.pop("test_id"), record
+
+    def range(self, start=0, stop=None):
+        """Yields the parsed records start..stop-1, reading only that slice of the corpus."""
+        stop = self.count if stop is None else min(stop, self.count)
+        for i in range(max(start, 0), stop):
+            yield self[i]
+
+    def sample(self, k, rng=None):
+        """Returns k records picked at random without replacement.
+
+        :param rng: random.Random, e.g. a GenerationContext's, for a reproducible sample
+        """
+        rng = rng or random
+        return [self[i] for i in rng.sample(range(self.count), min(k, self.count))]
+
+    def shard_bounds(self, shard, shards):
+        """Returns the (start, stop) record range of shard out of shards contiguous, disjoint shards."""
+        if not 0 <= shard < shards:
+            raise ValueError(f"shard must be in [0, {shards}), got {shard}")
+        return self.count * shard // shards, self.count * (shard + 1) // shards
+
+    def shard(self, shard, shards):
+        """Yields the parsed records of one shard, see shard_bounds."""
+        return self.range(*self.shard_bounds(shard, shards))
+
+    def iter_testcases(self, start=0, stop=None):
+        """Yields (test_id, test_case) pairs of records start..stop-1."""
+        for record in self.range(start, stop):
+            yield record.pop("test_id"), record
+
+
+def iter_shard_testcases(corpus_file, shard=None):
+    """Yields (test_id, test_case) pairs of one shard of a corpus, or of the whole file.
+
+    :param corpus_file: str, test case file; must be NDJSON when shard is given
+    :param shard: tuple, (index, count), None for every test case
+    """
+    if shard is None:
+        yield from iter_testcases(corpus_file)
+        return
+    with CorpusIndex(corpus_file) as corpus:
+        yield from corpus.iter_testcases(*corpus.shard_bounds(*shard))
+
+
+def parse_shard(value):
+    """Parses a "index/count" shard argument, e.g. "0/4"."""
+    shard, shards = (int(part) for part in value.split("/"))
+    return shard, shards
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Build and inspect offset-indexed NDJSON corpora.")
+    sub_parsers = arg_parser.add_subparsers(dest="command", required=True)
+    build_parser = sub_parsers.add_parser("build", help="write the .idx sidecar of an NDJSON corpus")
+    build_parser.add_argument("corpus_file")
+    convert_parser = sub_parsers.add_parser("convert", help="convert a test case file to an indexed NDJSON corpus")
+    convert_parser.add_argument("testcase_file")
+    convert_parser.add_argument("corpus_file")
+    stats_parser = sub_parsers.add_parser("stats", help="print the record count and shard bounds")
+    stats_parser.add_argument("corpus_file")
+    stats_parser.add_argument("--shards", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    if args.command == "build":
+        logger.info(f"Indexed {build_index(args.corpus_file)} records of {args.corpus_file}")
+    elif args.command == "convert":
+        logger.info(f"Wrote {convert_to_ndjson(args.testcase_file, args.corpus_file)} records to {args.corpus_file}")
+    else:
+        with CorpusIndex(args.corpus_file) as corpus:
+            logger.info(f"{args.corpus_file}: {len(corpus)} records")
+            for shard in range(args.shards):
+                logger.info(f"shard {shard}/{args.shards}: records {corpus.shard_bounds(shard, args.shards)}")
@@ -0,0 +1,52 @@
+"""Per-worker mutable state of a LabelParser."""
+from lib.parsers.uniqueness import DEFAULT_MAX_VALUES_PER_KEY, UniquenessRegistry
+
+MUTATION_INDEXES = (0, 0.33, 0.5, 0.75, 1)
+
+
+class LabelContext(object):
+    """Everything a LabelParser changes while labelling, for one worker.
+
+    A LabelParser only holds data that is built once and shared: the compiled templates and the
+    thread-safe value pools. The uniqueness registries, the mutation settings, the random source
+    and the mutated-label pools (their values depend on the mutation settings) live here instead,
+    so one parser can label from many threads or tasks, each with its own context. A context must
+    not be used by two threads at once; creating one is cheap (see LabelParser.new_context).
+    """
+
+    def __init__(self, context, sequences, unique_values_per_key=DEFAULT_MAX_VALUES_PER_KEY):
+        """Initialize class object.
+
+        :param context: GenerationContext, random source of this worker
+        :param sequences: dict, sequence label name -> SequenceGenerator, shared or a partition
+        :param unique_values_per_key: int, values remembered per body key for uniqueness
+        """
+        self.context = context
+        self.sequences = sequences
+        self.req_unique = UniquenessRegistry(max_values_per_key=unique_values_per_key)
+        self.rsp_unique = UniquenessRegistry(max_values_per_key=unique_values_per_key)
+        self.value_pools = {}
+        self._generate_muatation_related_data()
+
+    def _generate_muatation_related_data(self):
+        """Method that generates mutation related data."""
+        self.mutation_index = self.context.random.choice(MUTATION_INDEXES)
+        self.no_of_literals = self.context.random.randint(1, 5)
+
+    def sequence_checkpoint(self):
+        """Method to get the state of the sequences, see SequenceGenerator.from_checkpoint.
+
+        :return dict, sequence label name -> state
+        """
+        return {name: sequence.checkpoint() for name, sequence in self.sequences.items()}
+
+    def uniqueness_stats(self):
+        """Method to get the collision and retry counters of the request and response bodies.
+
+        :return dict
+        """
+        return {"request": self.req_unique.stats(), "response": self.rsp_unique.stats()}
+
+    def __repr__(self):
+        return f"LabelContext(context={self.context!r}, mutation_index={self.mutation_index}, " \
+               f"no_of_literals={self.no_of_literals})"
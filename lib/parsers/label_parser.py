@@ -1,14 +1,22 @@
+import itertools
 import json
 import os
-import urllib
+import threading
+from functools import partial
 from operator import index
 
-import exrex
 import json_flatten
 from lib.loggers.logger import report_logger
 from lib.label_value_generator import generate_fake_data, mutate_label_value
-import random
+from lib.generation_context import GenerationContext
 from lib.parsers import ede_parser
+from lib.parsers.label_context import LabelContext
+from lib.parsers.sequence_generator import default_sequences, partition_sequences
+from lib.parsers.regex_generator import compile_graphql, compile_regex
+from lib.parsers.label_templates import (BodyTemplate, compile_body_text, compile_header_template,
+                                         compile_url_template, render_url)
+from lib.parsers.uniqueness import DEFAULT_MAX_VALUES_PER_KEY, UniquenessRegistry
+from lib.parsers.value_pool import DEFAULT_BATCH_SIZE, ValuePool, parse_label_name
 
 
 logger = report_logger()
@@ -31,153 +39,254 @@ def convert_parameter_body(param_json):
         return param_json
 
 class LabelParser:
+    """Substitutes <label> placeholders in test case URLs, headers and bodies.
 
-    def __init__(self):
-        self.req_unique = {}
-        self.rsp_unique = {}
-        self._generate_muatation_related_data()
-        self._initialize_seed_values()
-    def _increment_ssn_seed(self):
-        """Method to increment ssn seed value."""
-        ssn_seed_list = self.ssn_seed.split("-")
-        ssn_seed_list[len(ssn_seed_list) - 1] = str(
-            int(ssn_seed_list[len(ssn_seed_list) - 1]) + 1
-        )
-        self.ssn_seed = "-".join(ssn_seed_list)
-
-    def _generate_muatation_related_data(self):
-        """Method that generates mutation related data."""
-        self.mutation_index = random.choice([0, 0.33, 0.5, 0.75, 1])
-        self.no_of_literals = random.randint(1, 5)
-
-    def _initialize_seed_values(self):
-        """Method to intialize ssn and routing number seed value for sequence."""
-        self.ssn_seed = generate_fake_data(
-            "ssn", valid=True, count=1
-        )[0]
-        self.routing_num = generate_fake_data(
-            "us-banking-info", valid=True, count=1
-        )[0]
-
-    def fetch_labels(self, label_name):
+    The parser itself only holds what is built once and shared read-only between workers: the
+    value pools (thread-safe) and the sequences, while templates are compiled into module level
+    caches. Mutable per-run state lives in a LabelContext; every labelling method takes one and
+    falls back to the parser's own default context, so single-threaded callers need not care.
+    Threads and async workers each get their own from new_context().
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, seed=None, context=None,
+                 unique_values_per_key=DEFAULT_MAX_VALUES_PER_KEY, sequences=None):
+        """Initialize class object.
+
+        :param unique_values_per_key: int, values remembered per body key for uniqueness
+        :param sequences: dict, sequence label name -> SequenceGenerator, e.g. one partition of
+            shared sequences per worker (see partition_sequences); new ones if None
+        """
+        self.context = context if context is not None else GenerationContext(seed)
+        self.batch_size = batch_size
+        self.unique_values_per_key = unique_values_per_key
+        self.value_pools = {}
+        self._lock = threading.Lock()
+        self._worker_ids = itertools.count()
+        self._initialize_seed_values(sequences)
+        self.label_context = LabelContext(self.context, self.sequences, unique_values_per_key)
+
+    @property
+    def req_unique(self):
+        return self.label_context.req_unique
+
+    @property
+    def rsp_unique(self):
+        return self.label_context.rsp_unique
+
+    @property
+    def mutation_index(self):
+        return self.label_context.mutation_index
+
+    @property
+    def no_of_literals(self):
+        return self.label_context.no_of_literals
+
+    @property
+    def ssn_seed(self):
+        return self.sequences["ssn"].peek()
+
+    @property
+    def routing_num(self):
+        return self.sequences["us-banking-info"].peek()
+
+    def _initialize_seed_values(self, sequences=None):
+        """Method to intialize ssn and routing number sequences.
+
+        New sequences start at values drawn from the context Faker, so they are reproducible
+        from the context seed.
+        """
+        self.sequences = sequences if sequences is not None else default_sequences(self.context)
+
+    def new_context(self, worker_id=None, partition=None):
+        """Method to create the LabelContext of one worker.
+
+        The worker's random source is spawned from the parser's context, so it is reproducible
+        from the parser seed and worker_id. Sequences are shared (they are thread-safe) unless
+        partition is given; partitions suit workers in other processes, which cannot share them.
+        Once partitioned, the parser's sequences should not issue values themselves.
+
+        :param worker_id: int/str, worker identifier, the next free number if None
+        :param partition: tuple, (index, count) sequence partition of this worker
+        :return LabelContext
+        """
+        if worker_id is None:
+            with self._lock:
+                worker_id = next(self._worker_ids)
+        sequences = self.sequences if partition is None else partition_sequences(self.sequences, *partition)
+        return LabelContext(self.context.spawn(worker_id), sequences, self.unique_values_per_key)
+
+    def sequence_checkpoint(self, label_context=None):
+        """Method to get the state of the sequences, see SequenceGenerator.from_checkpoint.
+
+        :return dict, sequence label name -> state
+        """
+        return (label_context or self.label_context).sequence_checkpoint()
+
+    def _value_pool(self, label_name, parsed, label_context):
+        """Method to get the value pool of a valid, invalid, mutated, random, regex or graphql label.
+
+        Mutated values depend on the mutation settings of the context, so they are pooled per
+        context; every other pool is shared by all contexts.
+
+        :param label_name: str, name of the label
+        :param parsed: ParsedLabel, label_name split into kind and name
+        :param label_context: LabelContext, context of the calling worker
+        :return ValuePool, None for labels that are not pooled
+        """
+        value_pools = label_context.value_pools if parsed.kind == "mutated" else self.value_pools
+        pool = value_pools.get(label_name)
+        if pool is not None:
+            return pool
+
+        if parsed.kind == "valid":
+            producer = lambda count: generate_fake_data(parsed.name, valid=True, count=count)
+        elif parsed.kind == "invalid":
+            producer = lambda count: generate_fake_data(parsed.name, valid=False, count=count)
+        elif parsed.kind == "mutated":
+            producer = lambda count: mutate_label_value(
+                parsed.name,
+                True,
+                count,
+                label_context.mutation_index,
+                label_context.no_of_literals
+            )
+        elif parsed.kind == "random":
+            producer = lambda count: generate_fake_data(parsed.name, count=count)
+        elif parsed.kind == "regex":
+            producer = compile_regex(parsed.name).many
+        elif parsed.kind == "graphql":
+            producer = compile_graphql(parsed.name).many
+        else:
+            return None
+        with self._lock:
+            return value_pools.setdefault(label_name, ValuePool(producer, self.batch_size))
+
+    def pool_stats(self, label_context=None):
+        """Method to get refill and usage counters of the shared value pools and of the mutated
+        label pools of a context.
+
+        :return dict, label name -> pool counters
+        """
+        value_pools = dict(self.value_pools, **(label_context or self.label_context).value_pools)
+        return {label_name: pool.stats() for label_name, pool in value_pools.items()}
+
+    def fetch_labels(self, label_name, label_context=None):
         """Method to get labels using faker module.
 
         :param label_name: str, name of the label
+        :param label_context: LabelContext, the parser's default context if None
         :return str, label
         """
-        label = None
-        if label_name.strip().split("-")[0] == "valid":
-            label_name = "-".join(label_name.strip().split("-")[1:])
-            valid_bool = True
-            labelled_data = generate_fake_data(
-                label_name, valid=valid_bool, count=1
-            )
-        elif label_name.strip().split("-")[0] == "invalid":
-            label_name = "-".join(label_name.strip().split("-")[1:])
-            valid_bool = False
-            labelled_data = generate_fake_data(
-                label_name, valid=valid_bool, count=1
-            )
-        elif label_name.strip().split("-")[0] == "mutated":
-            label_name = "-".join(label_name.strip().split("-")[1:])
-            valid_bool = True
-            labelled_data = mutate_label_value(
-                label_name,
-                valid_bool,
-                1,
-                self.mutation_index,
-                self.no_of_literals
-            )
-        elif label_name.strip().split("-")[0] == "sequence":
-            label_name = "-".join(label_name.strip().split("-")[1:])
-            if label_name == "ssn":
-                labelled_data = [self.ssn_seed]
-                self._increment_ssn_seed()
-            if label_name == "us-banking-info":
-                labelled_data = [self.routing_num]
-                self.routing_num = str(
-                    int(self.routing_num) + 1
-                )
-        elif label_name.strip().split(":")[0] == "regex":
-            label_name = "".join(label_name.strip().split(":")[1:])
-            labelled_data = [exrex.getone(label_name)]
-
-        elif "<regex:" in label_name:
-            logger.debug("Fetchin label for graphql")
-            import re  # importing only when needed
-            def replace_placeholder(match):
-                regex_pattern = match.group(1)
-                return exrex.getone(regex_pattern)
-
-            query = re.sub(r"<regex:([^>]+)>", replace_placeholder, label_name)
-            labelled_data = [query]
-
-        elif label_name.strip().split("-")[0] == "random":
-            label_name = "-".join(label_name.strip().split("-")[1:])
-
-            labelled_data = generate_fake_data(
-                label_name, count=1
-            )
+        label_context = label_context or self.label_context
+        parsed = parse_label_name(label_name)
+
+        pool = self._value_pool(label_name, parsed, label_context)
+        if pool is not None:
+            try:
+                return pool.take()
+            except IndexError:
+                logger.debug("Please enter a valid label name in template")
+                raise
+
+        labelled_data = []
+        if parsed.kind == "sequence":
+            sequence = label_context.sequences.get(parsed.name)
+            if sequence is not None:
+                labelled_data = [sequence.next()]
 
         if len(labelled_data) == 0:
             logger.debug("Please enter a valid label name in template")
         return labelled_data[0]
 
-    def _parse_templates_and_enter_value(self, template_json, label_data_dict={}, unique_values={}):
+    def _unique_label_filler(self, unique_values, label_context):
+        """Method to get the fill function of body templates, retrying labels already used for a key.
+
+        :param unique_values: UniquenessRegistry, labels used so far per body key
+        :param label_context: LabelContext, context the labels are fetched with
+        :return callable, (label name, key) -> label
+        """
+        def fill(label_name, key):
+            return unique_values.claim(key, lambda: self.fetch_labels(label_name, label_context))
+        return fill
+
+    def _parse_body_and_enter_value(self, body, unique_values, label_context):
+        """Method for substituting labels in a request or response body.
+
+        Bodies given as JSON text are compiled once and cached by their text; bodies carrying
+        ede_info are regenerated by convert_parameter_body on every call.
+
+        :param body: str/dict, body template as read from the test case
+        :param unique_values: UniquenessRegistry, labels used so far per body key
+        :param label_context: LabelContext, context the labels are fetched with
+        :return json, json with labels.
+        """
+        template = compile_body_text(body) if isinstance(body, str) else None
+        if template is None:
+            return self._parse_templates_and_enter_value(template_json=convert_parameter_body(body),
+                                                         unique_values=unique_values,
+                                                         label_context=label_context)
+        return template.render(self._unique_label_filler(unique_values, label_context))
+
+    def _parse_templates_and_enter_value(self, template_json, label_data_dict=None, unique_values=None,
+                                         label_context=None):
         """Method for parsing templates and substituting them with labels.
 
         :param template_json: json, request or response body strings.
+        :param label_data_dict: dict, values of $label$ placeholders, consumed as they are used
+        :param unique_values: UniquenessRegistry, labels used so far per body key, a new one if None
+        :param label_context: LabelContext, the parser's default context if None
         :return json, json with labels.
         """
-        # print(f"unique_values: {unique_values}")
+        label_context = label_context or self.label_context
+        if unique_values is None:
+            unique_values = UniquenessRegistry()
+        if not label_data_dict:
+            return BodyTemplate(template_json).render(self._unique_label_filler(unique_values, label_context))
+
+        # $label$ values from label_data_dict still go through json_flatten.
         flattened_json = json_flatten.flatten(template_json)
         for key, value in flattened_json.items():
-            count = 15
             if isinstance(value, str):
-                unique_values.setdefault(key, [])
                 if (value.startswith('gql<') and value.endswith('>gql')) or (value[0] == "<" and value[len(value) - 1] == ">"):
                     label_name = value[4:len(value) - 4] if value.startswith('gql<') else value[1:len(value) - 1]
-                    label = self.fetch_labels(label_name)
-                    while label in unique_values[key] and count != 0:
-                        label = self.fetch_labels(label_name)
-                        count -= 1
-                    unique_values[key].append(label)
-                    flattened_json[key] = label
+                    flattened_json[key] = unique_values.claim(key, lambda: self.fetch_labels(label_name, label_context))
                 elif value[0] == "$" and value[len(value) - 1] == "$" and label_data_dict:
+                    # Each value is taken out of the list once used, so they never repeat.
                     label_value = label_data_dict.get('label_key', {}).get('values', [])
-                    while label_value in unique_values[key] and count != 0:
-                        label_value = label_data_dict.get('label_key', {}).get('values', [])
-                        count -= 1
-                    unique_values[key].append(label_value)
                     flattened_json[key] = label_value[0]
                     label_value.remove(flattened_json[key])
+                    unique_values.add(key, flattened_json[key])
         unflattened_labelled_json = json_flatten.unflatten(flattened_json)
         return unflattened_labelled_json
 
-    def _parse_header_and_enter_value(self,req_header):
-        while "<" in req_header:
-            s_index = req_header.index("<")
-            e_index = req_header.index(">")
-            req_header = (req_header[0:s_index] + str(self.fetch_labels(req_header[s_index + 1:e_index])) + req_header[e_index + 1:])
-        return req_header
-
-    def _parse_url_and_query_and_enter_value(self, url):
-        while "<" in url:
-            s_index = url.index("<", 1)
-            e_index = url.index(">", 1)
-            # url = url[0:s_index] + self.fetch_labels(url[s_index + 1:e_index]) + url[e_index + 1:]
-            url = (url[0:s_index] + urllib.parse.quote_plus(str(self.fetch_labels(url[s_index + 1:e_index]))) + url[e_index + 1:])
-        return url
-
-    def parse_label(self, url, reqbody, respbody, req_header):
+    def _parse_header_and_enter_value(self, req_header, label_context):
+        return compile_header_template(req_header).render(partial(self.fetch_labels, label_context=label_context))
+
+    def _parse_url_and_query_and_enter_value(self, url, label_context):
+        return render_url(compile_url_template(url), partial(self.fetch_labels, label_context=label_context))
+
+    def uniqueness_stats(self, label_context=None):
+        """Method to get the collision and retry counters of the request and response bodies.
+
+        :param label_context: LabelContext, the parser's default context if None
+        :return dict
+        """
+        return (label_context or self.label_context).uniqueness_stats()
+
+    def parse_label(self, url, reqbody, respbody, req_header, label_context=None):
+        """Method to fill in the labels of one test case input.
+
+        :param label_context: LabelContext of the calling worker, the parser's default context if
+            None; concurrent callers must each pass their own, see new_context
+        :return tuple, (url, reqbody, respbody, req_header)
+        """
+        label_context = label_context or self.label_context
         if len(reqbody) > 0:
-            reqbody = self._parse_templates_and_enter_value(template_json=convert_parameter_body(reqbody),
-                                                       unique_values=self.req_unique)
+            reqbody = self._parse_body_and_enter_value(reqbody, label_context.req_unique, label_context)
         if len(respbody) > 0:
-            respbody = self._parse_templates_and_enter_value(template_json=convert_parameter_body(respbody),
-                                                        unique_values=self.rsp_unique)
-        req_header = self._parse_header_and_enter_value(req_header)
-        url = self._parse_url_and_query_and_enter_value(url)
+            respbody = self._parse_body_and_enter_value(respbody, label_context.rsp_unique, label_context)
+        req_header = self._parse_header_and_enter_value(req_header, label_context)
+        url = self._parse_url_and_query_and_enter_value(url, label_context)
         return url, reqbody, respbody, req_header
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+"""Placeholder templates for LabelParser, parsed once and cached by template text."""
+import json
+from functools import lru_cache
+from urllib.parse import quote_plus
+
+DEFAULT_TEMPLATE_CACHE_SIZE = 8192
+
+
+class StringTemplate(object):
+    """A header or URL template split into literal text and <label> placeholders.
+
+    parts alternates literal, label name, literal, ..., always starting and ending with a literal,
+    so rendering is one pass over the parts and a single join.
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self, parts):
+        self.parts = tuple(parts)
+
+    @property
+    def labels(self):
+        return self.parts[1::2]
+
+    def render(self, fetch, quote=None):
+        """Returns the template with every placeholder replaced.
+
+        :param fetch: callable, label name -> value
+        :param quote: callable, applied to each str(value), e.g. quote_plus
+        :return str
+        """
+        parts = self.parts
+        if len(parts) == 1:
+            return parts[0]
+        rendered = list(parts)
+        for i in range(1, len(parts), 2):
+            value = str(fetch(parts[i]))
+            rendered[i] = quote(value) if quote is not None else value
+        return "".join(rendered)
+
+
+def _split_placeholders(text, start=0):
+    parts = []
+    literal_start = 0
+    while True:
+        s_index = text.find("<", start)
+        if s_index == -1:
+            break
+        e_index = text.find(">", s_index + 1)
+        if e_index == -1:
+            raise ValueError(f"Unterminated placeholder in template {text!r}")
+        parts.append(text[literal_start:s_index])
+        parts.append(text[s_index + 1:e_index])
+        literal_start = start = e_index + 1
+    parts.append(text[literal_start:])
+    return parts
+
+
+@lru_cache(maxsize=DEFAULT_TEMPLATE_CACHE_SIZE)
+def compile_header_template(req_header):
+    """Compiles a request header template (JSON text with <label> placeholders)."""
+    return StringTemplate(_split_placeholders(req_header))
+
+
+@lru_cache(maxsize=DEFAULT_TEMPLATE_CACHE_SIZE)
+def compile_url_template(url):
+    """Compiles a URL template; the first character is never taken as a placeholder start."""
+    return StringTemplate(_split_placeholders(url, 1))
+
+
+def render_url(template, fetch):
+    """Renders a URL template with URL-encoded label values."""
+    return template.render(fetch, quote_plus)
+
+
+def _label_name(value):
+    """Returns the label name of a body string value, None if it is not a placeholder."""
+    if not value:
+        return None
+    if value.startswith("gql<") and value.endswith(">gql"):
+        return value[4:len(value) - 4]
+    if value[0] == "<" and value[len(value) - 1] == ">":
+        return value[1:len(value) - 1]
+    return None
+
+
+def _compile_body_node(value, key):
+    # Keys follow json_flatten's paths ("a.[0].b") so the uniqueness bookkeeping keeps its keys.
+    if isinstance(value, dict):
+        items = tuple(
+            (name, _compile_body_node(item, f"{key}.{name}" if key else str(name))) for name, item in value.items()
+        )
+        return lambda fill: {name: render(fill) for name, render in items}
+
+    if isinstance(value, list):
+        renders = tuple(_compile_body_node(item, f"{key}.[{i}]") for i, item in enumerate(value))
+        return lambda fill: [render(fill) for render in renders]
+
+    if isinstance(value, str):
+        label_name = _label_name(value)
+        if label_name is not None:
+            return lambda fill: fill(label_name, key)
+
+    return lambda fill: value
+
+
+class BodyTemplate(object):
+    """A request/response body compiled into a tree of render functions.
+
+    Literal values are reused as they are and placeholders are filled in through fill(label_name,
+    key), key being the json_flatten path of the value. Every render returns new dicts and lists.
+    """
+
+    __slots__ = ("_render",)
+
+    def __init__(self, template_json):
+        """Initialize class object.
+
+        :param template_json: dict, parsed body with <label> / gql<label>gql string values
+        """
+        if not isinstance(template_json, dict):
+            raise TypeError("Expected dict, got {}".format(type(template_json)))
+        self._render = _compile_body_node(template_json, "")
+
+    def render(self, fill):
+        """Returns the body with every placeholder replaced.
+
+        :param fill: callable, (label name, key) -> value
+        :return dict
+        """
+        return self._render(fill)
+
+
+@lru_cache(maxsize=DEFAULT_TEMPLATE_CACHE_SIZE)
+def compile_body_text(body_text):
+    """Compiles a body given as JSON text.
+
+    :return BodyTemplate, None when the text is not a JSON object or carries ede_info, whose
+        payload is regenerated on every call and so cannot be cached
+    """
+    try:
+        template_json = json.loads(body_text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(template_json, dict) or "ede_info" in template_json:
+        return None
+    return BodyTemplate(template_json)
+
+
+def template_cache_stats():
+    """Returns the hit/miss counters of the compiled template caches."""
+    return {
+        name: compile_function.cache_info()._asdict()
+        for name, compile_function in (("header", compile_header_template), ("url", compile_url_template),
+                                       ("body", compile_body_text))
+    }
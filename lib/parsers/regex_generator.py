@@ -0,0 +1,93 @@
+"""Compiled, cached string generators for regex: labels and <regex:...> GraphQL placeholders."""
+import re
+from functools import lru_cache
+from importlib import metadata
+
+import exrex
+
+DEFAULT_REPEAT_LIMIT = 20
+# exrex has no public API to generate from an already parsed pattern. In these releases getone()
+# is _randone(parse(pattern), limit), so the pattern is parsed once and the private _randone is
+# called directly; any other release goes through the public getone(), parsing on every call.
+EXREX_PARSED_PATTERN_VERSIONS = ("0.12.",)
+DEFAULT_GENERATOR_CACHE_SIZE = 4096
+
+GRAPHQL_REGEX_PLACEHOLDER = re.compile(r"<regex:([^>]+)>")
+
+
+def _exrex_supports_parsed_patterns():
+    try:
+        version = metadata.version("exrex")
+    except metadata.PackageNotFoundError:
+        return False
+    return version.startswith(EXREX_PARSED_PATTERN_VERSIONS) and hasattr(exrex, "_randone")
+
+
+EXREX_PARSED_PATTERNS = _exrex_supports_parsed_patterns()
+
+
+class RegexGenerator(object):
+    """Random strings matching one regular expression, parsed by exrex once instead of per value."""
+
+    __slots__ = ("pattern", "limit", "_parsed")
+
+    def __init__(self, pattern, limit=DEFAULT_REPEAT_LIMIT):
+        """Initialize class object.
+
+        :param pattern: str, regular expression
+        :param limit: int, maximum repetitions of unbounded quantifiers, as in exrex.getone
+        """
+        self.pattern = pattern
+        self.limit = limit
+        self._parsed = exrex.parse(pattern) if EXREX_PARSED_PATTERNS else None
+
+    def one(self):
+        if self._parsed is None:
+            return exrex.getone(self.pattern, self.limit)
+        return exrex._randone(self._parsed, self.limit)
+
+    def many(self, count):
+        """Returns count random matching strings."""
+        one = self.one
+        return [one() for _ in range(count)]
+
+
+class GraphQLTemplate(object):
+    """A GraphQL query with <regex:...> placeholders, split once into literals and regex generators."""
+
+    __slots__ = ("_literals", "_generators")
+
+    def __init__(self, query):
+        parts = GRAPHQL_REGEX_PLACEHOLDER.split(query)
+        # split() alternates literal, pattern, literal, ...
+        self._literals = tuple(parts[0::2])
+        self._generators = tuple(compile_regex(pattern) for pattern in parts[1::2])
+
+    def one(self):
+        literals = self._literals
+        rendered = [literals[0]]
+        for generator, literal in zip(self._generators, literals[1:]):
+            rendered.append(generator.one())
+            rendered.append(literal)
+        return "".join(rendered)
+
+    def many(self, count):
+        """Returns count filled-in queries."""
+        one = self.one
+        return [one() for _ in range(count)]
+
+
+@lru_cache(maxsize=DEFAULT_GENERATOR_CACHE_SIZE)
+def compile_regex(pattern):
+    """Returns the cached RegexGenerator of pattern."""
+    return RegexGenerator(pattern)
+
+
+@lru_cache(maxsize=DEFAULT_GENERATOR_CACHE_SIZE)
+def compile_graphql(query):
+    """Returns the cached GraphQLTemplate of query."""
+    return GraphQLTemplate(query)
+
+
+def generator_cache_stats():
+    return {"regex": compile_regex.cache_info()._asdict(), "graphql": compile_graphql.cache_info()._asdict()}
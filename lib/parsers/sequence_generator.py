@@ -0,0 +1,175 @@
+"""Thread-safe, partitionable sequences for the sequence-ssn and sequence-us-banking-info labels."""
+import json
+import os
+import re
+import tempfile
+import threading
+
+from lib.loggers.logger import report_logger
+
+logger = report_logger()
+
+TRAILING_NUMBER = re.compile(r"^(.*?)(\d+)$")
+
+
+class SequenceGenerator(object):
+    """Issues prefix + zero-padded number values: start + offset, then every stride-th number after it.
+
+    Workers get disjoint ranges by stride/offset partitioning (partition()), so generators
+    created from the same start never issue the same value, whatever their number. The counter
+    is advanced under a lock and the whole state is the checkpoint() dict, so a run can resume
+    where it stopped. The number keeps the width of the start value: past the largest number of
+    that width it wraps around to minimum (e.g. an SSN serial goes 9999, 0001, 0002, ...), so
+    values stay well-formed and only repeat once every number of the range was issued.
+    """
+
+    def __init__(self, prefix, start, width, stride=1, offset=0, issued=0, minimum=0):
+        """Initialize class object.
+
+        :param prefix: str, text before the number, e.g. "123-45-"
+        :param start: int, first number of the unpartitioned sequence
+        :param width: int, minimum number of digits
+        :param stride: int, distance between two values of this generator
+        :param offset: int, position of this generator within each stride
+        :param issued: int, values already issued, to resume from a checkpoint
+        :param minimum: int, smallest number issued after wrapping around, e.g. 1 for an SSN serial
+        """
+        if not 0 <= offset < stride:
+            raise ValueError(f"offset must be in [0, {stride}), got {offset}")
+        self.prefix = prefix
+        self.start = start
+        self.width = width
+        self.stride = stride
+        self.offset = offset
+        self.issued = issued
+        self.minimum = minimum
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_value(cls, value, minimum=0):
+        """Creates the sequence starting at value, e.g. an ssn "123-45-6789" or a routing number.
+
+        :param value: str, ends with the digits to increment
+        :param minimum: int, smallest number issued after wrapping around
+        """
+        matched = TRAILING_NUMBER.match(str(value))
+        if matched is None:
+            raise ValueError(f"Sequence start {value!r} does not end with a number")
+        prefix, digits = matched.groups()
+        return cls(prefix, int(digits), len(digits), minimum=minimum)
+
+    def _format(self, position):
+        number = self.start + self.offset + position * self.stride
+        modulus = 10 ** self.width
+        if number >= modulus:
+            if number - self.stride < modulus:
+                logger.warning(f"Sequence {self.prefix!r} ran past {self.width} digits, "
+                               f"wrapping around to {self.minimum}")
+            number = self.minimum + (number - self.minimum) % (modulus - self.minimum)
+        return f"{self.prefix}{number:0{self.width}d}"
+
+    def next(self):
+        """Returns the next value of this generator."""
+        with self._lock:
+            position = self.issued
+            self.issued += 1
+        return self._format(position)
+
+    def take(self, count):
+        """Reserves count consecutive values of this generator at once and returns them."""
+        with self._lock:
+            position = self.issued
+            self.issued += count
+        return [self._format(position + i) for i in range(count)]
+
+    def peek(self):
+        """Returns the value next() would return, without issuing it."""
+        return self._format(self.issued)
+
+    def partition(self, index, count):
+        """Returns the index-th of count generators that share this one's values without overlap.
+
+        Partitions of a partition are disjoint too. Values this generator already issued are
+        skipped by every partition; once partitioned, it should not issue values itself.
+
+        :param index: int, worker index in [0, count)
+        :param count: int, number of workers
+        """
+        if not 0 <= index < count:
+            raise ValueError(f"index must be in [0, {count}), got {index}")
+        with self._lock:
+            base = self.start + self.issued * self.stride
+        return SequenceGenerator(self.prefix, base, self.width, self.stride * count,
+                                 self.offset + index * self.stride, minimum=self.minimum)
+
+    def checkpoint(self):
+        with self._lock:
+            return {
+                "prefix": self.prefix,
+                "start": self.start,
+                "width": self.width,
+                "stride": self.stride,
+                "offset": self.offset,
+                "issued": self.issued,
+                "minimum": self.minimum,
+            }
+
+    @classmethod
+    def from_checkpoint(cls, state):
+        return cls(**state)
+
+    def __getstate__(self):
+        return self.checkpoint()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __repr__(self):
+        return f"SequenceGenerator(next={self.peek()!r}, stride={self.stride}, offset={self.offset})"
+
+
+def default_sequences(context):
+    """Creates the label sequences with random starting values drawn from a GenerationContext.
+
+    The start values used to come from generate_fake_data("ssn"/"us-banking-info", valid=True),
+    which takes no random source, so the sequences differed on every run whatever the seed. The
+    context Faker's ssn() and aba() give values of the same shape (a valid "###-##-####" SSN and a
+    9 digit ABA routing number) and make them reproducible from the context seed. The SSN serial
+    wraps around to 0001, a serial of 0000 is never valid. Pass explicit
+    sequences (e.g. load_checkpoint) to LabelParser to start from other values.
+
+    :return dict, sequence label name -> SequenceGenerator
+    """
+    return {
+        "ssn": SequenceGenerator.from_value(context.faker.ssn(), minimum=1),
+        "us-banking-info": SequenceGenerator.from_value(context.faker.aba()),
+    }
+
+
+def partition_sequences(sequences, index, count):
+    """Returns the index-th of count disjoint partitions of every sequence."""
+    return {name: sequence.partition(index, count) for name, sequence in sequences.items()}
+
+
+def save_checkpoint(checkpoint_file, sequences):
+    """Writes the state of every sequence to a JSON file, atomically."""
+    state = {name: sequence.checkpoint() for name, sequence in sequences.items()}
+    directory = os.path.dirname(os.path.abspath(checkpoint_file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f, indent=4)
+        os.replace(tmp_path, checkpoint_file)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load_checkpoint(checkpoint_file):
+    """Reads sequences written by save_checkpoint.
+
+    :return dict, sequence label name -> SequenceGenerator
+    """
+    with open(checkpoint_file) as f:
+        state = json.load(f)
+    return {name: SequenceGenerator.from_checkpoint(sequence_state) for name, sequence_state in state.items()}
@@ -0,0 +1,215 @@
+"""Streaming readers and writers for the generated test case files.
+
+Two formats are supported, picked by file extension:
+    .json             one JSON object keyed by test id (the original format)
+    .ndjson / .jsonl  one test case per line, its id in a "test_id" field
+
+Compact test cases list the response codes of an input element in its Rsp_Variants field
+("200,404,500") instead of repeating the element once per code; expand_inputs restores the
+elements right before they are sent.
+"""
+import json
+import os
+
+from lib.loggers.logger import report_logger
+
+logger = report_logger()
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+NDJSON_EXTENSIONS = (".ndjson", ".jsonl")
+RSP_VARIANTS_KEY = "Rsp_Variants"
+RESPONSE_STATUS_HEADER = "apisec-resp-status-code"
+
+
+def iter_json_testcases(json_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields (test_id, test_case) pairs of a get_json_file output without loading the whole file.
+
+    The file is one JSON object keyed by test id; it is read in chunks and decoded one member at
+    a time, so memory stays bounded by the largest single test case (plus the ids seen so far).
+    A test id is yielded once: json.load would keep the last value of a repeated id, but that is
+    not known until the end of the file, so later repeats are skipped with a warning.
+
+    :param json_file: str, path to the test case JSON file
+    :param chunk_size: int, characters read per refill
+    """
+    decoder = json.JSONDecoder()
+    seen = set()
+    duplicates = set()
+
+    with open(json_file, "r") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                fill()
+
+        def expect(chars):
+            nonlocal pos
+            skip_whitespace()
+            if pos >= len(buffer) or buffer[pos] not in chars:
+                raise ValueError(f"Malformed test case file {json_file}: expected one of {chars!r}")
+            pos += 1
+            return buffer[pos - 1]
+
+        def decode():
+            nonlocal pos
+            skip_whitespace()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    pos = end
+                    return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    fill()
+
+        expect("{")
+        skip_whitespace()
+        if pos < len(buffer) and buffer[pos] == "}":
+            return
+
+        while True:
+            test_id = decode()
+            expect(":")
+            testcase = decode()
+            if test_id not in seen:
+                seen.add(test_id)
+                yield test_id, testcase
+            elif test_id not in duplicates:
+                duplicates.add(test_id)
+                logger.warning(f"Test id {test_id} is repeated in {json_file}, keeping its first test case")
+            if expect(",}") == "}":
+                return
+
+
+def write_json_testcases(json_file, testcases):
+    """Writes (test_id, test_case) pairs as one JSON object keyed by test id, one test case at a time.
+
+    The output is the same as json.dumps(dict(testcases)) for unique ids; a repeated id is
+    written again and, as with a dict, the last one wins when the file is loaded with json.load
+    (iter_json_testcases keeps the first one and warns).
+
+    :param json_file: str, path of the test case JSON file
+    :param testcases: iterable of (test_id, test_case), test_case a dict or a TestCaseRecord
+    :return int, number of test cases written
+    """
+    count = 0
+    with open(json_file, "w") as f:
+        f.write("{")
+        for test_id, testcase in testcases:
+            if count:
+                f.write(", ")
+            f.write(json.dumps(str(test_id)))
+            f.write(": ")
+            f.write(json.dumps(_as_dict(testcase)))
+            count += 1
+        f.write("}")
+    return count
+
+
+def write_ndjson_testcases(ndjson_file, testcases):
+    """Writes (test_id, test_case) pairs as NDJSON, one line per test case, flushed as it is produced.
+
+    Each line is the test case with its id first: {"test_id": ..., "input": [...], ...}, so a
+    reader can follow the file while it is still being written.
+
+    :param ndjson_file: str, path of the test case NDJSON file
+    :param testcases: iterable of (test_id, test_case), test_case a dict or a TestCaseRecord
+    :return int, number of test cases written
+    """
+    count = 0
+    with open(ndjson_file, "w") as f:
+        for test_id, testcase in testcases:
+            line = {"test_id": test_id}
+            line.update(_as_dict(testcase))
+            f.write(json.dumps(line))
+            f.write("\n")
+            f.flush()
+            count += 1
+    return count
+
+
+def iter_ndjson_testcases(ndjson_file):
+    """Yields (test_id, test_case) pairs of an NDJSON test case file, one line at a time.
+
+    A last line without its newline (the writer was interrupted) is skipped with a warning.
+
+    :param ndjson_file: str, path to the test case NDJSON file
+    """
+    with open(ndjson_file, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.endswith("\n"):
+                logger.warning(f"{ndjson_file}:{line_number} is incomplete, skipping it")
+                return
+            if not line.strip():
+                continue
+            testcase = json.loads(line)
+            yield testcase.pop("test_id"), testcase
+
+
+def is_ndjson(path):
+    return os.path.splitext(path)[1].lower() in NDJSON_EXTENSIONS
+
+
+def iter_testcases(path):
+    """Yields (test_id, test_case) pairs of a test case file in either format, lazily."""
+    return iter_ndjson_testcases(path) if is_ndjson(path) else iter_json_testcases(path)
+
+
+def write_testcases(path, testcases):
+    """Writes (test_id, test_case) pairs in the format given by the extension of path.
+
+    :return int, number of test cases written
+    """
+    return write_ndjson_testcases(path, testcases) if is_ndjson(path) else write_json_testcases(path, testcases)
+
+
+def expand_inputs(elements):
+    """Yields the input elements of a test case with every response code variant as its own element.
+
+    A variant is a copy of the element with its rsp_code and the apisec-resp-status-code of its
+    Req_Header set to the code, i.e. the element a non-compact test case would have carried.
+
+    :param elements: iterable of dict, the "input" list of a test case
+    """
+    for element in elements:
+        variants = element.get(RSP_VARIANTS_KEY)
+        if not variants:
+            if RSP_VARIANTS_KEY in element:
+                element = {key: value for key, value in element.items() if key != RSP_VARIANTS_KEY}
+            yield element
+            continue
+
+        header = json.loads(element["Req_Header"]) if element.get("Req_Header") else None
+        for code in str(variants).split(","):
+            variant = {key: value for key, value in element.items() if key != RSP_VARIANTS_KEY}
+            variant["rsp_code"] = int(code)
+            if header is not None and RESPONSE_STATUS_HEADER in header:
+                header[RESPONSE_STATUS_HEADER] = code
+                variant["Req_Header"] = json.dumps(header)
+            yield variant
+
+
+def expand_testcase(testcase):
+    """Returns a test case with its input elements expanded, see expand_inputs."""
+    return dict(testcase, input=list(expand_inputs(testcase["input"])))
+
+
+def _as_dict(testcase):
+    return testcase if isinstance(testcase, dict) else testcase.to_dict()
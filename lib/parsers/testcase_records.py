@@ -0,0 +1,81 @@
+"""Compact records for parsed test cases, turned into the test case JSON shape only when serialized."""
+
+
+class InputElement(object):
+    """One request of a test case.
+
+    extra holds the other Input_ columns (e.g. Req_Header); it is shared by all the events
+    expanded from one row and is never mutated.
+    """
+
+    __slots__ = ("url", "host", "method", "rsp_code", "req_body", "rsp_body", "extra")
+
+    def __init__(self, url, host, method, rsp_code, req_body, rsp_body, extra):
+        self.url = url
+        self.host = host
+        self.method = method
+        self.rsp_code = rsp_code
+        self.req_body = req_body
+        self.rsp_body = rsp_body
+        self.extra = extra
+
+    def to_dict(self):
+        element = {"host": self.host, "method": self.method, "rsp_code": self.rsp_code}
+        element.update(self.extra)
+        element["req_body"] = self.req_body
+        element["rsp_body"] = self.rsp_body
+        element["url"] = self.url
+        return element
+
+
+class OutputElement(object):
+    """The Output_ columns of one row; fields is the column name tuple shared by every row of a sheet."""
+
+    __slots__ = ("fields", "values")
+
+    def __init__(self, fields, values):
+        self.fields = fields
+        self.values = values
+
+    def __bool__(self):
+        return any(self.values)
+
+    def to_dict(self):
+        return dict(zip(self.fields, self.values))
+
+
+class MetadataElement(object):
+    """Meta_/Feature_/Sensitive_ values of a test case and its payload structure."""
+
+    __slots__ = ("values", "request", "response", "query_params")
+
+    def __init__(self, values, request, response, query_params):
+        self.values = values
+        self.request = request
+        self.response = response
+        self.query_params = query_params
+
+    def to_dict(self):
+        metadata = dict(self.values)
+        metadata["payload_structure"] = {
+            "request": self.request,
+            "response": self.response,
+            "query_params": self.query_params,
+        }
+        return metadata
+
+
+class TestCaseRecord(object):
+    __slots__ = ("inputs", "outputs", "metadata")
+
+    def __init__(self, inputs, outputs, metadata):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.metadata = metadata
+
+    def to_dict(self):
+        return {
+            "input": [element.to_dict() for element in self.inputs],
+            "output": [element.to_dict() for element in self.outputs],
+            "metadata": self.metadata.to_dict(),
+        }
@@ -0,0 +1,173 @@
+"""Bounded registry of the label values already used per body key."""
+from collections import Counter, OrderedDict, deque
+
+DEFAULT_MAX_VALUES_PER_KEY = 16384
+DEFAULT_MAX_KEYS = 4096
+# Values remembered over all keys of a registry; every LabelContext holds two registries.
+DEFAULT_MAX_VALUES = 131072
+DEFAULT_MAX_RETRIES = 15
+EVICTION_POLICIES = ("lru", "window")
+
+
+def _hashable(value):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+class _SeenValues(object):
+    """Values seen for one key: a hashed set with LRU or FIFO-window eviction."""
+
+    __slots__ = ("values", "order", "max_values", "lru", "stats")
+
+    def __init__(self, max_values, lru):
+        self.max_values = max_values
+        self.lru = lru
+        # LRU keeps recency in an OrderedDict; the window only needs a set and insertion order.
+        self.values = OrderedDict() if lru else set()
+        self.order = None if lru else deque()
+        self.stats = Counter()
+
+    def __contains__(self, value):
+        return value in self.values
+
+    def add(self, value):
+        """Records a value, returns by how much the number of values remembered grew (0 or 1)."""
+        if value in self.values:
+            if self.lru:
+                self.values.move_to_end(value)
+            return 0
+        if self.lru:
+            self.values[value] = None
+        else:
+            self.values.add(value)
+            self.order.append(value)
+        if len(self.values) > self.max_values:
+            self.evict()
+            return 0
+        return 1
+
+    def evict(self):
+        """Forgets the least recently used (lru) or oldest (window) value."""
+        if self.lru:
+            self.values.popitem(last=False)
+        else:
+            self.values.discard(self.order.popleft())
+        self.stats["evictions"] += 1
+
+    def __len__(self):
+        return len(self.values)
+
+
+class UniquenessRegistry(object):
+    """Tracks the label values used per key (e.g. a body path) so repeated values can be redrawn.
+
+    Membership checks are O(1) and memory is bounded: each key remembers at most
+    max_values_per_key values, evicting the least recently used ("lru") or the oldest ("window"),
+    at most max_keys keys are tracked, the least recently used key being dropped first, and at
+    most max_values values are remembered over all keys, evicted from the least recently used
+    key first. Uniqueness is therefore guaranteed within that window, which is what a long soak
+    run needs.
+    """
+
+    def __init__(self, max_values_per_key=DEFAULT_MAX_VALUES_PER_KEY, max_keys=DEFAULT_MAX_KEYS,
+                 policy="lru", max_retries=DEFAULT_MAX_RETRIES, max_values=DEFAULT_MAX_VALUES):
+        """Initialize class object.
+
+        :param max_values_per_key: int, values remembered per key
+        :param max_keys: int, keys tracked
+        :param max_values: int, values remembered over all keys
+        :param policy: str, "lru" or "window"
+        :param max_retries: int, redraws of a colliding value before it is accepted anyway
+        """
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"policy must be one of {EVICTION_POLICIES}, got {policy!r}")
+        self.max_values_per_key = max_values_per_key
+        self.max_keys = max_keys
+        self.policy = policy
+        self.max_retries = max_retries
+        self.max_values = max_values
+        self._keys = OrderedDict()
+        self.evicted_keys = 0
+        self.size = 0
+
+    def _seen(self, key):
+        seen = self._keys.get(key)
+        if seen is None:
+            seen = self._keys[key] = _SeenValues(self.max_values_per_key, self.policy == "lru")
+            if len(self._keys) > self.max_keys:
+                _, dropped = self._keys.popitem(last=False)
+                self.size -= len(dropped)
+                self.evicted_keys += 1
+        else:
+            self._keys.move_to_end(key)
+        return seen
+
+    def _record(self, seen, value):
+        self.size += seen.add(value)
+        while self.size > self.max_values:
+            key, oldest = next(iter(self._keys.items()))
+            oldest.evict()
+            self.size -= 1
+            if not oldest:
+                del self._keys[key]
+                self.evicted_keys += 1
+
+    def claim(self, key, draw):
+        """Draws a value not used yet for key, redrawing up to max_retries times on a collision.
+
+        After max_retries collisions the last drawn value is used anyway, as before.
+
+        :param key: str, e.g. the json_flatten path of a body value
+        :param draw: callable, returns a new candidate value
+        :return value
+        """
+        seen = self._seen(key)
+        stats = seen.stats
+        stats["claims"] += 1
+
+        value = draw()
+        retries = self.max_retries
+        while _hashable(value) in seen:
+            stats["collisions"] += 1
+            if retries == 0:
+                stats["exhausted"] += 1
+                break
+            value = draw()
+            retries -= 1
+
+        self._record(seen, _hashable(value))
+        return value
+
+    def add(self, key, value):
+        """Records a value used for key without drawing."""
+        self._record(self._seen(key), _hashable(value))
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def clear(self):
+        self._keys.clear()
+        self.size = 0
+
+    def stats(self):
+        """Returns per-key counters and their totals.
+
+        claims: values requested, collisions: draws that hit an already used value,
+        exhausted: claims that gave up after max_retries, evictions: values forgotten,
+        size: values currently remembered.
+
+        :return dict, {"keys": {key: counters}, "total": counters, "evicted_keys": int}
+        """
+        keys = {}
+        total = Counter()
+        for key, seen in self._keys.items():
+            counters = dict(seen.stats, size=len(seen))
+            keys[key] = counters
+            total.update(counters)
+        return {"keys": keys, "total": dict(total), "evicted_keys": self.evicted_keys}
@@ -0,0 +1,77 @@
+"""Bulk-refilled pools of generated label values."""
+import threading
+from collections import deque, namedtuple
+from functools import lru_cache
+
+DEFAULT_BATCH_SIZE = 64
+
+ParsedLabel = namedtuple("ParsedLabel", ["kind", "name"])
+
+
+@lru_cache(maxsize=4096)
+def parse_label_name(label_name):
+    """Splits a template label into its kind and the name handed to the value generators.
+
+    :param label_name: str, label as written in the template, e.g. "valid-email" or "regex:[a-z]{3}"
+    :return ParsedLabel, kind is one of valid, invalid, mutated, sequence, regex, graphql, random
+        or None for an unknown label
+    """
+    stripped = label_name.strip()
+    prefix = stripped.split("-")[0]
+
+    if prefix in ("valid", "invalid", "mutated", "sequence"):
+        return ParsedLabel(prefix, "-".join(stripped.split("-")[1:]))
+    if stripped.split(":")[0] == "regex":
+        return ParsedLabel("regex", "".join(stripped.split(":")[1:]))
+    if "<regex:" in label_name:
+        return ParsedLabel("graphql", label_name)
+    if prefix == "random":
+        return ParsedLabel("random", "-".join(stripped.split("-")[1:]))
+    return ParsedLabel(None, label_name)
+
+
+class ValuePool(object):
+    """Hands out values one at a time, refilling from a bulk producer in batches.
+
+    take() is thread-safe, so a pool can be shared by every worker of a LabelParser; the producer
+    is only ever called by one thread at a time.
+    """
+
+    def __init__(self, producer, batch_size=DEFAULT_BATCH_SIZE):
+        """Initialize class object.
+
+        :param producer: callable, producer(count) returns a list of up to count values
+        :param batch_size: int, number of values requested per refill
+        """
+        self._producer = producer
+        self._values = deque()
+        self.batch_size = batch_size
+        self.refills = 0
+        self.produced = 0
+        self.served = 0
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Returns the next value, refilling the pool when it is empty.
+
+        :raise IndexError: if the producer returned no values
+        """
+        with self._lock:
+            if not self._values:
+                batch = self._producer(self.batch_size)
+                self.refills += 1
+                self.produced += len(batch)
+                self._values.extend(batch)
+
+            value = self._values.popleft()
+            self.served += 1
+        return value
+
+    def stats(self):
+        return {
+            "served": self.served,
+            "refills": self.refills,
+            "produced": self.produced,
+            "buffered": len(self._values),
+            "batch_size": self.batch_size,
+        }
@@ -1,5 +1,4 @@
 """Module for parsing xlsx file and create test case json."""
-import copy
 import os
 import random
 import re
@@ -12,6 +11,8 @@ from lib.converters.xml_convertor import *
 from lib.im_environment import ImEnvironment
 from lib.label_value_generator import generate_fake_data, mutate_label_value
 from lib.parsers import ede_parser
+from lib.parsers.testcase_io import RSP_VARIANTS_KEY, write_testcases
+from lib.parsers.testcase_records import InputElement, MetadataElement, OutputElement, TestCaseRecord
 from lib.loggers.logger import report_logger
 
 obj_xml = XMLConvertor()
@@ -67,6 +68,9 @@ class XlSXParser:
         "rsp_body": []
     }
 
+    # Extra input columns left out of an input element when their cell is empty.
+    OPTIONAL_INPUT_FIELDS = {RSP_VARIANTS_KEY}
+
     OUTPUT_ELEMENT = {
         "url_group": "",
         "url_present": None,
@@ -147,26 +151,53 @@ class XlSXParser:
         :return test_cases: dict/json,
         output in particular format.
         """
+        return self.parse_rows(file.iter_rows(values_only=True))
+
+    def parse_rows(self, rows):
+        """Method to parse test cases from rows of cell values.
+
+        :param rows: iterable, rows of cell values, header row first, blank rows as all None.
+        :return test_cases: dict/json,
+        output in particular format.
+        """
+        test_cases = dict(self.iter_test_cases_from_rows(rows))
+        logger.debug("test_cases: %s" %str(test_cases))
+        return test_cases
+
+    def iter_test_cases_from_rows(self, rows):
+        """Method to parse test cases from rows of cell values, one test case at a time.
+
+        Rows are consumed lazily and each test case is yielded as soon as its blank separator row
+        (or the last row) is read, so only the rows of the current test case are held in memory.
+
+        :param rows: iterable, rows of cell values, header row first, blank rows as all None.
+        :return generator of (test_case_id, test_case)
+        """
+        for test_case_id, record in self.iter_test_case_records(rows):
+            yield test_case_id, record.to_dict()
+
+    def iter_test_case_records(self, rows):
+        """Method to parse test cases from rows of cell values into TestCaseRecord objects.
+
+        Same parsing as iter_test_cases_from_rows, but the test cases are kept as compact records
+        until they are serialized (TestCaseRecord.to_dict).
+
+        :param rows: iterable, rows of cell values, header row first, blank rows as all None.
+        :return generator of (test_case_id, TestCaseRecord)
+        """
         tag_column = None
         test_case_id = 0
-        test_cases = {}
-        row_list = []
         input_list = []
         output_list = []
-        metadata = {}
+        metadata_values = {}
         index_to_column_map = {}
-        unique_list = []
-        req_unique_values = {}
-        rsp_unique_values = {}
         global dynamic_path_param_name
 
-        for row in file.iter_rows():
-            row_list.append(row)
-
-        column_names = row_list[0]
-        row_list_no_headers = row_list[1:]
-        for column_index, column in enumerate(column_names):
-            column_name = column.value
+        rows = iter(rows)
+        column_names = next(rows, None)
+        if column_names is None:
+            return
+        for column_index, column_name in enumerate(column_names):
             if column_index == 0:
                 continue
             column_metadata = column_name.split("_")[0].upper()
@@ -198,77 +229,62 @@ class XlSXParser:
                 index_to_column_map[column_index] = (
                     actual_column_name, column_metadata
                 )
-        random_host_suffix = str(time.time_ns())
-        mandatory_fields = copy.deepcopy(self.MANDATORY_FIELDS)
+        # Output values are collected per row in column order, aligned with these names.
+        output_fields = tuple(
+            column_name for _, (column_name, column_section) in sorted(index_to_column_map.items())
+            if column_section == "OUTPUT" and column_name.lower() not in self.MANDATORY_FIELDS
+        )
+        present_fields = set()
         req_body_list = []
         resp_body_list = []
         query_params_list = []
         skip_test = False
-        for row_index, row in enumerate(row_list_no_headers):
+        for row, is_last_row in _with_last(rows):
             if tag_column != None:
-                if row[tag_column].value != None and self.test_tag not in row[tag_column].value:
+                if row[tag_column] != None and self.test_tag not in row[tag_column]:
                     skip_test = True
-                elif row[tag_column].value != None and self.test_tag in row[tag_column].value:
+                elif row[tag_column] != None and self.test_tag in row[tag_column]:
                     skip_test = False
             if skip_test:
                 continue
             url_with_query_params_list = []
-            input_element_copy = {}
-            output_element_copy = {}
-            metadata_element_copy = {}
+            host = method = rsp_code = None
+            input_extra = {}
+            output_values = []
+            row_metadata_values = {}
             # Flags to check if Request body, Response Body are given in the format of SOAP+XML / XML / Json
             flag_req_xml = False
             flag_rsp_xml = False
             flag_soap = False
-            mandatory_fields_copy = copy.deepcopy(mandatory_fields)
-            mandatory_fields = copy.deepcopy(self.MANDATORY_FIELDS)
-            if not any([column.value for column in row]):
-                random_host_suffix = str(time.time_ns())
+            previous_present_fields = present_fields
+            present_fields = set()
+            if not any(row):
                 if len(input_list) > 0 and len(output_list) > 0:
-                    output_not_none_list = []
-                    for i, ol in enumerate(output_list):
-                        if any(ol.values()):
-                            output_not_none_list.append(i)
-                    output_list_temp = []
-                    for i in output_not_none_list:
-                        output_list_temp.append(output_list[i])
-                    output_list = output_list_temp
-                    metadata["payload_structure"] = {
-                        "request": None, "response": None, "query_params": None
-                    }
-                    metadata["payload_structure"]["request"] = req_body_list
-                    metadata["payload_structure"]["response"] = resp_body_list
-                    metadata["payload_structure"]["query_params"] = query_params_list
-                    test_cases[test_case_id] = {
-                        "input": input_list,
-                        "output": output_list,
-                        "metadata": metadata,
-                    }
-                    for field, present in mandatory_fields_copy.items():
-                        if not present:
+                    yield test_case_id, TestCaseRecord(
+                        input_list, [output for output in output_list if output],
+                        MetadataElement(metadata_values, req_body_list, resp_body_list, query_params_list)
+                    )
+                    for field in self.MANDATORY_FIELDS:
+                        if field not in previous_present_fields:
                             logger.error("Mandatory field " + field + "not present.")
                     input_list = []
                     output_list = []
-                    metadata = {}
+                    metadata_values = {}
                     req_body_index = None
                     rsp_body_index = None
                     req_body_list = []
                     resp_body_list = []
                     query_params_list = []
-                    unique_list = []
-                    req_unique_values = {}
-                    rsp_unique_values = {}
                     test_case_id = 0
                     continue
-            for column_index, column in enumerate(row):
+            for column_index, column_value in enumerate(row):
                 if column_index == 0:
-                    if column.value:
-                        test_case_id = int(column.value)
+                    if column_value:
+                        test_case_id = int(column_value)
                         logger.debug("Test Case ID: " + str(test_case_id))
                     continue
                 column_name = index_to_column_map[column_index][0]
                 column_section = index_to_column_map[column_index][1]
-                column_value = column.value
 
                 if column_name.upper() == "URL":
                     if "|" in column_value:
@@ -283,45 +299,35 @@ class XlSXParser:
                         )
                         query_params_list.append(query_params_json)
                         url_without_query_params = url_column_list[0]
-                        for _ in range(int(event_count)):
-                            if query_params_json != json.loads("{}"):
-                                query_params_json_copy = copy.deepcopy(
-                                    query_params_json
-                                )
-                                '''
-                                    Labelling is now done in label_parser
-                                '''
-                                # labelled_query_params_json = \
-                                #     self._label_query_params_json(query_params_json_copy, unique_list)
-                                query_params = urlencode(
-                                    query_params_json_copy, quote_via=quote_plus
-                                )
-                                query_params = query_params.replace("%3C","<")
-                                query_params = query_params.replace("%3E", ">")
-                                url_with_query_params_list.append(
-                                    url_without_query_params + "?" + query_params
-                                )
-                            elif query_params_json == json.loads("{}"):
-                                url_with_query_params_list.append(
-                                    url_without_query_params
-                                )
+                        '''
+                            Labelling is now done in label_parser, so every event gets the same URL template
+                        '''
+                        if query_params_json != {}:
+                            query_params = urlencode(
+                                query_params_json, quote_via=quote_plus
+                            )
+                            query_params = query_params.replace("%3C","<")
+                            query_params = query_params.replace("%3E", ">")
+                            url_with_query_params = url_without_query_params + "?" + query_params
+                        else:
+                            url_with_query_params = url_without_query_params
+                        url_with_query_params_list = [url_with_query_params] * int(event_count)
                     else:
                         url_with_query_params_list = [column_value]
                         event_count = 1
-                    mandatory_fields[column_name.lower()] = True
+                    present_fields.add(column_name.lower())
 
                 if column_name.upper() == "HOST":
-                    input_element_copy["host"] = \
-                        self.return_host(column_value)
-                    mandatory_fields[column_name.lower()] = True
+                    host = self.return_host(column_value)
+                    present_fields.add(column_name.lower())
 
                 if column_name.upper() == "METHOD":
-                    input_element_copy["method"] = column_value
-                    mandatory_fields[column_name.lower()] = True
+                    method = column_value
+                    present_fields.add(column_name.lower())
 
                 if column_name.upper() == "RSP_CODE":
-                    input_element_copy["rsp_code"] = int(column_value)
-                    mandatory_fields[column_name.lower()] = True
+                    rsp_code = int(column_value)
+                    present_fields.add(column_name.lower())
 
                 if column_name.upper() == "REQ_HEADER":
                     if column_value:
@@ -367,140 +373,109 @@ class XlSXParser:
                 if column_name.upper() == "SETTINGS" and column_section == "FEATURE":
                     # returns feature settings data from xlsx sheet
                     if column_value:
-                        metadata_element_copy["settings"] = json.loads(column_value)
+                        row_metadata_values["settings"] = json.loads(column_value)
 
                 if column_name.upper() == "VALIDATION" and column_section == "FEATURE":
                     # returns feature validation data from xlsx sheet
                     if column_value:
-                        metadata_element_copy["validation"] = json.loads(column_value)
+                        row_metadata_values["validation"] = json.loads(column_value)
 
                 if column_name.upper() == "DATA_LABELS":
                     # returns sensitive data labels as list from xlsx sheet in labels delimited by ,
                     # (e.g. creditcard,address)
                     if column_value:
-                        metadata_element_copy["data_labels"] = column_value.strip().split(",")
+                        row_metadata_values["data_labels"] = column_value.strip().split(",")
 
                 if column_name.upper() == "DYNAMIC_PATH_PARAM_NAME":
                     # returns dynamic param name , (e.g. v,ver)
                     if column_value:
                         dynamic_path_param_name = column_value.strip()
 
-                if column_name.lower() not in mandatory_fields.keys():
+                if column_name.lower() not in self.MANDATORY_FIELDS:
                     if column_section == "INPUT":
-                        input_element_copy[column_name] = column_value
+                        if column_value is not None or column_name not in self.OPTIONAL_INPUT_FIELDS:
+                            input_extra[column_name] = column_value
                     if column_section == "OUTPUT":
-                        output_element_copy[column_name] = column_value
+                        output_values.append(column_value)
                     if column_section == "META":
-                        metadata_element_copy[column_name] = column_value
+                        row_metadata_values[column_name] = column_value
                 if column_index == len(row) - 1:
+                    '''
+                        Label parsing now done by label_parser, bodies are passed on as read
+                    '''
+                    if not flag_req_xml:
+                        req_body_value = row[req_body_index] if row[req_body_index] else None
+                    else:
+                        req_body_value = row[req_body_index]
+                    if not flag_rsp_xml:
+                        rsp_body_value = row[rsp_body_index] if row[rsp_body_index] else None
+                    else:
+                        rsp_body_value = row[rsp_body_index]
+
                     for i in range(int(event_count)):
-                        input_element_copy["req_body"] = None
-                        input_element_copy["rsp_body"] = None
                         if "<" not in url_with_query_params_list[i]:
-                            input_element_copy["url"] = url_with_query_params_list[i]
+                            url = url_with_query_params_list[i]
                         else:
-                            input_element_copy["url"] = self._parse_url_dynamic_param_and_enter_value(
+                            url = self._parse_url_dynamic_param_and_enter_value(
                                 url_with_query_params_list[i])
-                        label_data_dict = self.label_data.get(url_with_query_params_list[i], {}).get(
-                            input_element_copy["method"], {})
-                        if not flag_req_xml:
-                            if row[req_body_index].value:
-                                '''
-                                    Label parsing now done by label_parser
-                                '''
-                                # labelled_req_body = self._parse_templates_and_enter_value(
-                                #     convert_parameter_body(
-                                #         row[req_body_index].value
-                                #     ), label_data_dict
-                                #     , req_unique_values
-                                # )
-                                input_element_copy["req_body"] = row[req_body_index].value
-                                # print(req_unique_values)
-                            else:
-                                input_element_copy["req_body"] = None
-                        else:
-                            input_element_copy["req_body"] = row[req_body_index].value
-
-                        if not flag_rsp_xml:
-                            if row[rsp_body_index].value:
-                                '''
-                                    Label parsing now done by label_parser
-                                '''
-                                # labelled_rsp_body = self._parse_templates_and_enter_value(
-                                #     convert_parameter_body(
-                                #         row[rsp_body_index].value
-                                #     ), label_data_dict
-                                #     , rsp_unique_values
-                                # )
-                                input_element_copy["rsp_body"] = row[rsp_body_index].value
-                            else:
-                                input_element_copy["rsp_body"] = None
-                        else:
-                            input_element_copy["rsp_body"] = row[rsp_body_index].value
-
-                        input_element_copy_final = copy.deepcopy(input_element_copy)
-                        input_list.append(input_element_copy_final)
-                    mandatory_fields["req_body"] = True
-                    mandatory_fields["rsp_body"] = True
-            output_list.append(output_element_copy)
-            if any(metadata_element_copy.values()):
-                metadata = copy.deepcopy(metadata_element_copy)
-
-            if row_index == len(row_list_no_headers) - 1:
+                        input_list.append(InputElement(url, host, method, rsp_code, req_body_value,
+                                                       rsp_body_value, input_extra))
+                    present_fields.add("req_body")
+                    present_fields.add("rsp_body")
+            output_list.append(OutputElement(output_fields, output_values))
+            if any(row_metadata_values.values()):
+                metadata_values = row_metadata_values
+
+            if is_last_row:
                 if len(input_list) > 0 and len(output_list) > 0:
-                    output_not_none_list = []
-                    for i, ol in enumerate(output_list):
-                        if any(ol.values()):
-                            output_not_none_list.append(i)
-                    output_list_temp = []
-                    for i in output_not_none_list:
-                        output_list_temp.append(output_list[i])
-                    output_list = output_list_temp
-                    metadata["payload_structure"] = {
-                        "request": None, "response": None, "query_params": None
-                    }
-                    metadata["payload_structure"]["request"] = req_body_list
-                    metadata["payload_structure"]["response"] = resp_body_list
-                    metadata["payload_structure"]["query_params"] = query_params_list
-                    test_cases[test_case_id] = {
-                        "input": input_list,
-                        "output": output_list,
-                        "metadata": metadata,
-                    }
-                    for field, present in mandatory_fields.items():
-                        if not present:
+                    yield test_case_id, TestCaseRecord(
+                        input_list, [output for output in output_list if output],
+                        MetadataElement(metadata_values, req_body_list, resp_body_list, query_params_list)
+                    )
+                    for field in self.MANDATORY_FIELDS:
+                        if field not in present_fields:
                             logger.error("Mandatory field " + field + "not present.")
-                    input_list = []
-                    output_list = []
-                    metadata = {}
-                    req_body_index = None
-                    rsp_body_index = None
-                    req_body_list = []
-                    resp_body_list = []
-                    query_params_list = []
-                    unique_list = []
-                    req_unique_values = {}
-                    rsp_unique_values = {}
-                    test_case_id = 0
-        logger.debug("test_cases: %s" %str(test_cases))
-        # print(test_cases)
-        return test_cases
+
+    def iter_testcases(self, records=False):
+        """Method to yield test cases from the sheet while it is being read.
+
+        The workbook is opened read-only, so rows are streamed from the file instead of being
+        loaded into memory up front.
+
+        :param records: bool, yield TestCaseRecord objects instead of dicts
+        :return generator of (test_case_id, test_case)
+        """
+        workbook = load_workbook(self.file_path, read_only=True)
+        try:
+            rows = workbook[self.sheet_name].iter_rows(values_only=True)
+            if records:
+                yield from self.iter_test_case_records(rows)
+            else:
+                yield from self.iter_test_cases_from_rows(rows)
+        finally:
+            workbook.close()
 
     def get_formatted_testcases(self):
         """Method to return formatted testcases.
 
         :return dict/json
         """
-        xlsx_file_path = self.file_path
-        workbook = load_workbook(xlsx_file_path)
-        xlsx_file = workbook[self.sheet_name]
-        return self._test_case_parser(xlsx_file)
+        return dict(self.iter_testcases())
 
     def get_json_file(self, json_file):
-        test_data = self.get_formatted_testcases()
-        file_name = open(json_file, 'w')
-        file_name.write(json.dumps(test_data))
-        file_name.close()
+        return write_testcases(json_file, self.iter_testcases(records=True))
+
+
+def _with_last(rows):
+    """Yields (row, is_last_row) for every row, looking one row ahead."""
+    rows = iter(rows)
+    previous = next(rows, None)
+    if previous is None:
+        return
+    for row in rows:
+        yield previous, False
+        previous = row
+    yield previous, True
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,310 @@
+"""asyncio traffic sender with per-host keep-alive connection pools."""
+import argparse
+import asyncio
+import json
+import ssl
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from lib.loggers.logger import report_logger
+from lib.parsers.label_parser import LabelParser
+from lib.parsers.corpus_index import iter_shard_testcases, parse_shard
+from lib.parsers.testcase_io import expand_inputs
+
+logger = report_logger()
+
+DEFAULT_CONCURRENCY = 256
+DEFAULT_CONNECTIONS_PER_HOST = 64
+DEFAULT_TIMEOUT = 30
+MAX_HEADER_LINE = 65536
+
+
+class HttpResponse(object):
+    __slots__ = ("status", "headers", "body", "keep_alive")
+
+    def __init__(self, status, headers, body, keep_alive):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+
+class HostConnectionPool(object):
+    """Keep-alive HTTP/1.1 connections to one host:port, at most limit of them open at a time."""
+
+    def __init__(self, host, port, ssl_context=None, limit=DEFAULT_CONNECTIONS_PER_HOST):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.opened = 0
+        self._idle = []
+        self._slots = asyncio.Semaphore(limit)
+
+    async def acquire(self):
+        await self._slots.acquire()
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        try:
+            connection = await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context,
+                                                       server_hostname=self.host if self.ssl_context else None)
+        except BaseException:
+            self._slots.release()
+            raise
+        self.opened += 1
+        return connection
+
+    def release(self, connection, reuse):
+        if reuse:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+        self._slots.release()
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+async def _read_response(reader, method):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed before the response")
+    version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(line) > MAX_HEADER_LINE:
+            raise ValueError("response header line too long")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+    status = int(status)
+
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        body = b""
+    elif "chunked" in headers.get("transfer-encoding", "").lower():
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip(), 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(chunks)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+
+    return HttpResponse(status, headers, body, keep_alive)
+
+
+class AsyncTrafficSender(object):
+    """Sends generated test cases over pooled keep-alive connections from one event loop.
+
+    Test cases are read lazily from the test case file and labelled with LabelParser right before
+    sending; at most `concurrency` requests are in flight overall and at most
+    `connections_per_host` connections are open per host.
+    """
+
+    def __init__(self, host=None, scheme="http", concurrency=DEFAULT_CONCURRENCY,
+                 connections_per_host=DEFAULT_CONNECTIONS_PER_HOST, timeout=DEFAULT_TIMEOUT, label_parser=None):
+        """Initialize class object.
+
+        :param host: str, host[:port] every request is sent to, overriding the test case host
+        :param scheme: str, http or https
+        :param label_parser: LabelParser, fills the <label> placeholders, a new one if None
+        """
+        self.host = host
+        self.scheme = scheme
+        self.concurrency = concurrency
+        self.connections_per_host = connections_per_host
+        self.timeout = timeout
+        self.label_parser = label_parser if label_parser is not None else LabelParser()
+        self.ssl_context = ssl.create_default_context() if scheme == "https" else None
+        self._pools = {}
+        self.stats = Counter()
+        self.status_codes = Counter()
+
+    def _pool(self, host):
+        pool = self._pools.get(host)
+        if pool is None:
+            split = urlsplit(f"//{host}")
+            port = split.port or (443 if self.scheme == "https" else 80)
+            pool = self._pools[host] = HostConnectionPool(split.hostname, port, self.ssl_context,
+                                                          self.connections_per_host)
+        return pool
+
+    async def request(self, method, host, target, headers, body=b""):
+        """Sends one request over a pooled connection.
+
+        :param host: str, host[:port], also used as the Host header
+        :param target: str, path and query
+        :param headers: dict, request headers
+        :param body: bytes, request body
+        :return HttpResponse
+        """
+        pool = self._pool(host)
+        head = [f"{method} {target} HTTP/1.1", f"Host: {host}"]
+        head.extend(f"{name}: {value}" for name, value in headers.items())
+        head.append(f"Content-Length: {len(body)}")
+        payload = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1", "replace") + body
+
+        for attempt in range(2):
+            connection = await pool.acquire()
+            reuse = False
+            try:
+                reader, writer = connection
+                writer.write(payload)
+                await writer.drain()
+                response = await asyncio.wait_for(_read_response(reader, method), self.timeout)
+                reuse = response.keep_alive
+                return response
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # A kept-alive connection may have been closed by the server in the meantime.
+                if attempt:
+                    raise
+            finally:
+                pool.release(connection, reuse)
+
+    def build_request(self, element):
+        """Labels one test case input element and returns (method, host, target, headers, body, expected_status)."""
+        raw_body = element.get("req_body") or ""
+        try:
+            json.loads(raw_body)
+            template_body = raw_body
+        except ValueError:
+            # e.g. the 403 rows, whose body is the spec's requestBody repr; sent as is.
+            template_body = ""
+        url, req_body, _, req_header = self.label_parser.parse_label(
+            element.get("url") or "/", template_body, "", element.get("Req_Header") or "{}")
+        if not template_body:
+            req_body = raw_body
+
+        try:
+            header_json = json.loads(req_header)
+        except ValueError:
+            header_json = {}
+        headers = {name: (value if isinstance(value, str) else json.dumps(value)) for name, value in header_json.items()}
+
+        if isinstance(req_body, (dict, list)):
+            body = json.dumps(req_body).encode()
+        else:
+            body = str(req_body).encode()
+
+        host = self.host or element.get("host")
+        target = url if url.startswith("/") else f"/{url}"
+        return element.get("method", "GET").upper(), host, target, headers, body, element.get("rsp_code")
+
+    async def _send_element(self, element):
+        try:
+            method, host, target, headers, body, expected_status = self.build_request(element)
+        except Exception as e:
+            # e.g. a placeholder the label parser cannot fill in; counted, the worker goes on.
+            self.stats["errors"] += 1
+            logger.debug(f"{element.get('method')} {element.get('url')} could not be labelled: {e!r}")
+            return
+        try:
+            response = await self.request(method, host, target, headers, body)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.debug(f"{method} {host}{target} failed: {e}")
+            return
+        self.stats["sent"] += 1
+        self.status_codes[response.status] += 1
+        if expected_status is not None and response.status != int(expected_status):
+            self.stats["unexpected_status"] += 1
+
+    async def _worker(self, elements):
+        while True:
+            element = await elements.get()
+            try:
+                if element is None:
+                    return
+                await self._send_element(element)
+            finally:
+                elements.task_done()
+
+    @staticmethod
+    async def _put(elements, element, workers):
+        """Queues one element, raising the error of a worker that died instead of waiting on a full queue forever.
+
+        Workers only return after their None sentinel, so a worker that is done while elements are
+        still being queued has failed.
+        """
+        try:
+            elements.put_nowait(element)
+            return
+        except asyncio.QueueFull:
+            pass
+        put = asyncio.ensure_future(elements.put(element))
+        await asyncio.wait([put, *workers], return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            for worker in workers:
+                if worker.done():
+                    worker.result()
+            raise RuntimeError("a sender worker stopped")
+
+    async def close(self):
+        """Closes the idle pooled connections."""
+        for pool in self._pools.values():
+            await pool.close()
+
+    async def send_testcases(self, testcase_file, shard=None):
+        """Sends every input element of a test case file.
+
+        :param testcase_file: str, output of get_json_file, .json or .ndjson
+        :param shard: tuple, (index, count), send only that slice of an indexed .ndjson corpus
+        :return dict, sent/errors/unexpected_status counters, status_codes and requests_per_second
+        """
+        started = time.perf_counter()
+        elements = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.ensure_future(self._worker(elements)) for _ in range(self.concurrency)]
+
+        try:
+            for _, testcase in iter_shard_testcases(testcase_file, shard):
+                for element in expand_inputs(testcase["input"]):
+                    await self._put(elements, element, workers)
+            for _ in workers:
+                await elements.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await self.close()
+
+        elapsed = time.perf_counter() - started
+        return dict(self.stats, status_codes=dict(self.status_codes), seconds=round(elapsed, 3),
+                    requests_per_second=round(self.stats["sent"] / elapsed, 1) if elapsed else 0.0,
+                    connections_opened=sum(pool.opened for pool in self._pools.values()))
+
+    def run(self, testcase_file, shard=None):
+        return asyncio.run(self.send_testcases(testcase_file, shard))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Send generated test cases to an HTTP endpoint.")
+    arg_parser.add_argument("testcase_file")
+    arg_parser.add_argument("--host", help="host[:port] to send to, defaults to each test case's host")
+    arg_parser.add_argument("--scheme", default="http", choices=["http", "https"])
+    arg_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    arg_parser.add_argument("--connections-per-host", type=int, default=DEFAULT_CONNECTIONS_PER_HOST)
+    arg_parser.add_argument("--shard", type=parse_shard, help="index/count, send one slice of an .ndjson corpus")
+    args = arg_parser.parse_args()
+
+    sender = AsyncTrafficSender(host=args.host, scheme=args.scheme, concurrency=args.concurrency,
+                                connections_per_host=args.connections_per_host)
+    logger.info(f"Traffic stats: {sender.run(args.testcase_file, args.shard)}")
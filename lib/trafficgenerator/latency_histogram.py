@@ -0,0 +1,83 @@
+"""HDR-style log-linear latency histogram."""
+
+DEFAULT_SIGNIFICANT_BITS = 7
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram(object):
+    """Records latencies in microseconds into log-linear buckets.
+
+    Like HdrHistogram, every power of two range is split into 2 ** significant_bits linear
+    buckets, so a recorded value is off by at most 1 / 2 ** significant_bits (under 1% for the
+    default 7 bits) whatever its magnitude, and memory grows with the number of distinct
+    buckets, not with the number of recorded values. Histograms with the same precision merge by
+    adding their counts.
+    """
+
+    def __init__(self, significant_bits=DEFAULT_SIGNIFICANT_BITS):
+        self.significant_bits = significant_bits
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def _bucket(self, value):
+        shift = value.bit_length() - self.significant_bits
+        if shift <= 0:
+            return value
+        # Upper edge of the bucket, so percentiles never under-report.
+        return ((value >> shift) << shift) + (1 << shift) - 1
+
+    def record(self, latency, count=1):
+        """Records a latency.
+
+        :param latency: float, seconds
+        :param count: int, number of occurrences
+        """
+        value = max(0, int(latency * 1000000))
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        if other.significant_bits != self.significant_bits:
+            raise ValueError("Cannot merge histograms of different precision")
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def value_at_percentile(self, percentile):
+        """Returns the latency in microseconds that percentile % of the recorded values are at or below."""
+        if not self.total:
+            return 0
+        threshold = max(1, -(-self.total * percentile // 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= threshold:
+                return min(bucket, self.max)
+        return self.max
+
+    def summary(self, percentiles=DEFAULT_PERCENTILES):
+        """Returns count, min, mean, max and the requested percentiles, in milliseconds.
+
+        :param percentiles: iterable, e.g. (50, 99, 99.9)
+        :return dict
+        """
+        summary = {
+            "count": self.total,
+            "min_ms": (self.min or 0) / 1000,
+            "mean_ms": round(self.sum / self.total / 1000, 3) if self.total else 0,
+            "max_ms": self.max / 1000,
+        }
+        for percentile in percentiles:
+            summary[f"p{percentile:g}_ms"] = self.value_at_percentile(percentile) / 1000
+        return summary
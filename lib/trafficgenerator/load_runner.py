@@ -0,0 +1,228 @@
+"""Open-loop load mode: drives generated test cases at a target request rate."""
+import argparse
+import asyncio
+import json
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from lib.generation_context import GenerationContext
+from lib.loggers.logger import report_logger
+from lib.parsers.corpus_index import iter_shard_testcases, parse_shard
+from lib.parsers.testcase_io import expand_inputs
+from lib.trafficgenerator.async_traffic_sender import (DEFAULT_CONNECTIONS_PER_HOST, DEFAULT_TIMEOUT,
+                                                       AsyncTrafficSender)
+from lib.trafficgenerator.latency_histogram import DEFAULT_PERCENTILES, LatencyHistogram
+
+logger = report_logger()
+
+ARRIVALS = ("constant", "poisson")
+DEFAULT_MAX_IN_FLIGHT = 10000
+
+
+def iter_elements(testcase_file, shard=None):
+    """Yields the input elements of a test case file (or one shard of it), starting over at the end."""
+    while True:
+        found = False
+        for _, testcase in iter_shard_testcases(testcase_file, shard):
+            for element in expand_inputs(testcase["input"]):
+                found = True
+                yield element
+        if not found:
+            raise ValueError(f"No test case input in {testcase_file}")
+
+
+def operation_of(element):
+    """Returns the operation a test case input element exercises, e.g. "GET /v1/users/<id>"."""
+    return f"{element.get('method', 'GET').upper()} {urlsplit(element.get('url') or '/').path}"
+
+
+class LoadRunner(object):
+    """Sends test cases at a fixed arrival rate for a set duration, whatever the response times.
+
+    Send times are planned upfront (constant spacing or Poisson arrivals) and a request is never
+    held back because earlier ones are still outstanding. Latency is measured from the planned
+    send time, not from when the request actually went out, so time spent queued behind a slow
+    server or a saturated generator is counted (no coordinated omission). Requests that would
+    exceed max_in_flight are not sent and are counted as dropped; the drop counts are reported next
+    to the percentiles they are missing from, overall and per operation.
+    """
+
+    def __init__(self, rate, duration, arrival="constant", host=None, scheme="http",
+                 connections_per_host=DEFAULT_CONNECTIONS_PER_HOST, timeout=DEFAULT_TIMEOUT,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT, seed=None, label_parser=None):
+        """Initialize class object.
+
+        :param rate: float, requests per second
+        :param duration: float, seconds
+        :param arrival: str, "constant" or "poisson"
+        :param seed: int, seed of the Poisson arrival times
+        """
+        if arrival not in ARRIVALS:
+            raise ValueError(f"arrival must be one of {ARRIVALS}, got {arrival!r}")
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = rate
+        self.duration = duration
+        self.arrival = arrival
+        self.max_in_flight = max_in_flight
+        self.context = GenerationContext(seed)
+        self.sender = AsyncTrafficSender(host=host, scheme=scheme, connections_per_host=connections_per_host,
+                                         timeout=timeout, label_parser=label_parser)
+
+        self.latency = LatencyHistogram()
+        self.operations = defaultdict(LatencyHistogram)
+        self.status_codes = defaultdict(LatencyHistogram)
+        self.sent = 0
+        self.completed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.dropped_operations = Counter()
+        self.unexpected_status = 0
+        self._in_flight = set()
+
+    def _intervals(self):
+        if self.arrival == "constant":
+            while True:
+                yield 1 / self.rate
+        else:
+            while True:
+                yield self.context.random.expovariate(self.rate)
+
+    async def _send(self, loop, element, scheduled):
+        expected_status = None
+        try:
+            method, host, target, headers, body, expected_status = self.sender.build_request(element)
+            response = await self.sender.request(method, host, target, headers, body)
+            status = response.status
+            self.completed += 1
+        except Exception as e:
+            logger.debug(f"{operation_of(element)} failed: {e!r}")
+            status = "error"
+            self.errors += 1
+
+        latency = loop.time() - scheduled
+        self.latency.record(latency)
+        self.operations[operation_of(element)].record(latency)
+        self.status_codes[str(status)].record(latency)
+        if status != "error" and expected_status is not None and status != int(expected_status):
+            self.unexpected_status += 1
+
+    async def run_async(self, testcase_file, shard=None):
+        loop = asyncio.get_running_loop()
+        elements = iter_elements(testcase_file, shard)
+        intervals = self._intervals()
+
+        started = loop.time()
+        end = started + self.duration
+        scheduled = started
+
+        try:
+            while True:
+                scheduled += next(intervals)
+                if scheduled >= end:
+                    break
+
+                delay = scheduled - loop.time()
+                # Yields even when behind schedule, so the requests in flight keep progressing.
+                await asyncio.sleep(max(delay, 0))
+
+                element = next(elements)
+                if len(self._in_flight) >= self.max_in_flight:
+                    self.dropped += 1
+                    self.dropped_operations[operation_of(element)] += 1
+                    continue
+
+                self.sent += 1
+                task = loop.create_task(self._send(loop, element, scheduled))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+            if self._in_flight:
+                await asyncio.wait(list(self._in_flight))
+        finally:
+            for task in list(self._in_flight):
+                task.cancel()
+            await self.sender.close()
+
+        return self.results(loop.time() - started)
+
+    def run(self, testcase_file, shard=None):
+        """Runs the load and returns the results, see results().
+
+        :param shard: tuple, (index, count), replay only that slice of an indexed .ndjson corpus
+        """
+        return asyncio.run(self.run_async(testcase_file, shard))
+
+    def results(self, elapsed, percentiles=DEFAULT_PERCENTILES):
+        """Returns the run configuration, counters and latency summaries (milliseconds).
+
+        Dropped requests have no latency, so the overall and per operation summaries carry their
+        "dropped" count and the percentage of planned requests it stands for: percentiles are only
+        meaningful while it is 0.
+
+        :param elapsed: float, seconds from the first planned send to the last response; the achieved
+            rate is the requests answered over it
+        :return dict
+        """
+        def with_drops(summary, dropped):
+            planned = summary["count"] + dropped
+            summary["dropped"] = dropped
+            summary["dropped_pct"] = round(100 * dropped / planned, 3) if planned else 0.0
+            return summary
+
+        operations = sorted(self.operations.keys() | self.dropped_operations.keys())
+        return {
+            "config": {
+                "rate": self.rate,
+                "duration": self.duration,
+                "arrival": self.arrival,
+                "seed": self.context.seed,
+                "max_in_flight": self.max_in_flight,
+            },
+            "elapsed_seconds": round(elapsed, 3),
+            "sent": self.sent,
+            "completed": self.completed,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "unexpected_status": self.unexpected_status,
+            "achieved_rate": round(self.completed / elapsed, 1) if elapsed else 0.0,
+            "latency": with_drops(self.latency.summary(percentiles), self.dropped),
+            "operations": {operation: with_drops(self.operations[operation].summary(percentiles),
+                                                 self.dropped_operations[operation])
+                           for operation in operations},
+            "status_codes": {status: histogram.summary(percentiles)
+                             for status, histogram in sorted(self.status_codes.items())},
+        }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Open-loop load test from a generated test case file.")
+    arg_parser.add_argument("testcase_file")
+    arg_parser.add_argument("--rate", type=float, required=True, help="requests per second")
+    arg_parser.add_argument("--duration", type=float, required=True, help="seconds")
+    arg_parser.add_argument("--arrival", default="constant", choices=ARRIVALS)
+    arg_parser.add_argument("--host", help="host[:port] to send to, defaults to each test case's host")
+    arg_parser.add_argument("--scheme", default="http", choices=["http", "https"])
+    arg_parser.add_argument("--connections-per-host", type=int, default=DEFAULT_CONNECTIONS_PER_HOST)
+    arg_parser.add_argument("--shard", type=parse_shard, help="index/count, replay one slice of an .ndjson corpus")
+    arg_parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    arg_parser.add_argument("--seed", type=int)
+    arg_parser.add_argument("--output", help="write the results JSON to this file")
+    args = arg_parser.parse_args()
+
+    runner = LoadRunner(args.rate, args.duration, arrival=args.arrival, host=args.host, scheme=args.scheme,
+                        connections_per_host=args.connections_per_host, max_in_flight=args.max_in_flight,
+                        seed=args.seed)
+    results = runner.run(args.testcase_file, args.shard)
+    latency = results["latency"]
+    logger.info(f"sent {results['sent']}, completed {results['completed']} at {results['achieved_rate']}/s, errors {results['errors']}, "
+                f"dropped {results['dropped']}, p50 {latency['p50_ms']}ms, p99 {latency['p99_ms']}ms, "
+                f"p99.9 {latency['p99.9_ms']}ms")
+    if results["dropped"]:
+        logger.warning(f"{latency['dropped_pct']}% of the planned requests were dropped at --max-in-flight "
+                       f"{args.max_in_flight} and are missing from the percentiles: the generator saturated")
+
+    if args.output:
+        with open(args.output, "w") as j_file:
+            json.dump(results, j_file, indent=4)
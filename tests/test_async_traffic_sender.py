@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+from lib.parsers.testcase_io import RSP_VARIANTS_KEY, write_testcases
+from lib.trafficgenerator.async_traffic_sender import AsyncTrafficSender
+
+# Not a placeholder the label parser can fill in.
+BAD_HEADER = json.dumps({"X-Ids": "<[random-string]>"})
+
+
+class Server(object):
+    """Minimal keep-alive HTTP/1.1 server answering 200 to everything, after delay seconds."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.requests = []
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            self.requests.append((request_line.decode().split()[:2], headers, body))
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+            await writer.drain()
+        writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.host = f"127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def element(url, rsp_code=200, header="{}", body="{}", **extra):
+    return dict({"host": "api.example.com", "method": "POST", "rsp_code": rsp_code, "Req_Header": header,
+                 "req_body": body, "rsp_body": "{}", "url": url}, **extra)
+
+
+def write_file(tmp_path, inputs, name="testcases.json"):
+    path = str(tmp_path / name)
+    write_testcases(path, [("1", {"input": inputs, "output": [], "metadata": {}})])
+    return path
+
+
+def test_every_element_is_sent_over_pooled_connections(tmp_path):
+    inputs = [element(f"/items/{i}", body=json.dumps({"i": i})) for i in range(40)]
+    inputs.append(element("/variants", header=json.dumps({"apisec-resp-status-code": "200"}),
+                          **{RSP_VARIANTS_KEY: "200,404"}))
+    testcase_file = write_file(tmp_path, inputs)
+
+    async def run():
+        async with Server() as server:
+            sender = AsyncTrafficSender(host=server.host, concurrency=8, connections_per_host=4)
+            return await asyncio.wait_for(sender.send_testcases(testcase_file), 30), server
+
+    stats, server = asyncio.run(run())
+
+    assert stats["sent"] == 42
+    assert stats["status_codes"] == {200: 42}
+    # The 404 variant was answered with a 200.
+    assert stats["unexpected_status"] == 1
+    assert stats["connections_opened"] <= 4 and server.connections <= 4
+    assert sorted(json.loads(body)["i"] for (method, target), _, body in server.requests if target.startswith("/items")) \
+        == list(range(40))
+    assert [headers["apisec-resp-status-code"] for (_, target), headers, _ in server.requests
+            if target == "/variants"] in (["200", "404"], ["404", "200"])
+
+
+def test_elements_that_cannot_be_labelled_are_counted_as_errors(tmp_path):
+    inputs = [element("/a", header=BAD_HEADER if i % 2 else "{}") for i in range(30)]
+    testcase_file = write_file(tmp_path, inputs)
+
+    async def run():
+        async with Server() as server:
+            sender = AsyncTrafficSender(host=server.host, concurrency=2)
+            return await asyncio.wait_for(sender.send_testcases(testcase_file), 30)
+
+    stats = asyncio.run(run())
+
+    assert stats["sent"] == 15
+    assert stats["errors"] == 15
@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+import textwrap
+
+import pytest
+
+from lib.parsers.testcase_io import iter_testcases
+from lib.SpecTrafficGenerator import corpus
+
+SPEC = """
+    openapi: 3.0.0
+    info: {title: t, version: "1"}
+    servers: [{url: "https://api.example.com/v1"}]
+    paths:
+      /%s:
+        get:
+          parameters: [{name: q, in: query, schema: {type: string, enum: [x, y]}}]
+          responses: {"200": {description: ok}, "404": {description: not found}}
+"""
+
+# Replacing generate_spec only reaches the workers when they are forked from this process.
+needs_fork = pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                                reason="workers only see the patched generate_spec when forked")
+
+
+def write_specs(directory, names):
+    directory.mkdir()
+    for name in names:
+        (directory / name).write_text(textwrap.dedent(SPEC % name.split(".")[0]))
+    return str(directory)
+
+
+def stub_generate_spec(spec_path, output_dir, seed, *args):
+    return {"spec": spec_path, "status": "ok", "seed": seed, "output": None, "base_path": None, "test_cases": 1}
+
+
+def test_every_spec_is_generated_with_a_reproducible_seed(tmp_path):
+    spec_dir = write_specs(tmp_path / "specs", ["a.yaml", "b.yml", "c.json.yaml"])
+    output_dir = str(tmp_path / "out")
+
+    results = list(corpus.generate_corpus(spec_dir, output_dir, workers=2, seed=3, lazy_refs=True,
+                                          output_format="ndjson"))
+    again = list(corpus.generate_corpus(spec_dir, str(tmp_path / "again"), workers=1, seed=3, lazy_refs=True))
+
+    assert sorted(result["status"] for result in results) == ["ok"] * 3
+    assert all(len(list(iter_testcases(result["output"]))) == result["test_cases"] == 1 for result in results)
+    assert {os.path.basename(r["spec"]): r["seed"] for r in results} == \
+        {os.path.basename(r["spec"]): r["seed"] for r in again}
+    assert len({result["seed"] for result in results}) == 3
+
+
+def test_a_failing_spec_is_reported_without_stopping_the_others(tmp_path):
+    spec_dir = write_specs(tmp_path / "specs", ["a.yaml", "b.yaml"])
+    (tmp_path / "specs" / "broken.yaml").write_text("openapi: [unterminated\n")
+
+    results = {os.path.basename(result["spec"]): result
+               for result in corpus.generate_corpus(spec_dir, str(tmp_path / "out"), workers=2, seed=1, lazy_refs=True)}
+
+    assert results["a.yaml"]["status"] == results["b.yaml"]["status"] == "ok"
+    assert results["broken.yaml"]["status"] == "error"
+    assert results["broken.yaml"]["Exception Class"]
+
+
+def test_manifest_records_the_corpus_seed(tmp_path):
+    manifest_file = str(tmp_path / corpus.MANIFEST_FILE)
+    results = [stub_generate_spec("a.yaml", None, 1), dict(stub_generate_spec("b.yaml", None, 2), status="error")]
+
+    corpus.write_manifest(results, manifest_file, seed=42)
+
+    assert corpus.read_manifest_seed(manifest_file) == 42
+    assert corpus.read_manifest_seed(str(tmp_path / "missing.json")) is None
+
+
+@needs_fork
+def test_many_specs_complete(tmp_path, monkeypatch):
+    # More jobs than fit in a pipe buffer used to deadlock the pool once its workers were busy.
+    spec_dir = tmp_path / "specs"
+    spec_dir.mkdir()
+    for i in range(1500):
+        (spec_dir / f"spec{i}.yaml").write_text("")
+    monkeypatch.setattr(corpus, "generate_spec", stub_generate_spec)
+
+    results = list(corpus.generate_corpus(str(spec_dir), str(tmp_path / "out"), workers=4, seed=1))
+
+    assert len(results) == 1500
+    assert all(result["status"] == "ok" for result in results)
+
+
+@needs_fork
+def test_only_the_spec_that_kills_its_worker_fails(tmp_path, monkeypatch):
+    spec_dir = tmp_path / "specs"
+    spec_dir.mkdir()
+    for i in range(200):
+        (spec_dir / f"spec{i}.yaml").write_text("")
+
+    def crash_on_spec_7(spec_path, *args):
+        if os.path.basename(spec_path) == "spec7.yaml":
+            os._exit(9)
+        return stub_generate_spec(spec_path, *args)
+
+    monkeypatch.setattr(corpus, "generate_spec", crash_on_spec_7)
+
+    results = list(corpus.generate_corpus(str(spec_dir), str(tmp_path / "out"), workers=3, seed=1))
+
+    assert sorted(os.path.basename(result["spec"]) for result in results) == \
+        sorted(f"spec{i}.yaml" for i in range(200))
+    failed = [result for result in results if result["status"] != "ok"]
+    assert [os.path.basename(result["spec"]) for result in failed] == ["spec7.yaml"]
+    assert failed[0]["Exception Class"] == "BrokenProcessPool"
@@ -0,0 +1,105 @@
+import json
+import os
+import random
+
+import pytest
+
+from lib.parsers.corpus_index import (CorpusIndex, build_index, convert_to_ndjson, index_path, iter_shard_testcases,
+                                      parse_shard)
+from lib.parsers.testcase_io import write_testcases
+
+TESTCASES = [(str(i), {"input": [{"url": f"/items/{i}"}], "output": [], "metadata": {}}) for i in range(1, 102)]
+
+
+@pytest.fixture
+def corpus_file(tmp_path):
+    path = str(tmp_path / "corpus.ndjson")
+    write_testcases(path, TESTCASES)
+    return path
+
+
+def test_records_are_read_by_position(corpus_file):
+    with CorpusIndex(corpus_file) as corpus:
+        assert len(corpus) == len(TESTCASES)
+        assert corpus.testcase(0) == TESTCASES[0]
+        assert corpus.testcase(57) == TESTCASES[57]
+        assert corpus.testcase(-1) == TESTCASES[-1]
+        with pytest.raises(IndexError):
+            corpus.raw(len(TESTCASES))
+
+
+@pytest.mark.parametrize("shards", [1, 2, 3, 7, 101, 150])
+def test_shard_bounds_are_disjoint_and_complete(corpus_file, shards):
+    with CorpusIndex(corpus_file) as corpus:
+        bounds = [corpus.shard_bounds(shard, shards) for shard in range(shards)]
+
+    assert bounds[0][0] == 0
+    assert bounds[-1][1] == len(TESTCASES)
+    assert all(stop == next_start for (_, stop), (next_start, _) in zip(bounds, bounds[1:]))
+    assert all(start <= stop for start, stop in bounds)
+
+
+def test_shards_replay_every_test_case_once(corpus_file):
+    replayed = [testcase for shard in range(4) for testcase in iter_shard_testcases(corpus_file, (shard, 4))]
+
+    assert replayed == TESTCASES
+
+
+def test_shard_out_of_range_is_rejected(corpus_file):
+    with CorpusIndex(corpus_file) as corpus:
+        with pytest.raises(ValueError):
+            corpus.shard_bounds(4, 4)
+
+
+def test_blank_lines_and_an_incomplete_tail_are_not_indexed(tmp_path):
+    path = tmp_path / "corpus.ndjson"
+    path.write_text('{"test_id": "1"}\n\n{"test_id": "2"}\n{"test_id": "3", "inp')
+
+    assert build_index(str(path)) == 2
+    with CorpusIndex(str(path)) as corpus:
+        assert [record["test_id"] for record in corpus.range()] == ["1", "2"]
+
+
+def test_empty_corpus(tmp_path):
+    path = tmp_path / "corpus.ndjson"
+    path.write_text("")
+
+    with CorpusIndex(str(path)) as corpus:
+        assert len(corpus) == 0
+        assert list(corpus.shard(0, 3)) == []
+
+
+def test_stale_index_is_rebuilt(corpus_file):
+    build_index(corpus_file)
+    with open(corpus_file, "a") as f:
+        f.write(json.dumps({"test_id": "extra"}) + "\n")
+
+    with pytest.raises(ValueError):
+        CorpusIndex(corpus_file, rebuild=False)
+    with CorpusIndex(corpus_file) as corpus:
+        assert len(corpus) == len(TESTCASES) + 1
+        assert corpus[-1] == {"test_id": "extra"}
+
+
+def test_sample_is_reproducible_and_without_replacement(corpus_file):
+    with CorpusIndex(corpus_file) as corpus:
+        first = corpus.sample(20, random.Random(3))
+        second = corpus.sample(20, random.Random(3))
+
+    assert first == second
+    assert len({record["test_id"] for record in first}) == 20
+
+
+def test_convert_to_ndjson_round_trips_a_json_file(tmp_path):
+    json_file = str(tmp_path / "testcases.json")
+    corpus_file = str(tmp_path / "corpus.ndjson")
+    write_testcases(json_file, TESTCASES)
+
+    assert convert_to_ndjson(json_file, corpus_file) == len(TESTCASES)
+    assert os.path.isfile(index_path(corpus_file))
+    with CorpusIndex(corpus_file, rebuild=False) as corpus:
+        assert list(corpus.iter_testcases()) == TESTCASES
+
+
+def test_parse_shard():
+    assert parse_shard("2/8") == (2, 8)
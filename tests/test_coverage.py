@@ -0,0 +1,54 @@
+import argparse
+from itertools import combinations, product
+
+import pytest
+
+from lib.SpecTrafficGenerator.coverage import covering_array, parse_strength
+
+
+def uncovered_tuples(rows, level_counts, strength):
+    missing = []
+    for factors in combinations(range(len(level_counts)), strength):
+        covered = {tuple(row[factor] for factor in factors) for row in rows}
+        for levels in product(*(range(level_counts[factor]) for factor in factors)):
+            if levels not in covered:
+                missing.append((factors, levels))
+    return missing
+
+
+@pytest.mark.parametrize("level_counts", [[2, 2, 2], [3, 2, 4, 2], [5, 1, 3, 3, 2], [2] * 10, [4, 4, 4, 4]])
+@pytest.mark.parametrize("strength", [1, 2, 3])
+def test_covering_array_covers_every_t_tuple(level_counts, strength):
+    rows = covering_array(level_counts, strength)
+
+    assert all(len(row) == len(level_counts) for row in rows)
+    assert all(0 <= level < count for row in rows for level, count in zip(row, level_counts))
+    assert uncovered_tuples(rows, level_counts, min(strength, len(level_counts))) == []
+
+
+def test_covering_array_is_smaller_than_the_full_product():
+    rows = covering_array([3] * 6, 2)
+
+    assert len(rows) < 3 ** 6
+    assert uncovered_tuples(rows, [3] * 6, 2) == []
+
+
+def test_strength_above_factor_count_is_the_full_product():
+    rows = covering_array([2, 3], 3)
+
+    assert sorted(rows) == sorted(product(range(2), range(3)))
+
+
+def test_covering_array_rejects_strength_below_one():
+    with pytest.raises(ValueError):
+        covering_array([2, 2], 0)
+
+
+def test_parse_strength():
+    assert parse_strength("3") == 3
+
+
+@pytest.mark.parametrize("value", ["0", "-1", "pairwise"])
+def test_parse_strength_rejects_invalid_values(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_strength(value)
@@ -0,0 +1,36 @@
+from lib.generation_context import GenerationContext, derive_seed
+from lib.parsers.label_context import LabelContext
+from lib.parsers.sequence_generator import SequenceGenerator
+
+
+def draws(context):
+    return [context.random.random() for _ in range(5)], [context.faker.name() for _ in range(3)]
+
+
+def test_same_seed_gives_the_same_values():
+    assert draws(GenerationContext(seed=42)) == draws(GenerationContext(seed=42))
+    assert draws(GenerationContext(seed=42)) != draws(GenerationContext(seed=43))
+
+
+def test_random_seed_is_recorded():
+    context = GenerationContext()
+
+    assert draws(GenerationContext(seed=context.seed)) == draws(context)
+
+
+def test_spawned_contexts_are_reproducible_and_independent():
+    parent = GenerationContext(seed=7)
+
+    assert draws(parent.spawn(1)) == draws(GenerationContext(seed=7).spawn(1))
+    assert draws(parent.spawn(1)) != draws(parent.spawn(2))
+    assert parent.spawn("shard-3").seed == derive_seed(7, "shard-3")
+
+
+def test_label_context_draws_its_mutation_settings_from_the_context():
+    sequences = {"ssn": SequenceGenerator.from_value("123-45-6789")}
+    first = LabelContext(GenerationContext(seed=3), sequences)
+    second = LabelContext(GenerationContext(seed=3), sequences)
+
+    assert (first.mutation_index, first.no_of_literals) == (second.mutation_index, second.no_of_literals)
+    assert first.req_unique is not second.req_unique
+    assert first.sequence_checkpoint() == {"ssn": sequences["ssn"].checkpoint()}
@@ -0,0 +1,141 @@
+import os
+import textwrap
+
+from lib.parsers.testcase_io import iter_testcases
+from lib.SpecTrafficGenerator.incremental import IncrementalGenerator, fingerprint_path, saved_seed
+from lib.SpecTrafficGenerator.OpenApiSpecParser import OpenApiSpecParser
+
+HEADER = """
+    openapi: 3.0.0
+    info: {title: t, version: "1"}
+    servers: [{url: "https://api.example.com/v1"}]
+    components:
+      schemas:
+        Item:
+          type: object
+          properties:
+            name: {type: string, maxLength: 6}
+    paths:
+"""
+
+PATHS = {
+    "/a": """
+      /a:
+        get:
+          parameters: [{name: q, in: query, schema: {type: string, enum: [x, y]}}]
+          responses: {"200": {description: ok}}
+    """,
+    "/b": """
+      /b:
+        post:
+          requestBody: {content: {application/json: {schema: {$ref: "#/components/schemas/Item"}}}}
+          responses: {"201": {description: ok}, "400": {description: bad}}
+    """,
+    "/b changed": """
+      /b:
+        post:
+          parameters: [{name: X-Trace, in: header, schema: {type: integer}}]
+          requestBody: {content: {application/json: {schema: {$ref: "#/components/schemas/Item"}}}}
+          responses: {"201": {description: ok}, "400": {description: bad}}
+    """,
+    "/c": """
+      /c:
+        delete:
+          responses: {"204": {description: ok}}
+    """,
+    "/d": """
+      /d:
+        put:
+          requestBody: {content: {application/json: {schema: {$ref: "#/components/schemas/Item"}}}}
+          responses: {"200": {description: ok}}
+    """,
+}
+
+
+def write_spec(path, *paths):
+    path.write_text(textwrap.dedent(HEADER) + "".join(textwrap.indent(textwrap.dedent(PATHS[api]), "  ")
+                                                     for api in paths))
+    return str(path)
+
+
+def update(spec_file, output_file, seed=11):
+    return IncrementalGenerator(OpenApiSpecParser(spec_file, seed=seed, lazy_refs=True), output_file).run()
+
+
+def by_path(output_file):
+    return {testcase["input"][0]["url"].split("?")[0]: (test_id, testcase)
+            for test_id, testcase in iter_testcases(output_file)}
+
+
+def summary_counts(summary):
+    return {key: summary[key] for key in ("added", "changed", "unchanged", "removed", "test_cases")}
+
+
+def test_first_run_generates_every_path(tmp_path):
+    output_file = str(tmp_path / "testcases.json")
+
+    summary = update(write_spec(tmp_path / "spec.yaml", "/a", "/b", "/c"), output_file)
+
+    assert summary_counts(summary) == {"added": 3, "changed": 0, "unchanged": 0, "removed": 0, "test_cases": 3}
+    assert sorted(by_path(output_file)) == ["/v1/a", "/v1/b", "/v1/c"]
+    assert os.path.isfile(fingerprint_path(output_file))
+    assert saved_seed(output_file) == 11
+
+
+def test_unchanged_spec_leaves_the_output_alone(tmp_path):
+    spec_file = write_spec(tmp_path / "spec.yaml", "/a", "/b")
+    output_file = str(tmp_path / "testcases.ndjson")
+    update(spec_file, output_file)
+    before = open(output_file).read()
+
+    summary = update(spec_file, output_file)
+
+    assert summary_counts(summary) == {"added": 0, "changed": 0, "unchanged": 2, "removed": 0, "test_cases": 2}
+    assert open(output_file).read() == before
+
+
+def test_only_changed_paths_are_regenerated(tmp_path):
+    spec_file = tmp_path / "spec.yaml"
+    output_file = str(tmp_path / "testcases.json")
+    update(write_spec(spec_file, "/a", "/b", "/c"), output_file)
+    before = by_path(output_file)
+
+    summary = update(write_spec(spec_file, "/a", "/b changed", "/d"), output_file)
+    after = by_path(output_file)
+
+    assert summary_counts(summary) == {"added": 1, "changed": 1, "unchanged": 1, "removed": 1, "test_cases": 3}
+    assert summary["operations"] == ["POST /b"]
+    assert sorted(after) == ["/v1/a", "/v1/b", "/v1/d"]
+    # Unchanged test cases are copied as they are, changed ones keep their id, new ones get a new id.
+    assert after["/v1/a"] == before["/v1/a"]
+    assert after["/v1/b"][0] == before["/v1/b"][0]
+    assert after["/v1/b"][1] != before["/v1/b"][1]
+    assert "X-Trace" in after["/v1/b"][1]["input"][0]["Req_Header"]
+    assert int(after["/v1/d"][0]) == 4
+
+
+def test_incremental_output_matches_a_full_run_of_the_new_spec(tmp_path):
+    spec_file = tmp_path / "spec.yaml"
+    updated_file = str(tmp_path / "updated.json")
+    update(write_spec(spec_file, "/a", "/b", "/c"), updated_file)
+    update(write_spec(spec_file, "/a", "/b changed", "/d"), updated_file)
+
+    full_file = str(tmp_path / "full.json")
+    update(str(spec_file), full_file)
+
+    def inputs(output_file):
+        return {api: [{key: value for key, value in element.items() if key != "host"}
+                      for element in testcase["input"]]
+                for api, (_, testcase) in by_path(output_file).items()}
+
+    assert inputs(updated_file) == inputs(full_file)
+
+
+def test_a_new_seed_regenerates_everything(tmp_path):
+    spec_file = write_spec(tmp_path / "spec.yaml", "/a", "/b")
+    output_file = str(tmp_path / "testcases.json")
+    update(spec_file, output_file)
+
+    summary = update(spec_file, output_file, seed=12)
+
+    assert summary_counts(summary) == {"added": 2, "changed": 0, "unchanged": 0, "removed": 0, "test_cases": 2}
@@ -0,0 +1,57 @@
+import os
+import re
+
+from lib.SpecTrafficGenerator.label_index import LabelIndex, load_label_patterns
+
+KEY_PATTERNS = os.path.join(os.path.dirname(__file__), os.pardir, "lib", "SpecTrafficGenerator", "key_patterns.json")
+
+LABEL_REGEX = {
+    "<valid-email>": ["e?mail"],
+    "<valid-name>": ["first_?name", "name"],
+    "<valid-phone>": ["phone", "mobile"],
+}
+
+FIELD_NAMES = ["email", "user_mail", "firstname", "username", "mobile_phone", "phone", "zip", "", "nameEmail"]
+
+
+def search_first(label_regex, field_name):
+    for label, regex in label_regex.items():
+        for reg in regex:
+            if re.search(reg, field_name):
+                return label
+    return ""
+
+
+def test_lookup_matches_the_first_regex_in_file_order():
+    index = LabelIndex(LABEL_REGEX)
+
+    assert [index.lookup(name) for name in FIELD_NAMES] == [search_first(LABEL_REGEX, name) for name in FIELD_NAMES]
+
+
+def test_lookup_matches_the_shipped_key_patterns():
+    label_regex = load_label_patterns(KEY_PATTERNS)
+    index = LabelIndex(label_regex)
+    field_names = ["account_number", "accountName", "balance", "acc_nbr", "bank_account_number", "accounts", "id"]
+
+    assert [index.lookup(name) for name in field_names] == [search_first(label_regex, name) for name in field_names]
+    assert index.lookup("balance") == "<valid-cash-balance>"
+
+
+def test_patterns_with_backreferences_are_matched_one_by_one():
+    label_regex = {"<repeated>": [r"(ab)\1"], "<valid-name>": ["name"]}
+    index = LabelIndex(label_regex)
+
+    assert index.lookup("xabab") == "<repeated>"
+    assert index.lookup("nameab") == "<valid-name>"
+
+
+def test_lookups_are_memoized_in_a_bounded_cache():
+    index = LabelIndex(LABEL_REGEX, cache_size=2)
+    for name in ("email", "email", "phone", "zip"):
+        index.lookup(name)
+
+    stats = index.stats()
+    assert (stats["hits"], stats["misses"], stats["size"], stats["maxsize"]) == (1, 3, 2, 2)
+
+    index.clear()
+    assert index.stats()["size"] == 0
@@ -0,0 +1,67 @@
+import pytest
+
+from lib.parsers.label_templates import (BodyTemplate, compile_body_text, compile_header_template,
+                                         compile_url_template, render_url)
+
+
+def fetch(label):
+    return f"[{label}]"
+
+
+def test_header_template_fills_every_placeholder():
+    template = compile_header_template('{"Authorization": "<valid-token>", "X-Id": "<valid-id>"}')
+
+    assert template.labels == ("valid-token", "valid-id")
+    assert template.render(fetch) == '{"Authorization": "[valid-token]", "X-Id": "[valid-id]"}'
+
+
+def test_template_without_placeholders_is_returned_as_is():
+    assert compile_header_template("{}").render(fetch) == "{}"
+
+
+def test_url_template_skips_the_first_character_and_quotes_values():
+    template = compile_url_template("<base>/users/<valid-id>?q=<valid-query>")
+
+    assert template.labels == ("valid-id", "valid-query")
+    assert render_url(template, lambda label: "a b&c") == "<base>/users/a+b%26c?q=a+b%26c"
+
+
+def test_unterminated_placeholder_is_rejected():
+    with pytest.raises(ValueError):
+        compile_header_template('{"X": "<valid-id"}')
+
+
+def test_templates_are_cached_by_text():
+    assert compile_url_template("/a/<id>") is compile_url_template("/a/<id>")
+
+
+def test_body_template_fills_placeholders_with_their_flattened_keys():
+    template = BodyTemplate({"user": {"name": "<valid-name>", "tags": ["<valid-tag>", "fixed"]},
+                             "query": "gql<graphql-query>gql", "count": 3})
+    keys = []
+
+    def fill(label, key):
+        keys.append(key)
+        return label.upper()
+
+    rendered = template.render(fill)
+
+    assert rendered == {"user": {"name": "VALID-NAME", "tags": ["VALID-TAG", "fixed"]}, "query": "GRAPHQL-QUERY",
+                        "count": 3}
+    assert keys == ["user.name", "user.tags.[0]", "query"]
+
+
+def test_body_template_renders_new_containers():
+    template = BodyTemplate({"items": [{"id": "<valid-id>"}]})
+
+    first = template.render(lambda label, key: 1)
+    first["items"].append("changed")
+
+    assert template.render(lambda label, key: 1) == {"items": [{"id": 1}]}
+
+
+def test_compile_body_text_leaves_out_non_cacheable_bodies():
+    assert compile_body_text("not json") is None
+    assert compile_body_text("[1, 2]") is None
+    assert compile_body_text('{"ede_info": {}}') is None
+    assert isinstance(compile_body_text('{"a": "<valid-id>"}'), BodyTemplate)
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from lib.trafficgenerator.latency_histogram import LatencyHistogram
+
+
+def test_percentiles_are_within_the_bucket_precision():
+    rng = random.Random(1)
+    latencies = sorted(rng.lognormvariate(-4, 1) for _ in range(10000))
+    histogram = LatencyHistogram()
+    for latency in latencies:
+        histogram.record(latency)
+
+    for percentile in (50, 90, 99, 99.9):
+        exact = int(latencies[int(len(latencies) * percentile / 100) - 1] * 1000000)
+        assert exact <= histogram.value_at_percentile(percentile) <= exact * (1 + 2 / 2 ** 7) + 1
+
+
+def test_summary_is_in_milliseconds():
+    histogram = LatencyHistogram()
+    histogram.record(0.002, count=3)
+    histogram.record(0.010)
+
+    summary = histogram.summary((50, 100))
+
+    assert summary["count"] == 4
+    assert summary["min_ms"] == 2.0
+    assert summary["max_ms"] == 10.0
+    assert summary["mean_ms"] == 4.0
+    assert summary["p50_ms"] == pytest.approx(2.0, rel=0.01)
+    assert summary["p100_ms"] == 10.0
+
+
+def test_merge_adds_the_counts():
+    first, second, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i in range(1, 200):
+        (first if i % 2 else second).record(i / 1000)
+        both.record(i / 1000)
+
+    first.merge(second)
+
+    assert first.summary() == both.summary()
+
+
+def test_merge_rejects_a_different_precision():
+    with pytest.raises(ValueError):
+        LatencyHistogram().merge(LatencyHistogram(significant_bits=5))
+
+
+def test_empty_histogram():
+    assert LatencyHistogram().summary((50,)) == {"count": 0, "min_ms": 0.0, "mean_ms": 0, "max_ms": 0.0, "p50_ms": 0.0}
@@ -0,0 +1,49 @@
+import asyncio
+
+from lib.trafficgenerator.load_runner import LoadRunner, iter_elements, operation_of
+from tests.test_async_traffic_sender import Server, element, write_file
+
+
+def test_elements_start_over_at_the_end_of_the_file(tmp_path):
+    testcase_file = write_file(tmp_path, [element("/a"), element("/b?x=1")])
+    elements = iter_elements(testcase_file)
+
+    assert [operation_of(next(elements)) for _ in range(5)] == ["POST /a", "POST /b", "POST /a", "POST /b", "POST /a"]
+
+
+def test_load_runner_sends_at_the_target_rate(tmp_path):
+    testcase_file = write_file(tmp_path, [element("/a"), element("/b")], "testcases.ndjson")
+
+    async def run():
+        async with Server() as server:
+            runner = LoadRunner(200, 1, host=server.host, seed=1)
+            return await asyncio.wait_for(runner.run_async(testcase_file), 30)
+
+    results = asyncio.run(run())
+
+    assert 190 <= results["sent"] <= 200
+    assert results["completed"] == results["sent"]
+    assert results["errors"] == results["dropped"] == 0
+    assert 100 <= results["achieved_rate"] <= 210
+    assert results["latency"]["count"] == results["sent"]
+    assert set(results["operations"]) == {"POST /a", "POST /b"}
+
+
+def test_load_runner_counts_requests_over_max_in_flight_as_dropped(tmp_path):
+    testcase_file = write_file(tmp_path, [element("/a")])
+
+    async def run():
+        async with Server(delay=0.2) as server:
+            runner = LoadRunner(100, 1, host=server.host, max_in_flight=5, seed=1)
+            return await asyncio.wait_for(runner.run_async(testcase_file), 30)
+
+    results = asyncio.run(run())
+
+    assert results["dropped"] > 0
+    assert results["sent"] + results["dropped"] >= 95
+    assert results["completed"] == results["sent"]
+    assert results["latency"]["dropped"] == results["dropped"]
+    assert results["operations"]["POST /a"]["dropped"] == results["dropped"]
+    assert 0 < results["latency"]["dropped_pct"] < 100
+    # Answered requests over the elapsed time, at most 5 in flight for 0.2s each.
+    assert results["achieved_rate"] <= 5 / 0.2 * 1.2
@@ -0,0 +1,101 @@
+import textwrap
+
+from lib.SpecTrafficGenerator.ref_resolver import LazyRefResolver
+
+
+def write(path, text):
+    path.write_text(textwrap.dedent(text))
+    return str(path)
+
+
+def test_refs_resolve_to_one_shared_node(tmp_path):
+    spec = write(tmp_path / "spec.yaml", """
+        openapi: 3.0.0
+        components:
+          schemas:
+            User: {type: object, properties: {name: {type: string}}}
+            Alias: {$ref: "#/components/schemas/User"}
+    """)
+    resolver = LazyRefResolver(spec)
+
+    user = resolver.resolve_ref("#/components/schemas/User")
+
+    assert user["type"] == "object"
+    assert resolver.deref({"$ref": "#/components/schemas/Alias"}) is user
+    assert resolver.deref({"$ref": "#/components/schemas/User"}) is user
+
+
+def test_refs_of_other_files_resolve_against_their_own_document(tmp_path):
+    (tmp_path / "schemas").mkdir()
+    write(tmp_path / "schemas" / "common.yaml", """
+        Pet: {type: object, properties: {tag: {$ref: "#/Tag"}}}
+        Tag: {type: string, maxLength: 3}
+    """)
+    spec = write(tmp_path / "spec.yaml", """
+        openapi: 3.0.0
+        components:
+          schemas:
+            Pet: {$ref: "schemas/common.yaml#/Pet"}
+    """)
+    resolver = LazyRefResolver(spec)
+
+    pet = resolver.deref({"$ref": "#/components/schemas/Pet"})
+
+    assert resolver.deref(pet["properties"]["tag"]) == {"type": "string", "maxLength": 3}
+
+
+def test_looping_ref_chain_resolves_to_an_empty_schema(tmp_path):
+    spec = write(tmp_path / "spec.yaml", """
+        openapi: 3.0.0
+        components:
+          schemas:
+            A: {$ref: "#/components/schemas/B"}
+            B: {$ref: "#/components/schemas/A"}
+    """)
+
+    assert LazyRefResolver(spec).deref({"$ref": "#/components/schemas/A"}) == {}
+
+
+def test_pointer_tokens_are_unescaped(tmp_path):
+    spec = write(tmp_path / "spec.yaml", """
+        openapi: 3.0.0
+        paths:
+          /users/{id}:
+            get: {responses: {"200": {description: ok}}}
+    """)
+
+    node = LazyRefResolver(spec).resolve_ref("#/paths/~1users~1%7Bid%7D/get")
+
+    assert node == {"responses": {"200": {"description": "ok"}}}
+
+
+def test_inline_operations_dereferences_the_operation_level(tmp_path):
+    spec = write(tmp_path / "spec.yaml", """
+        openapi: 3.0.0
+        paths:
+          /users:
+            parameters: [{$ref: "#/components/parameters/Limit"}]
+            post:
+              requestBody: {$ref: "#/components/requestBodies/User"}
+              responses:
+                "200": {$ref: "#/components/responses/Ok"}
+        components:
+          parameters:
+            Limit: {name: limit, in: query, schema: {type: integer}}
+          requestBodies:
+            User: {content: {application/json: {schema: {$ref: "#/components/schemas/User"}}}}
+          responses:
+            Ok: {description: ok}
+          schemas:
+            User: {type: object}
+    """)
+    resolver = LazyRefResolver(spec)
+
+    resolver.inline_operations(resolver.root)
+
+    path_info = resolver.root["paths"]["/users"]
+    assert path_info["parameters"][0]["name"] == "limit"
+    assert path_info["post"]["responses"]["200"] == {"description": "ok"}
+    # Schemas stay references.
+    assert path_info["post"]["requestBody"]["content"]["application/json"]["schema"] == \
+        {"$ref": "#/components/schemas/User"}
@@ -0,0 +1,106 @@
+import threading
+
+from lib.SpecTrafficGenerator.spec_testing.scheduler import FixedDelayCheck, PipelineScheduler, poll_until_ready
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_poll_backs_off_exponentially_up_to_max_delay():
+    clock = FakeClock()
+    results = iter([False, False, ValueError("not yet"), False, False, True])
+
+    def check():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert poll_until_ready(check, timeout=100, initial_delay=1, max_delay=5, sleep=clock.sleep, clock=clock)
+    assert clock.sleeps == [1, 2, 4, 5, 5]
+
+
+def test_poll_gives_up_at_the_timeout():
+    clock = FakeClock()
+
+    assert not poll_until_ready(lambda: False, timeout=10, initial_delay=3, sleep=clock.sleep, clock=clock)
+    assert clock.now == 10
+    assert clock.sleeps == [3, 6, 1]
+
+
+def test_fixed_delay_check_is_ready_after_the_delay():
+    clock = FakeClock()
+    check = FixedDelayCheck(30, clock=clock)
+
+    class Job(object):
+        file = "spec.yaml"
+
+    assert not check(Job())
+    clock.now = 29
+    assert not check(Job())
+    clock.now = 30
+    assert check(Job())
+
+
+def run_pipeline(files, sites, fail=(), undeletable=()):
+    lock = threading.Lock()
+    running = {}
+    overlaps = []
+    cleaned = []
+
+    def upload(job):
+        with lock:
+            if running.get(job.site_id):
+                overlaps.append(job.file)
+            running[job.site_id] = True
+        if job.file in fail:
+            raise RuntimeError(f"upload of {job.file} failed")
+        return f"id-{job.file}"
+
+    def send(job):
+        assert job.generated == {"base_path": f"/{job.file}"}
+
+    def cleanup(job):
+        with lock:
+            running[job.site_id] = False
+            cleaned.append(job.file)
+        return job.file not in undeletable
+
+    scheduler = PipelineScheduler(lambda file: {"base_path": f"/{file}"}, upload, send, cleanup,
+                                  lambda job: True, sites, initial_delay=0, max_delay=0)
+    return scheduler.run(files), overlaps, cleaned
+
+
+def test_every_file_is_sent_and_cleaned_up_one_at_a_time_per_site():
+    files = [f"spec{i}.yaml" for i in range(12)]
+
+    result, overlaps, cleaned = run_pipeline(files, {"site1": "a.example.com", "site2": "b.example.com"})
+
+    assert sorted(record["file"] for record in result["Executed"]) == sorted(files)
+    assert {record["host"] for record in result["Executed"]} <= {"a.example.com", "b.example.com"}
+    assert result["Not Executed"] == [] and result["Not Deleted"] == []
+    assert overlaps == []
+    assert sorted(cleaned) == sorted(files)
+
+
+def test_failures_are_recorded_and_the_other_files_still_run():
+    files = ["good.yaml", "bad.yaml", "stuck.yaml"]
+
+    result, _, cleaned = run_pipeline(files, {"site1": "a.example.com"}, fail={"bad.yaml"}, undeletable={"stuck.yaml"})
+
+    assert sorted(record["file"] for record in result["Executed"]) == ["good.yaml", "stuck.yaml"]
+    assert [(record["file"], record["Exception Value"]) for record in result["Not Executed"]] == \
+        [("bad.yaml", "upload of bad.yaml failed")]
+    assert [record["file"] for record in result["Not Deleted"]] == ["stuck.yaml"]
+    # An upload that raised has no file id, so there is nothing to delete.
+    assert "bad.yaml" not in cleaned
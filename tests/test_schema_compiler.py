@@ -0,0 +1,164 @@
+import textwrap
+
+import pytest
+
+from lib.generation_context import GenerationContext
+from lib.SpecTrafficGenerator.ref_resolver import LazyRefResolver
+from lib.SpecTrafficGenerator.schema_compiler import (EMPTY_OBJECT_GENERATOR, SampledVariantGenerator,
+                                                      SchemaCompiler)
+
+RECURSIVE_SPEC = """
+    openapi: 3.0.0
+    components:
+      schemas:
+        Node:
+          oneOf:
+            - $ref: "#/components/schemas/Branch"
+            - type: string
+        Branch:
+          allOf:
+            - $ref: "#/components/schemas/Node"
+            - type: object
+              properties:
+                name: {type: string, maxLength: 4}
+                size: {type: integer, minimum: 1, maximum: 9}
+        Tree:
+          type: object
+          properties:
+            value: {type: integer, minimum: 0, maximum: 5}
+            children: {type: array, items: {$ref: "#/components/schemas/Tree"}}
+"""
+
+
+def resolver_for(tmp_path, text):
+    path = tmp_path / "spec.yaml"
+    path.write_text(textwrap.dedent(text))
+    return LazyRefResolver(str(path))
+
+
+def depth(body, key="children"):
+    if not isinstance(body, dict) or not body.get(key):
+        return 0
+    return 1 + max(depth(child, key) for child in body[key])
+
+
+def test_scalar_bounds_are_respected():
+    generator = SchemaCompiler().compile({
+        "type": "object",
+        "properties": {
+            "count": {"type": "integer", "minimum": 3, "maximum": 5},
+            "ratio": {"type": "number", "minimum": 0.5, "maximum": 1.5},
+            "code": {"type": "string", "maxLength": 6},
+            "kind": {"enum": ["a", "b"]},
+            "tags": {"type": "array", "items": {"type": "integer", "minimum": 0, "maximum": 1}},
+        },
+    })
+
+    for body in generator.generate_many(200, GenerationContext(seed=1)):
+        assert 3 <= body["count"] <= 5
+        assert 0.5 <= body["ratio"] <= 1.5
+        assert len(body["code"]) == 6
+        assert body["kind"] in ("a", "b")
+        assert body["tags"][0] in (0, 1)
+
+
+def test_batch_generation_follows_the_same_schema():
+    generator = SchemaCompiler().compile({
+        "type": "object",
+        "properties": {"count": {"type": "integer", "minimum": 3, "maximum": 5},
+                       "code": {"type": "string", "maxLength": 6},
+                       "kind": {"oneOf": [{"enum": ["x"]}, {"type": "integer", "minimum": 7, "maximum": 7}]}},
+    })
+
+    bodies = generator.generate_batch(500, GenerationContext(seed=1))
+
+    assert len(bodies) == 500
+    assert all(3 <= body["count"] <= 5 and len(body["code"]) == 6 for body in bodies)
+    assert {body["kind"] for body in bodies} == {"x", 7}
+
+
+def test_generation_is_reproducible_from_the_seed():
+    generator = SchemaCompiler().compile({"type": "object", "properties": {"a": {"type": "integer"},
+                                                                          "b": {"type": "string", "maxLength": 8}}})
+
+    assert generator.generate_many(5, GenerationContext(seed=9)) == generator.generate_many(5, GenerationContext(seed=9))
+
+
+def test_empty_schema_is_an_empty_object():
+    assert SchemaCompiler().compile({}) is EMPTY_OBJECT_GENERATOR
+    assert EMPTY_OBJECT_GENERATOR.generate() == {}
+
+
+def test_all_of_variants_are_merged():
+    generator = SchemaCompiler().compile({"allOf": [
+        {"type": "object", "properties": {"id": {"enum": [1]}}},
+        {"oneOf": [{"type": "object", "properties": {"a": {"enum": ["a"]}}},
+                   {"type": "object", "properties": {"b": {"enum": ["b"]}}}]},
+    ]})
+
+    bodies = generator.generate_many(100, GenerationContext(seed=2))
+
+    assert {tuple(sorted(body.items())) for body in bodies} == {(("a", "a"), ("id", 1)), (("b", "b"), ("id", 1))}
+
+
+def test_all_of_above_max_variants_is_sampled_per_body():
+    members = [{"oneOf": [{"type": "object", "properties": {f"p{i}": {"enum": [value]}}} for value in range(4)]}
+               for i in range(5)]
+    compiler = SchemaCompiler(max_variants=16)
+
+    generator = compiler.compile({"allOf": members})
+    bodies = generator.generate_many(50, GenerationContext(seed=4))
+
+    assert isinstance(generator, SampledVariantGenerator)
+    assert len(generator.compiled) <= 16
+    assert all(sorted(body) == [f"p{i}" for i in range(5)] for body in bodies)
+    assert len({tuple(body.values()) for body in bodies}) > 1
+
+
+def test_compile_cache_is_bounded_and_reuses_generators():
+    compiler = SchemaCompiler(cache_size=3)
+    schemas = [{"type": "integer", "minimum": i, "maximum": i} for i in range(5)]
+
+    generators = [compiler.compile(schema) for schema in schemas]
+
+    assert len(compiler._compiled) == 3
+    assert compiler.compile(schemas[-1]) is generators[-1]
+    assert [generator.generate() for generator in generators] == list(range(5))
+
+
+def test_recursive_array_ref_is_truncated_at_max_ref_depth(tmp_path):
+    resolver = resolver_for(tmp_path, RECURSIVE_SPEC)
+    compiler = SchemaCompiler(resolver, max_ref_depth=3)
+
+    generator = compiler.compile({"$ref": "#/components/schemas/Tree"})
+    bodies = generator.generate_many(20, GenerationContext(seed=3))
+
+    assert all(depth(body) == 3 for body in bodies)
+    assert compiler.truncated["#/components/schemas/Tree"] == 20
+
+
+def test_recursive_one_of_all_of_compiles_lazily(tmp_path):
+    resolver = resolver_for(tmp_path, RECURSIVE_SPEC)
+    compiler = SchemaCompiler(resolver, max_ref_depth=2)
+
+    node = compiler.compile({"$ref": "#/components/schemas/Node"})
+    branch = compiler.compile({"$ref": "#/components/schemas/Branch"})
+    bodies = node.generate_many(200, GenerationContext(seed=5)) + branch.generate_many(200, GenerationContext(seed=6))
+
+    assert any(isinstance(body, str) for body in bodies)
+    for body in bodies:
+        if isinstance(body, dict) and body:
+            assert len(body["name"]) == 4
+            assert 1 <= body["size"] <= 9
+    assert all(isinstance(body, dict) for body in branch.generate_many(50, GenerationContext(seed=7)))
+
+
+@pytest.mark.parametrize("max_ref_depth", [0, 1, 4])
+def test_recursive_refs_generate_at_any_depth(tmp_path, max_ref_depth):
+    resolver = resolver_for(tmp_path, RECURSIVE_SPEC)
+    compiler = SchemaCompiler(resolver, max_ref_depth=max_ref_depth)
+
+    generator = compiler.compile({"type": "object", "properties": {"root": {"$ref": "#/components/schemas/Branch"},
+                                                                   "tree": {"$ref": "#/components/schemas/Tree"}}})
+
+    assert len(generator.generate_many(20, GenerationContext(seed=8))) == 20
@@ -0,0 +1,99 @@
+from lib.generation_context import GenerationContext
+from lib.parsers.sequence_generator import (SequenceGenerator, default_sequences, load_checkpoint,
+                                            partition_sequences, save_checkpoint)
+
+
+def test_from_value_continues_the_trailing_number():
+    sequence = SequenceGenerator.from_value("123-45-0098")
+
+    assert [sequence.next() for _ in range(3)] == ["123-45-0098", "123-45-0099", "123-45-0100"]
+
+
+def test_take_reserves_consecutive_values():
+    sequence = SequenceGenerator.from_value("A007")
+
+    assert sequence.take(3) == ["A007", "A008", "A009"]
+    assert sequence.next() == "A010"
+
+
+def test_partitions_are_disjoint_and_cover_the_sequence():
+    sequence = SequenceGenerator.from_value("100000")
+    sequence.take(5)
+
+    partitions = [sequence.partition(index, 3) for index in range(3)]
+    values = [partition.take(20) for partition in partitions]
+    issued = [value for partition_values in values for value in partition_values]
+
+    assert len(set(issued)) == len(issued)
+    assert sorted(issued) == [f"{number:06d}" for number in range(100005, 100065)]
+
+
+def test_partitions_of_a_partition_are_disjoint():
+    sequence = SequenceGenerator.from_value("5000")
+    first, second = sequence.partition(0, 2), sequence.partition(1, 2)
+    nested = [first.partition(index, 2) for index in range(2)]
+
+    issued = second.take(10) + [value for partition in nested for value in partition.take(10)]
+
+    assert len(set(issued)) == len(issued)
+
+
+def test_partition_sequences_partitions_every_sequence():
+    sequences = {"a": SequenceGenerator.from_value("10"), "b": SequenceGenerator.from_value("x-20")}
+
+    workers = [partition_sequences(sequences, index, 2) for index in range(2)]
+
+    assert [worker["a"].next() for worker in workers] == ["10", "11"]
+    assert [worker["b"].next() for worker in workers] == ["x-20", "x-21"]
+
+
+def test_checkpoint_resumes_where_the_sequence_stopped(tmp_path):
+    sequences = {"ssn": SequenceGenerator.from_value("123-45-6789", minimum=1).partition(1, 4)}
+    sequences["ssn"].take(7)
+    checkpoint_file = str(tmp_path / "sequences.json")
+
+    save_checkpoint(checkpoint_file, sequences)
+    restored = load_checkpoint(checkpoint_file)
+
+    assert restored["ssn"].checkpoint() == sequences["ssn"].checkpoint()
+    assert restored["ssn"].take(5) == sequences["ssn"].take(5)
+
+
+def test_wrap_around_keeps_the_width():
+    sequence = SequenceGenerator.from_value("998")
+
+    assert sequence.take(4) == ["998", "999", "000", "001"]
+
+
+def test_wrap_around_starts_over_at_the_minimum():
+    sequence = SequenceGenerator.from_value("123-45-9998", minimum=1)
+
+    assert sequence.take(4) == ["123-45-9998", "123-45-9999", "123-45-0001", "123-45-0002"]
+
+
+def test_partitions_wrap_around_without_overlap():
+    sequence = SequenceGenerator.from_value("95", minimum=1)
+    partitions = [sequence.partition(index, 3) for index in range(3)]
+
+    issued = [value for partition in partitions for value in partition.take(11)]
+
+    assert len(set(issued)) == len(issued) == 33
+    assert "00" not in issued
+
+
+def test_default_ssn_sequence_never_issues_serial_0000():
+    sequence = default_sequences(GenerationContext(seed=5))["ssn"]
+    near_the_end = SequenceGenerator.from_checkpoint(dict(sequence.checkpoint(), start=9990))
+
+    serials = [value[-4:] for value in near_the_end.take(20)]
+
+    assert "0000" not in serials
+    assert "0001" in serials
+
+
+def test_default_sequences_are_reproducible_from_the_seed():
+    first = default_sequences(GenerationContext(seed=11))
+    second = default_sequences(GenerationContext(seed=11))
+
+    assert {name: sequence.take(3) for name, sequence in first.items()} == \
+        {name: sequence.take(3) for name, sequence in second.items()}
@@ -0,0 +1,76 @@
+import os
+
+from lib.SpecTrafficGenerator.spec_cache import SpecCache
+
+
+def write_spec(tmp_path):
+    (tmp_path / "schemas").mkdir(exist_ok=True)
+    (tmp_path / "schemas" / "user.yaml").write_text("User: {type: object}\n")
+    (tmp_path / "spec.yaml").write_text('openapi: 3.0.0\ncomponents: {schemas: {User: {$ref: "schemas/user.yaml#/User"}}}\n')
+    return str(tmp_path / "spec.yaml")
+
+
+def test_resolve_is_called_once_per_content(tmp_path):
+    spec_path = write_spec(tmp_path)
+    cache = SpecCache(str(tmp_path / "cache"))
+    calls = []
+
+    def resolve():
+        calls.append(1)
+        return {"resolved": len(calls)}
+
+    assert cache.get_or_resolve(spec_path, resolve) == {"resolved": 1}
+    assert cache.get_or_resolve(spec_path, resolve) == {"resolved": 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_editing_a_referenced_file_changes_the_key(tmp_path):
+    spec_path = write_spec(tmp_path)
+    cache = SpecCache(str(tmp_path / "cache"))
+    key = cache.key(spec_path)
+
+    assert sorted(os.path.basename(path) for path in cache.referenced_files(spec_path)) == ["spec.yaml", "user.yaml"]
+    (tmp_path / "schemas" / "user.yaml").write_text("User: {type: string}\n")
+    assert cache.key(spec_path) != key
+
+
+def test_key_does_not_depend_on_the_spec_location(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first, second = write_spec(tmp_path / "a"), write_spec(tmp_path / "b")
+
+    assert SpecCache(str(tmp_path / "cache")).key(first) == SpecCache(str(tmp_path / "cache")).key(second)
+
+
+def test_least_recently_used_entries_are_evicted_above_max_bytes(tmp_path):
+    cache = SpecCache(str(tmp_path / "cache"), max_bytes=3500)
+    for i, key in enumerate(("a", "b", "c")):
+        cache.put(key, {"payload": "x" * 1000})
+        os.utime(cache._entry_path(key), (i, i))
+    os.utime(cache._entry_path("a"), (10, 10))
+
+    cache.put("d", {"payload": "x" * 1000})
+
+    assert [key for key in "abcd" if cache.get(key) is not None] == ["a", "c", "d"]
+    assert cache.size() <= 3500
+
+
+def test_unreadable_entry_is_a_miss_and_is_dropped(tmp_path):
+    cache = SpecCache(str(tmp_path / "cache"))
+    with open(cache._entry_path("broken"), "wb") as f:
+        f.write(b"not a pickle")
+
+    assert cache.get("broken") is None
+    assert not os.path.exists(cache._entry_path("broken"))
+
+
+def test_invalidate_and_clear(tmp_path):
+    spec_path = write_spec(tmp_path)
+    cache = SpecCache(str(tmp_path / "cache"))
+    cache.put(cache.key(spec_path), {"a": 1})
+    cache.put("other", {"b": 2})
+
+    assert cache.invalidate(spec_path)
+    assert not cache.invalidate(spec_path)
+    cache.clear()
+    assert cache.size() == 0
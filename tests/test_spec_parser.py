@@ -0,0 +1,112 @@
+import json
+import textwrap
+from itertools import combinations
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+from lib.parsers.testcase_io import RSP_VARIANTS_KEY, expand_testcase, iter_testcases
+from lib.SpecTrafficGenerator.OpenApiSpecParser import OpenApiSpecParser
+
+SPEC = """
+    openapi: 3.0.0
+    info: {title: t, version: "1"}
+    servers: [{url: "https://api.example.com/v1"}]
+    paths:
+      /items:
+        get:
+          parameters:
+            - {name: color, in: query, schema: {type: string, enum: [red, green, blue]}}
+            - {name: active, in: query, schema: {type: boolean}}
+            - {name: size, in: query, schema: {type: string, enum: [s, m, l]}}
+            - {name: X-Mode, in: header, schema: {type: string, enum: [fast, slow]}}
+          responses:
+            "200": {description: ok}
+            "404": {description: not found}
+            "500": {description: error}
+        post:
+          requestBody:
+            content:
+              application/json:
+                schema: {$ref: "#/components/schemas/Item"}
+          responses:
+            "201": {description: created, content: {application/json: {schema: {$ref: "#/components/schemas/Item"}}}}
+            default: {description: error}
+      /items/{itemId}:
+        parameters:
+          - {name: itemId, in: path, required: true, schema: {type: string}}
+        delete:
+          responses:
+            "204": {description: deleted}
+            "404": {description: not found}
+    components:
+      schemas:
+        Item:
+          type: object
+          properties:
+            name: {type: string, maxLength: 6}
+            count: {type: integer, minimum: 1, maximum: 3}
+            parent: {$ref: "#/components/schemas/Item"}
+"""
+
+
+@pytest.fixture
+def spec_file(tmp_path):
+    path = tmp_path / "spec.yaml"
+    path.write_text(textwrap.dedent(SPEC))
+    return str(path)
+
+
+def without_host(testcases):
+    # The host carries a per-run suffix, everything else is reproducible from the seed.
+    return {test_id: [{key: value for key, value in element.items() if key != "host"} for element in testcase["input"]]
+            for test_id, testcase in testcases}
+
+
+def test_same_seed_generates_the_same_test_cases(spec_file):
+    first = list(OpenApiSpecParser(spec_file, seed=5, lazy_refs=True).iter_testcases())
+    second = list(OpenApiSpecParser(spec_file, seed=5, lazy_refs=True).iter_testcases())
+
+    assert without_host(first) == without_host(second)
+    assert [testcase["metadata"] for _, testcase in first] == [testcase["metadata"] for _, testcase in second]
+
+
+@pytest.mark.parametrize("output", ["testcases.json", "testcases.ndjson"])
+def test_expanded_compact_test_cases_equal_the_full_ones(spec_file, tmp_path, output):
+    full_file, compact_file = str(tmp_path / f"full.{output}"), str(tmp_path / f"compact.{output}")
+    OpenApiSpecParser(spec_file, seed=7, lazy_refs=True).get_json_file(full_file)
+    OpenApiSpecParser(spec_file, seed=7, lazy_refs=True, compact=True).get_json_file(compact_file)
+
+    full = list(iter_testcases(full_file))
+    compact = list(iter_testcases(compact_file))
+
+    assert any(element.get(RSP_VARIANTS_KEY) for _, testcase in compact for element in testcase["input"])
+    assert sum(len(testcase["input"]) for _, testcase in compact) < sum(len(testcase["input"]) for _, testcase in full)
+    assert without_host((test_id, expand_testcase(testcase)) for test_id, testcase in compact) == without_host(full)
+
+
+def test_coverage_mode_covers_every_pair_of_parameter_values(spec_file):
+    parser = OpenApiSpecParser(spec_file, seed=1, lazy_refs=True, coverage=2)
+
+    combos = set()
+    for _, testcase in parser.iter_testcases():
+        for element in testcase["input"]:
+            url = urlsplit(element["url"])
+            if element["method"] != "GET" or element["rsp_code"] != 200 or url.path != "/v1/items":
+                continue
+            values = dict(parse_qsl(url.query))
+            values["X-Mode"] = json.loads(element["Req_Header"])["X-Mode"]
+            combos.add(tuple(sorted(values.items())))
+
+    levels = {"color": ["red", "green", "blue"], "active": ["true", "false"], "size": ["s", "m", "l"],
+              "X-Mode": ["fast", "slow"]}
+    assert all(len(combo) == len(levels) for combo in combos)
+    for first, second in combinations(levels, 2):
+        covered = {(dict(combo)[first], dict(combo)[second]) for combo in combos}
+        assert covered == {(a, b) for a in levels[first] for b in levels[second]}
+    assert len(combos) < 3 * 2 * 3 * 2
+
+
+def test_coverage_strength_below_one_is_rejected(spec_file):
+    with pytest.raises(ValueError):
+        OpenApiSpecParser(spec_file, coverage=0)
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from lib.parsers.testcase_io import (RSP_VARIANTS_KEY, expand_inputs, expand_testcase, iter_json_testcases,
+                                     iter_testcases, write_testcases)
+from lib.parsers import testcase_records
+
+
+def make_testcase(i):
+    return {
+        "input": [{"host": "api.example.com", "method": "GET", "rsp_code": 200, "Req_Header": "{}",
+                   "req_body": json.dumps({"name": f"n{i}", "text": "a \"quoted\" , } value"}),
+                   "rsp_body": "{}", "url": f"/items/{i}"}],
+        "output": [],
+        "metadata": {"Meta_Index": i},
+    }
+
+
+TESTCASES = [(str(i), make_testcase(i)) for i in range(1, 40)]
+
+
+@pytest.mark.parametrize("name", ["testcases.json", "testcases.ndjson", "testcases.jsonl"])
+def test_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+
+    assert write_testcases(path, iter(TESTCASES)) == len(TESTCASES)
+    assert list(iter_testcases(path)) == TESTCASES
+
+
+def test_json_writer_matches_json_dumps(tmp_path):
+    path = tmp_path / "testcases.json"
+    write_testcases(str(path), TESTCASES)
+
+    assert json.loads(path.read_text()) == dict(TESTCASES)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1024 * 1024])
+def test_json_reader_decodes_across_chunk_boundaries(tmp_path, chunk_size):
+    path = tmp_path / "testcases.json"
+    path.write_text(json.dumps(dict(TESTCASES), indent=2))
+
+    assert list(iter_json_testcases(str(path), chunk_size)) == TESTCASES
+
+
+def test_json_reader_reads_an_empty_file(tmp_path):
+    path = tmp_path / "testcases.json"
+    path.write_text(" { } ")
+
+    assert list(iter_json_testcases(str(path))) == []
+
+
+def test_json_reader_yields_a_repeated_id_once(tmp_path):
+    path = tmp_path / "testcases.json"
+    path.write_text('{"1": {"v": 1}, "2": {"v": 2}, "1": {"v": 3}}')
+
+    assert list(iter_json_testcases(str(path), chunk_size=4)) == [("1", {"v": 1}), ("2", {"v": 2})]
+
+
+def test_json_reader_rejects_a_truncated_file(tmp_path):
+    path = tmp_path / "testcases.json"
+    path.write_text(json.dumps(dict(TESTCASES))[:-30])
+
+    with pytest.raises(ValueError):
+        list(iter_json_testcases(str(path)))
+
+
+def test_ndjson_reader_skips_an_incomplete_last_line(tmp_path):
+    path = tmp_path / "testcases.ndjson"
+    write_testcases(str(path), TESTCASES[:3])
+    with open(path, "a") as f:
+        f.write('{"test_id": "4", "input": [')
+
+    assert list(iter_testcases(str(path))) == TESTCASES[:3]
+
+
+def test_records_serialize_like_dicts(tmp_path):
+    element = testcase_records.InputElement("/items/1", "api.example.com", "GET", 200, "{}", "{}", {"Req_Header": "{}"})
+    record = testcase_records.TestCaseRecord([element], [testcase_records.OutputElement(("Output_Code",), ("",))],
+                                             testcase_records.MetadataElement({"Meta_Index": 1}, {}, {}, {}))
+    path = str(tmp_path / "testcases.ndjson")
+
+    write_testcases(path, [("1", record)])
+
+    assert list(iter_testcases(path)) == [("1", record.to_dict())]
+
+
+def test_expand_inputs_restores_one_element_per_code():
+    header = json.dumps({"apisec-resp-status-code": "200", "X-Other": "1"})
+    element = {"method": "POST", "rsp_code": 200, "Req_Header": header, "url": "/a", RSP_VARIANTS_KEY: "200,404,500"}
+    plain = {"method": "GET", "rsp_code": 200, "Req_Header": "{}", "url": "/b"}
+
+    expanded = list(expand_inputs([element, plain]))
+
+    assert [e["rsp_code"] for e in expanded] == [200, 404, 500, 200]
+    assert [json.loads(e["Req_Header"]) for e in expanded[:3]] == [
+        {"apisec-resp-status-code": code, "X-Other": "1"} for code in ("200", "404", "500")]
+    assert all(RSP_VARIANTS_KEY not in e for e in expanded)
+    assert expanded[3] is plain
+    assert element[RSP_VARIANTS_KEY] == "200,404,500"
+
+
+def test_expand_inputs_drops_an_empty_variants_field():
+    element = {"method": "GET", "rsp_code": 200, "url": "/a", RSP_VARIANTS_KEY: ""}
+
+    assert list(expand_inputs([element])) == [{"method": "GET", "rsp_code": 200, "url": "/a"}]
+
+
+def test_expand_testcase_keeps_the_other_fields():
+    testcase = {"input": [{"rsp_code": 200, RSP_VARIANTS_KEY: "200,401"}], "output": [], "metadata": {"m": 1}}
+
+    expanded = expand_testcase(testcase)
+
+    assert expanded["input"] == [{"rsp_code": 200}, {"rsp_code": 401}]
+    assert expanded["metadata"] == {"m": 1}
@@ -0,0 +1,100 @@
+import itertools
+
+import pytest
+
+from lib.parsers.uniqueness import UniquenessRegistry
+
+
+def counter_draw(values):
+    values = iter(values)
+    return lambda: next(values)
+
+
+def test_claim_redraws_values_already_used_for_the_key():
+    registry = UniquenessRegistry()
+    registry.add("id", 1)
+    registry.add("id", 2)
+
+    assert registry.claim("id", counter_draw([1, 2, 3])) == 3
+    assert registry.stats()["keys"]["id"]["collisions"] == 2
+
+
+def test_values_are_tracked_per_key():
+    registry = UniquenessRegistry()
+    registry.add("a", 1)
+
+    assert registry.claim("b", counter_draw([1])) == 1
+
+
+def test_claim_gives_up_after_max_retries():
+    registry = UniquenessRegistry(max_retries=3)
+    registry.add("id", "same")
+
+    assert registry.claim("id", lambda: "same") == "same"
+    counters = registry.stats()["keys"]["id"]
+    assert counters["collisions"] == 4
+    assert counters["exhausted"] == 1
+
+
+def test_unhashable_values_are_tracked():
+    registry = UniquenessRegistry()
+    registry.add("body", {"a": [1, 2]})
+
+    assert registry.claim("body", counter_draw([{"a": [1, 2]}, {"a": [2]}])) == {"a": [2]}
+
+
+def test_claims_are_unique_within_the_window():
+    registry = UniquenessRegistry(max_values_per_key=50)
+    draw = itertools.cycle(range(60)).__next__
+
+    claimed = [registry.claim("id", draw) for _ in range(200)]
+
+    for i in range(len(claimed) - 50):
+        window = claimed[i:i + 50]
+        assert len(set(window)) == len(window)
+
+
+def test_window_policy_forgets_the_oldest_value():
+    registry = UniquenessRegistry(max_values_per_key=2, policy="window")
+    for value in (1, 2, 1, 3):
+        registry.add("id", value)
+
+    # 1 was seen first, so it is evicted even though it was added again.
+    assert registry.claim("id", counter_draw([2, 3, 1])) == 1
+
+
+def test_lru_policy_forgets_the_least_recently_used_value():
+    registry = UniquenessRegistry(max_values_per_key=2, policy="lru")
+    for value in (1, 2, 1, 3):
+        registry.add("id", value)
+
+    assert registry.claim("id", counter_draw([1, 3, 2])) == 2
+
+
+def test_max_keys_drops_the_least_recently_used_key():
+    registry = UniquenessRegistry(max_keys=2)
+    registry.add("a", 1)
+    registry.add("b", 1)
+    registry.add("a", 2)
+    registry.add("c", 1)
+
+    assert "b" not in registry
+    assert "a" in registry and "c" in registry
+    assert registry.stats()["evicted_keys"] == 1
+
+
+def test_max_values_bounds_the_values_over_all_keys():
+    registry = UniquenessRegistry(max_values=100)
+    for key in range(20):
+        for value in range(30):
+            registry.add(f"key{key}", value)
+
+    assert registry.size == 100
+    assert sum(counters["size"] for counters in registry.stats()["keys"].values()) == 100
+    assert "key19" in registry
+    assert "key0" not in registry
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        UniquenessRegistry(policy="fifo")
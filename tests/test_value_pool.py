@@ -0,0 +1,70 @@
+import re
+import threading
+
+import pytest
+
+from lib.parsers.regex_generator import compile_graphql, compile_regex
+from lib.parsers.value_pool import ParsedLabel, ValuePool, parse_label_name
+
+
+def test_pool_refills_in_batches_and_serves_values_in_order():
+    produced = iter(range(1000))
+    pool = ValuePool(lambda count: [next(produced) for _ in range(count)], batch_size=4)
+
+    assert [pool.take() for _ in range(10)] == list(range(10))
+    assert pool.stats() == {"served": 10, "refills": 3, "produced": 12, "buffered": 2, "batch_size": 4}
+
+
+def test_pool_raises_when_the_producer_is_empty():
+    pool = ValuePool(lambda count: [])
+
+    with pytest.raises(IndexError):
+        pool.take()
+
+
+def test_pool_hands_out_each_value_once_across_threads():
+    lock = threading.Lock()
+    produced = iter(range(100000))
+
+    def producer(count):
+        with lock:
+            return [next(produced) for _ in range(count)]
+
+    pool = ValuePool(producer, batch_size=16)
+    taken = [[] for _ in range(8)]
+    threads = [threading.Thread(target=lambda out: out.extend(pool.take() for _ in range(500)), args=(out,))
+               for out in taken]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    values = [value for out in taken for value in out]
+    assert len(values) == len(set(values)) == 4000
+
+
+@pytest.mark.parametrize("label_name, expected", [
+    ("valid-email", ParsedLabel("valid", "email")),
+    ("invalid-us-ssn", ParsedLabel("invalid", "us-ssn")),
+    ("sequence-ssn", ParsedLabel("sequence", "ssn")),
+    ("regex:[a-z]{3}", ParsedLabel("regex", "[a-z]{3}")),
+    ("random-string", ParsedLabel("random", "string")),
+    ("query { user(id: <regex:[0-9]+>) }", ParsedLabel("graphql", "query { user(id: <regex:[0-9]+>) }")),
+    ("unknown", ParsedLabel(None, "unknown")),
+])
+def test_parse_label_name(label_name, expected):
+    assert parse_label_name(label_name) == expected
+
+
+def test_regex_generator_values_match_the_pattern():
+    generator = compile_regex("[A-Z]{2}-[0-9]{4}")
+
+    assert all(re.fullmatch("[A-Z]{2}-[0-9]{4}", value) for value in generator.many(50))
+    assert compile_regex("[A-Z]{2}-[0-9]{4}") is generator
+
+
+def test_graphql_template_fills_every_regex_placeholder():
+    template = compile_graphql("query { user(id: <regex:[0-9]{3}>, name: \"<regex:[a-z]{2}>\") { id } }")
+
+    for query in template.many(20):
+        assert re.fullmatch(r'query \{ user\(id: [0-9]{3}, name: "[a-z]{2}"\) \{ id \} \}', query)